@@ -0,0 +1,75 @@
+"""
+Benchmark of the raw data conversion (thickness / S/Mo engine).
+
+Compares the former per-row iloc loop with the columnar engine of
+wdxrf.Processing.conversion for an increasing number of points per wafer.
+
+Usage (from the repository root, with XRF2D installed):
+    python benchmarks/bench_conversion.py
+"""
+import time
+import numpy as np
+import pandas as pd
+from wdxrf.Processing.conversion import (MOLAR_MO, MOLAR_S, MO_UNIT,
+                                         DATA_COLUMNS, convert_raw_data)
+
+POINT_COUNTS = [50, 200, 1000, 5000, 20000]
+REPEAT = 3
+
+
+def make_raw_frame(num_points, seed=0):
+    """Create a raw DataFrame similar to read_raw_csv output."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        3: np.sqrt(rng.uniform(0, 1, num_points)) * 95,
+        4: rng.uniform(0, 360, num_points),
+        5: rng.normal(5, 0.2, num_points),
+        7: rng.normal(33, 1, num_points),
+        9: np.ones(num_points),
+    })
+
+
+def convert_row_by_row(data_frame):
+    """Reference implementation: former per-row loop."""
+    rows = []
+    for i in range(len(data_frame)):
+        angle_rad = np.radians(data_frame.iloc[i, 1] - 90)
+        x = data_frame.iloc[i, 0] * np.sin(angle_rad) / 10
+        y = data_frame.iloc[i, 0] * np.cos(angle_rad) / 10
+        density = data_frame.iloc[i, 2]
+        atomic_sulf_perc = 100 - data_frame.iloc[i, 3]
+        s_mo = atomic_sulf_perc / data_frame.iloc[i, 3]
+        um_molar_cm2_mo = density / ((MOLAR_MO) + atomic_sulf_perc * (
+            MOLAR_S) / data_frame.iloc[i, 3])
+        thickness = um_molar_cm2_mo * 1e-20 * 6.022e23 / MO_UNIT
+        rows.append((x, y, density, s_mo, thickness))
+    return pd.DataFrame(rows, columns=DATA_COLUMNS).round(2)
+
+
+def best_time(function, *args):
+    """Return the best wall time of REPEAT calls."""
+    timings = []
+    for _ in range(REPEAT):
+        start_time = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - start_time)
+    return min(timings)
+
+
+def main():
+    """Run the benchmark and print per-wafer timings."""
+    print(f"{'Points':>8} {'Loop (ms)':>12} {'Columnar (ms)':>14} "
+          f"{'Speed-up':>9}")
+    for num_points in POINT_COUNTS:
+        data_frame = make_raw_frame(num_points)
+        pd.testing.assert_frame_equal(convert_row_by_row(data_frame),
+                                      convert_raw_data(data_frame))
+        loop_time = best_time(convert_row_by_row, data_frame)
+        columnar_time = best_time(convert_raw_data, data_frame)
+        print(f"{num_points:>8} {loop_time * 1e3:>12.2f} "
+              f"{columnar_time * 1e3:>14.3f} "
+              f"{loop_time / columnar_time:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark of the wafer interpolation stage.
+
+Compares six griddata calls per wafer (two per parameter, former
+behaviour of plot_wdf_mp) with interpolate_parameters, which builds a
+single triangulation shared by all parameters, and with the cached
+weights reused by the following wafers of the same recipe.
+
+Usage (from the repository root, with XRF2D installed):
+    python benchmarks/bench_interpolation.py
+"""
+import time
+import tempfile
+import numpy as np
+from scipy.interpolate import griddata
+from wdxrf.Processing.interpolation import interpolate_parameters, \
+    InterpolationCache
+
+POINT_COUNTS = [50, 200, 1000, 5000, 20000]
+NUM_PARAMETERS = 3
+REPEAT = 3
+
+
+def make_wafer(num_points, seed=0):
+    """Create random points on a 20 cm wafer and three parameters."""
+    rng = np.random.default_rng(seed)
+    radius = np.sqrt(rng.uniform(0, 1, num_points)) * 9.5
+    angle = rng.uniform(0, 2 * np.pi, num_points)
+    x, y = radius * np.sin(angle), radius * np.cos(angle)
+    values = rng.normal(5, 0.2, (num_points, NUM_PARAMETERS))
+    return x, y, values
+
+
+def griddata_per_parameter(x, y, values, grid_x, grid_y):
+    """Reference implementation: two griddata calls per parameter."""
+    grids = []
+    for j in range(values.shape[1]):
+        for _ in range(2):
+            grid_z = griddata((x, y), values[:, j], (grid_x, grid_y),
+                              method='linear')
+        grids.append(grid_z)
+    return np.array(grids)
+
+
+def best_time(function, *args):
+    """Return the best wall time of REPEAT calls."""
+    timings = []
+    for _ in range(REPEAT):
+        start_time = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - start_time)
+    return min(timings)
+
+
+def main():
+    """Run the benchmark and print per-wafer timings."""
+    axis = np.arange(-9.5, 10, 0.5)
+    grid_x, grid_y = np.meshgrid(axis, axis)
+    cache = InterpolationCache(tempfile.mkdtemp())
+    print(f"{'Points':>8} {'griddata x6 (ms)':>17} {'Shared (ms)':>12} "
+          f"{'Cached (ms)':>12} {'Speed-up':>9}")
+    for num_points in POINT_COUNTS:
+        x, y, values = make_wafer(num_points)
+        np.testing.assert_allclose(
+            griddata_per_parameter(x, y, values, grid_x, grid_y),
+            interpolate_parameters(x, y, values, grid_x, grid_y))
+        reference = best_time(griddata_per_parameter, x, y, values,
+                              grid_x, grid_y)
+        shared = best_time(interpolate_parameters, x, y, values,
+                           grid_x, grid_y)
+        cached = best_time(interpolate_parameters, x, y, values,
+                           grid_x, grid_y, cache)
+        print(f"{num_points:>8} {reference * 1e3:>17.2f} "
+              f"{shared * 1e3:>12.2f} {cached * 1e3:>12.3f} "
+              f"{reference / cached:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
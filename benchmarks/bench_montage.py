@@ -0,0 +1,149 @@
+"""
+Benchmark of the montage of the mappings (Graphe/Mapping/All_*.png).
+
+Compares the former create_image_grid (all the images of the lot opened,
+then pasted by one thread) with build_montage, which decodes the tiles in
+a pool of threads and pastes them one at a time, from the PNG files, from
+tiles kept in memory after the mapping, and downscaled by 2.
+Also measures the worker path of the pipeline: tiles rendered by worker
+processes and sent back to the main process (transfer), against the
+montage decoded from the files written by the workers (files), at full
+scale and downscaled by 2.
+
+Usage (from the repository root, with XRF2D installed):
+    python benchmarks/bench_montage.py
+"""
+import os
+import math
+import time
+import tempfile
+import numpy as np
+from PIL import Image
+from wdxrf.Processing.grid import build_grid
+from wdxrf.Processing.raster import MapRaster
+from wdxrf.Processing.montage import build_montage, make_tile, \
+    scaled_size, TileStore
+from wdxrf.Processing.scheduler import Scheduler
+
+NUM_SLOTS = 25
+REPEAT = 3
+# Worker processes of the worker path
+WORKERS = 2
+
+
+def make_images(folder, num_images, seed=0):
+    """Render mappings of random grids as PNG files."""
+    grid = build_grid(20, 2, 0.5)
+    raster = MapRaster(10, 2, grid.shape)
+    rng = np.random.default_rng(seed)
+    paths = []
+    for index in range(num_images):
+        grid_z = np.ma.masked_where(~grid.mask,
+                                    rng.normal(5, 0.3, grid.shape))
+        path = os.path.join(folder, f"{index}.png")
+        raster.render(grid_z, grid_z.min(), grid_z.max()).save(path)
+        paths.append(path)
+    return paths
+
+
+def reference_montage(paths, output_path, spacing=50):
+    """Former create_image_grid: open all the images, then paste them."""
+    images = [Image.open(path) for path in paths]
+    columns = min(5, len(images))
+    rows = math.ceil(len(images) / columns)
+    width, height = images[0].size
+    grid_image = Image.new('RGB', (columns * width + (columns - 1) * spacing,
+                                   rows * height + (rows - 1) * spacing),
+                           (255, 255, 255))
+    for idx, image in enumerate(images):
+        grid_image.paste(image, ((idx % columns) * (width + spacing),
+                                 (idx // columns) * (height + spacing)))
+    grid_image.save(output_path)
+
+
+def worker_tile(path, scale=None):
+    """
+    Per-slot function of the worker path: the image is rendered by the
+    worker (loaded from its file here), and returned as a tile if scale
+    is not None.
+    """
+    image = make_tile(path)
+    if scale is None:
+        return None
+    return np.asarray(make_tile(image, scaled_size(image.size, scale)))
+
+
+def worker_montage(scheduler, paths, output_path, scale, transfer):
+    """
+    Montage after the per-slot work of the workers, with the tiles sent
+    back by the workers (transfer) or decoded from the files.
+    """
+    tiles = TileStore(scale) if transfer else None
+    results, _ = scheduler.map_slots(
+        worker_tile, paths, paths,
+        [scale if transfer else None] * len(paths))
+    if transfer:
+        for path, tile in results.items():
+            tiles.add(path, tile)
+    build_montage(paths, output_path, scale, tiles=tiles)
+
+
+def best_time(function):
+    """Return the best time of REPEAT calls."""
+    times = []
+    for _ in range(REPEAT):
+        start_time = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start_time)
+    return min(times)
+
+
+def main():
+    """Run the benchmark and print the time of each variant."""
+    folder = tempfile.mkdtemp()
+    paths = make_images(folder, NUM_SLOTS)
+
+    def from_memory():
+        tiles = TileStore()
+        for path in paths:
+            tiles.add(path, np.asarray(make_tile(path)))
+        start_time = time.perf_counter()
+        build_montage(paths, os.path.join(folder, "memory.png"),
+                      tiles=tiles)
+        return time.perf_counter() - start_time
+
+    variants = [
+        ("reference", lambda: best_time(lambda: reference_montage(
+            paths, os.path.join(folder, "reference.png")))),
+        ("streaming", lambda: best_time(lambda: build_montage(
+            paths, os.path.join(folder, "streaming.png")))),
+        ("in memory", lambda: min(from_memory() for _ in range(REPEAT))),
+        ("scale 0.5", lambda: best_time(lambda: build_montage(
+            paths, os.path.join(folder, "half.png"), scale=0.5))),
+    ]
+    print(f"{NUM_SLOTS} tiles of {Image.open(paths[0]).size}")
+    print(f"{'Variant':>10} {'Time (s)':>9}")
+    for name, run in variants:
+        print(f"{name:>10} {run():>9.3f}")
+
+    with Scheduler(WORKERS) as scheduler:
+        scheduler.start()
+        print(f"\nWorker path ({WORKERS} worker processes)")
+        print(f"{'Variant':>16} {'Time (s)':>9}")
+        for scale in (1.0, 0.5):
+            for transfer in (False, True):
+                name = f"{'transfer' if transfer else 'files'} {scale:g}"
+                elapsed = best_time(lambda: worker_montage(
+                    scheduler, paths, os.path.join(folder, "worker.png"),
+                    scale, transfer))
+                print(f"{name:>16} {elapsed:>9.3f}")
+
+    reference = Image.open(os.path.join(folder, "reference.png"))
+    for name in ("streaming", "memory"):
+        image = Image.open(os.path.join(folder, f"{name}.png"))
+        same = np.array_equal(np.asarray(image), np.asarray(reference))
+        print(f"{name} identical to reference: {same}")
+
+
+if __name__ == "__main__":
+    main()
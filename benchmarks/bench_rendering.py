@@ -0,0 +1,107 @@
+"""
+Benchmark of the mapping renderers.
+
+Renders the same wafer grids as PNG files with a new matplotlib figure per
+image (reference, former plot_wdf_mp), with the reused figure template of
+plot_wdf_mp and with the raster renderer, and prints the throughput in
+images per second and the share of pixels which differ from the
+reference.
+
+Usage (from the repository root, with XRF2D installed):
+    python benchmarks/bench_rendering.py
+"""
+import os
+import time
+import tempfile
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from PIL import Image
+from wdxrf.Processing.grid import build_grid
+from wdxrf.Processing.map_figure import create_map_figure, stats_labels, \
+    add_stats_text, MapFigureTemplate
+from wdxrf.Processing.raster import MapRaster
+
+# Same layout as the application (set by function_common)
+plt.rcParams.update({'figure.autolayout': True})
+
+WAFER_SIZE = 20
+EDGE_EXCLUSION = 2
+STEP = 0.5
+NUM_IMAGES = 30
+
+
+def make_grids(num_images, seed=0):
+    """Create random grids masked outside the edge exclusion."""
+    grid = build_grid(WAFER_SIZE, EDGE_EXCLUSION, STEP)
+    rng = np.random.default_rng(seed)
+    return [np.ma.masked_where(~grid.mask,
+                               rng.normal(5, 0.3, grid.grid_x.shape))
+            for _ in range(num_images)]
+
+
+def render_matplotlib(grid_z, path):
+    """Reference renderer: one matplotlib figure per image."""
+    fig, ax, _ = create_map_figure(grid_z, WAFER_SIZE / 2, EDGE_EXCLUSION)
+    add_stats_text(ax, stats_labels(grid_z.mean(), 3 * grid_z.std(), 90))
+    fig.savefig(path, bbox_inches='tight')
+    plt.close(fig)
+
+
+def make_template_renderer():
+    """Matplotlib renderer reusing one figure (only the artists change)."""
+    template = MapFigureTemplate(
+        WAFER_SIZE / 2, EDGE_EXCLUSION,
+        build_grid(WAFER_SIZE, EDGE_EXCLUSION, STEP).shape)
+
+    def render(grid_z, path):
+        template.update(grid_z, stats_labels(grid_z.mean(),
+                                             3 * grid_z.std(), 90))
+        template.save(path, grid_z.min(), grid_z.max())
+    return render
+
+
+def make_raster_renderer():
+    """Raster renderer (the frame is rendered once)."""
+    raster = MapRaster(WAFER_SIZE / 2, EDGE_EXCLUSION,
+                       build_grid(WAFER_SIZE, EDGE_EXCLUSION, STEP).shape)
+
+    def render(grid_z, path):
+        labels = stats_labels(grid_z.mean(), 3 * grid_z.std(), 90,
+                              mathtext=False)
+        raster.render(grid_z, grid_z.min(), grid_z.max(), labels).save(path)
+    return render
+
+
+def throughput(render, grids, folder, name):
+    """Render all grids and return the number of images per second."""
+    start_time = time.perf_counter()
+    for index, grid_z in enumerate(grids):
+        render(grid_z, os.path.join(folder, f"{name}_{index}.png"))
+    return len(grids) / (time.perf_counter() - start_time)
+
+
+def main():
+    """Run the benchmark and print the throughput of each renderer."""
+    grids = make_grids(NUM_IMAGES)
+    folder = tempfile.mkdtemp()
+    renderers = [("matplotlib", render_matplotlib),
+                 ("template", make_template_renderer()),
+                 ("raster", make_raster_renderer())]
+    print(f"{'Renderer':>12} {'Images/s':>9} {'Different pixels':>17}")
+    for name, render in renderers:
+        rate = throughput(render, grids, folder, name)
+        reference = np.asarray(Image.open(
+            os.path.join(folder, "matplotlib_0.png")), dtype=int)
+        image = np.asarray(Image.open(
+            os.path.join(folder, f"{name}_0.png")), dtype=int)
+        if image.shape == reference.shape:
+            different = f"{(image != reference).any(-1).mean():.2%}"
+        else:
+            different = "size differs"
+        print(f"{name:>12} {rate:>9.1f} {different:>17}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark of the startup of the GUI.
+
+Measures, each in a new interpreter, the import of wdxrf.main, the time
+until the main window is shown, and the import of the modules preloaded
+afterwards (see main.PRELOAD_MODULES). Also lists the scientific modules
+already imported when the window is shown: there should be none, so the
+script exits with an error if some are (startup regression).
+
+Usage (from the repository root, with XRF2D installed):
+    python benchmarks/bench_startup.py
+Without display, set QT_QPA_PLATFORM=offscreen.
+"""
+import os
+import sys
+import json
+import subprocess
+
+REPEAT = 5
+
+# Modules which must not be imported before the window is shown
+HEAVY_MODULES = ("numpy", "pandas", "scipy", "matplotlib", "PIL")
+
+STARTUP_SCRIPT = """
+import sys, json, time
+start_time = time.perf_counter()
+import wdxrf.main
+import_time = time.perf_counter() - start_time
+from PyQt5.QtWidgets import QApplication
+app = QApplication([])
+window = wdxrf.main.MainWindow()
+window.show()
+app.processEvents()
+shown_time = time.perf_counter() - start_time
+heavy = [module for module in {heavy!r} if module in sys.modules]
+start_time = time.perf_counter()
+wdxrf.main.preload_modules().join()
+preload_time = time.perf_counter() - start_time
+window.button_frame.scheduler.shutdown()
+print(json.dumps([import_time, shown_time, preload_time, heavy]))
+"""
+
+
+def measure():
+    """Run the startup in a new interpreter and return its times."""
+    output = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT.format(heavy=HEAVY_MODULES)],
+        capture_output=True, text=True, check=True,
+        env=dict(os.environ, PYTHONDONTWRITEBYTECODE="1")).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    """Run the benchmark, print the best times and check the imports."""
+    runs = [measure() for _ in range(REPEAT)]
+    print(f"{'Step':>16} {'Time (s)':>9}")
+    for index, name in enumerate(("import main", "window shown",
+                                  "preload")):
+        print(f"{name:>16} {min(run[index] for run in runs):>9.3f}")
+    heavy = sorted({module for run in runs for module in run[3]})
+    if heavy:
+        print(f"Imported before the window is shown: {', '.join(heavy)}")
+        return 1
+    print("No scientific module imported before the window is shown.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""
+Benchmark of the viewer of the mappings.
+
+Creates a lot of 25 wafers with random grids and measures, for a growing
+number of selected wafers, the time until the GUI handles events again
+after a change of parameter and until all the mappings are drawn, and the
+time to add one wafer to the selection.
+
+Usage (from the repository root, with XRF2D installed):
+    python benchmarks/bench_viewer.py
+"""
+import os
+import io
+import time
+import tempfile
+import contextlib
+import numpy as np
+from PyQt5.QtWidgets import QApplication, QWidget, QGridLayout
+from wdxrf.Processing.grid import build_grid
+from wdxrf.Processing.grid_store import save_grids
+from wdxrf.Plot.frame_attributes import PlotFrame
+
+NUM_SLOTS = 25
+SELECTIONS = [1, 5, 10, 25]
+REPEAT = 3
+VALUES = {'Wafer size (cm):': 20.0, 'Edge Exclusion (cm):': 2.0,
+          'Columns on GUI:': 5.0, 'Min density (ug.cm-2):': 0.0,
+          'Max density (ug.cm-2):': 40.0, 'Min S/Mo:': 0.0, 'Max S/Mo:': 3.0,
+          'Min thickness (ML):': 0.0, 'Max thickness (ML):': 5.0}
+
+
+class ButtonFrame:
+    """Settings and selection of the viewer (instead of the GUI)."""
+
+    def __init__(self, dirname):
+        self.dirname = dirname
+        self.selected = []
+
+    def get_values(self):
+        return VALUES
+
+    def get_scale_values(self):
+        return {'Scale Type': 'Identical scale'}
+
+    def folder_var_changed(self):
+        return self.dirname
+
+    def get_selected_wafer(self):
+        return self.selected
+
+
+def make_lot(dirname, num_slots, seed=0):
+    """Save random grids of the three parameters for each wafer."""
+    grid = build_grid(VALUES['Wafer size (cm):'],
+                      VALUES['Edge Exclusion (cm):'], 0.5)
+    rng = np.random.default_rng(seed)
+    for slot in range(1, num_slots + 1):
+        folder = os.path.join(dirname, str(slot))
+        os.makedirs(folder)
+        grids = {parameter: np.where(grid.mask,
+                                     rng.normal(mean, 0.1 * mean,
+                                                grid.mask.shape), np.nan)
+                 for parameter, mean in (("Density", 5), ("S_Mo", 2),
+                                         ("Number of layers", 3))}
+        save_grids(folder, grids, grid.x, grid.y)
+
+
+def main():
+    """Run the benchmark and print the times for each selection."""
+    app = QApplication.instance() or QApplication([])
+    dirname = tempfile.mkdtemp()
+    make_lot(dirname, NUM_SLOTS)
+    window = QWidget()
+    button_frame = ButtonFrame(dirname)
+    frame = PlotFrame(QGridLayout(window), button_frame)
+    window.show()
+
+    def run(function):
+        """Return the time until the events are handled and the time
+        until the mappings are drawn."""
+        with contextlib.redirect_stdout(io.StringIO()):
+            start_time = time.perf_counter()
+            function()
+            app.processEvents()
+            response = time.perf_counter() - start_time
+            while frame.pending_wafers:
+                app.processEvents()
+            return response, time.perf_counter() - start_time
+
+    def select(wafers, parameter=None):
+        button_frame.selected = wafers
+        frame.parameters = parameter or frame.parameters
+        frame.update_data(wafers)
+
+    print(f"{'Wafers':>6} {'Parameter (ms)':>15} {'All drawn (ms)':>15} "
+          f"{'Add wafer (ms)':>15}")
+    for count in SELECTIONS:
+        wafers = [str(slot) for slot in range(1, count + 1)]
+        run(lambda: select(wafers, "Density"))
+        clicks = [run(lambda parameter=parameter: select(wafers, parameter))
+                  for parameter in ["S_Mo", "Density"] * REPEAT]
+        adds = []
+        for _ in range(REPEAT):
+            run(lambda: select(wafers[:-1]))
+            adds.append(run(lambda: select(wafers))[1])
+        print(f"{count:>6} {min(c[0] for c in clicks) * 1000:>15.1f} "
+              f"{min(c[1] for c in clicks) * 1000:>15.1f} "
+              f"{min(adds) * 1000:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
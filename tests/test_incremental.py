@@ -0,0 +1,206 @@
+"""
+Tests of the incremental processing of a lot (manifest), of the cache of
+the interpolation weights and of the failures of the scheduler.
+The lots are small synthetic lots processed in the calling process (one
+worker) with the fast renderer.
+"""
+import os
+import hashlib
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+import numpy as np
+import pytest
+from scipy.interpolate import griddata
+
+from wdxrf.Processing import interpolation
+from wdxrf.Processing.grid import build_grid
+from wdxrf.Processing.manifest import Manifest
+from wdxrf.Processing.pipeline import Pipeline
+from wdxrf.Processing.scheduler import Scheduler
+from wdxrf.Processing.settings import SETTINGS_ENTRIES, parse_settings
+
+SLOTS = ("1", "2", "3")
+
+
+def write_raw_file(folder, slot, seed, points=120):
+    """Write the raw CSV file of a slot (random points on the wafer)."""
+    rng = np.random.default_rng(seed)
+    radius = np.sqrt(rng.uniform(0, 1, points)) * 75
+    angle = rng.uniform(0, 360, points)
+    density = 5 + 0.01 * radius + rng.normal(0, 0.2, points)
+    mo_percent = 33 + rng.normal(0, 1, points)
+    with open(os.path.join(folder, f"raw_{slot}.csv"), "w") as file:
+        file.write("h1\nh2\nh3\n")
+        for index in range(points):
+            file.write(f"{index},a,b,{radius[index]:.3f},"
+                       f"{angle[index]:.3f},{density[index]:.4f},x,"
+                       f"{mo_percent[index]:.3f},y,1\n")
+
+
+@pytest.fixture
+def lot(tmp_path, monkeypatch):
+    """Lot of three slots; the interpolation cache is in tmp_path."""
+    monkeypatch.setattr(interpolation, "_DEFAULT_CACHE",
+                        interpolation.InterpolationCache(
+                            str(tmp_path / "cache")))
+    dirname = tmp_path / "lot"
+    for seed, slot in enumerate(SLOTS):
+        folder = dirname / slot
+        folder.mkdir(parents=True)
+        write_raw_file(str(folder), slot, seed)
+    return str(dirname)
+
+
+@pytest.fixture
+def values():
+    """Default settings, one worker."""
+    values = parse_settings({label: default for label, default, _, _
+                             in SETTINGS_ENTRIES})
+    values["Max density (ug.cm-2):"] = 40.0
+    values["Workers:"] = 1.0
+    return values
+
+
+def run(lot, values, capsys, **options):
+    """Run the pipeline and return the slots whose mappings were
+    plotted."""
+    capsys.readouterr()
+    options = {"Fast rendering": True, **options}
+    pipeline = Pipeline(lot, values, options)
+    pipeline.run()
+    assert pipeline.error is None and not pipeline.failures
+    output = capsys.readouterr().out
+    return sorted(os.path.basename(line.split("Processing: ", 1)[1])
+                  for line in output.splitlines()
+                  if line.startswith("Processing: "))
+
+
+def image_digest(lot, slot, filename="Density_ID_scale.png"):
+    """Return a hash of a mapping image of a slot."""
+    with open(os.path.join(lot, slot, "Mapping", filename), "rb") as file:
+        return hashlib.md5(file.read()).hexdigest()
+
+
+def test_unchanged_lot_is_skipped(lot, values, capsys):
+    assert run(lot, values, capsys) == list(SLOTS)
+    image = os.path.join(lot, "1", "Mapping", "Density.png")
+    mtime = os.stat(image).st_mtime_ns
+
+    assert run(lot, values, capsys) == []
+    assert os.stat(image).st_mtime_ns == mtime
+
+
+def test_modified_raw_file_processes_its_slot(lot, values, capsys):
+    options = {"Id. scale mapping (auto)": False}
+    run(lot, values, capsys, **options)
+    write_raw_file(os.path.join(lot, "2"), "2", seed=10)
+    assert run(lot, values, capsys, **options) == ["2"]
+
+
+def test_modified_raw_file_processes_identical_auto_scale(lot, values,
+                                                          capsys):
+    # The identical scale (auto) depends on the data of all the slots
+    run(lot, values, capsys)
+    write_raw_file(os.path.join(lot, "2"), "2", seed=10)
+    assert run(lot, values, capsys) == list(SLOTS)
+
+
+@pytest.mark.parametrize("label, value, options, processed", [
+    ("Columns on GUI:", 5.0, {}, []),
+    ("Max density (ug.cm-2):", 30.0, {}, []),
+    ("Max density (ug.cm-2):", 30.0,
+     {"Id. scale mapping": True, "Id. scale mapping (auto)": False},
+     list(SLOTS)),
+    ("Step (cm):", 1.0, {}, list(SLOTS)),
+])
+def test_modified_setting(lot, values, capsys, label, value, options,
+                          processed):
+    run(lot, values, capsys, **options)
+    values[label] = value
+    assert run(lot, values, capsys, **options) == processed
+
+
+def test_modified_output_is_written_again(lot, values, capsys):
+    run(lot, values, capsys)
+    with open(os.path.join(lot, "3", "Mapping", "S_Mo.png"), "ab") as file:
+        file.write(b"\0")
+    assert run(lot, values, capsys) == ["3"]
+
+
+def test_scales_writing_the_same_files(lot, values, capsys):
+    auto = {"Autoscale mapping": False, "Id. scale mapping": False,
+            "Id. scale mapping (auto)": True}
+    manual = {"Autoscale mapping": False, "Id. scale mapping": True,
+              "Id. scale mapping (auto)": False}
+    run(lot, values, capsys, **auto)
+    auto_image = image_digest(lot, "1")
+    run(lot, values, capsys, **manual)
+    assert image_digest(lot, "1") != auto_image
+    assert run(lot, values, capsys, **auto) == list(SLOTS)
+    assert image_digest(lot, "1") == auto_image
+
+
+def test_removed_slot_is_pruned(lot, values, capsys):
+    run(lot, values, capsys)
+    os.remove(os.path.join(lot, "3", "raw_3.csv"))
+    run(lot, values, capsys)
+    keys = Manifest(lot).signatures("database")
+    assert sorted(os.path.dirname(key) for key in keys) == ["1", "2"]
+
+
+def test_cached_weights_match_griddata(tmp_path):
+    rng = np.random.default_rng(0)
+    x, y = rng.uniform(-8, 8, (2, 300))
+    values = np.column_stack([x + y, x * y, np.sin(x)])
+    grid = build_grid(20, 2, 0.5)
+    expected = np.array([
+        griddata((x, y), values[:, index], (grid.grid_x, grid.grid_y),
+                 method='linear') for index in range(values.shape[1])])
+
+    folder = str(tmp_path / "cache")
+    computed = interpolation.interpolate_parameters(
+        x, y, values, grid.grid_x, grid.grid_y,
+        cache=interpolation.InterpolationCache(folder))
+    # Weights read from the files of the cache
+    loaded = interpolation.interpolate_parameters(
+        x, y, values, grid.grid_x, grid.grid_y,
+        cache=interpolation.InterpolationCache(folder))
+    assert os.listdir(folder)
+    for result in (computed, loaded):
+        np.testing.assert_allclose(result, expected, rtol=1e-10,
+                                   atol=1e-12, equal_nan=True)
+
+
+def fail_on_slot(slot, failing):
+    """Per-slot function raising an error, or ending its worker process,
+    for the failing slot."""
+    if slot == failing:
+        if failing == "exit":
+            os._exit(1)
+        raise ValueError(slot)
+    return slot * 2
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_scheduler_reports_failed_slot(workers):
+    slots = ["a", "b", "c"]
+    with Scheduler(workers) as scheduler:
+        results, failures = scheduler.map_slots(
+            fail_on_slot, slots, slots, ["b"] * len(slots))
+    assert results == {"a": "aa", "c": "cc"}
+    assert [failure.key for failure in failures] == ["b"]
+    assert isinstance(failures[0].error, ValueError)
+
+
+def test_scheduler_recovers_from_dead_worker():
+    slots = ["exit", "b", "c", "d"]
+    with Scheduler(2) as scheduler:
+        results, failures = scheduler.map_slots(
+            fail_on_slot, slots, slots, ["exit"] * len(slots))
+        assert "exit" in [failure.key for failure in failures]
+        assert "exit" not in results
+        # The pool is replaced for the next runs
+        results, failures = scheduler.map_slots(
+            fail_on_slot, slots[1:], slots[1:], ["exit"] * 3)
+    assert results == {"b": "bb", "c": "cc", "d": "dd"}
+    assert failures == []
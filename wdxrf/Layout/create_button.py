@@ -1,22 +1,22 @@
 """Module for buttons"""
 import os
 import sys
-import time
 from PyQt5.QtWidgets import (QRadioButton, QWidget,
                              QPushButton, QLabel,
                              QCheckBox, QSizePolicy, QGridLayout, QGroupBox,
                              QFileDialog,
-                             QProgressDialog, QApplication)
+                             QProgressDialog, QMessageBox)
 from PyQt5.QtGui import QFont
 from PyQt5.QtCore import Qt
 from wdxrf.Layout.setting_windows import SettingsWindow
+from wdxrf.Layout.processing_thread import PipelineThread, ProgressEstimate
 from wdxrf.Layout.layouts_style import common_radiobutton_style, checkbox_style, \
     checkbox_style_default, run_button_style, settings_button_style, \
     toggle_button_style, checkbox_style_num_slot, group_box_style, \
     checkbox_style_present, checkbox_style_absent
 
-from wdxrf.Processing.xrf import XRF
-from wdxrf.Processing.function_common import Common
+from wdxrf.Processing.scheduler import Scheduler
+from wdxrf.Processing.settings import get_workers
 
 
 class ButtonFrame(QWidget):
@@ -30,13 +30,20 @@ class ButtonFrame(QWidget):
         self.check_vars = {}
         self.wdxrf_class = None
         self.common_class = None
+        # Worker processes kept for all the runs (started when a folder is
+        # selected, stopped when the window is closed)
+        self.scheduler = Scheduler()
+        # Thread of the processing in progress (see run_data_processing)
+        self.processing_thread = None
 
 
         tool_radiobuttons = ["MoS₂", "WS₂", "Clean"]
         checkboxes = [
             ("Data processing", True), ("Autoscale mapping", True),
             ("Id. scale mapping", False), ("Id. scale mapping (auto)", True),
-            ("Slot number", True), ("Stats", True)
+            ("Slot number", True), ("Stats", True),
+            ("Fast rendering", False), ("Export slot CSV", False),
+            ("Export masks", False), ("Export grids CSV", False)
         ]
 
         self.radio_buttons = {text: QRadioButton(text) for text in
@@ -62,6 +69,14 @@ class ButtonFrame(QWidget):
 
         self.check_boxes["Slot number"].setStyleSheet(checkbox_style_num_slot())
         self.check_boxes["Stats"].setStyleSheet(checkbox_style_num_slot())
+        self.check_boxes["Fast rendering"].setStyleSheet(
+            checkbox_style_num_slot())
+        self.check_boxes["Export slot CSV"].setStyleSheet(
+            checkbox_style_num_slot())
+        self.check_boxes["Export masks"].setStyleSheet(
+            checkbox_style_num_slot())
+        self.check_boxes["Export grids CSV"].setStyleSheet(
+            checkbox_style_num_slot())
 
         self.entries = {}
         # self.dirname = r"C:\Users\TM273821\Desktop\Fluorescence\D24S1317 - Stoechio"
@@ -138,6 +153,10 @@ class ButtonFrame(QWidget):
         """Method to select folder and update checkbuttons"""
         self.select_folder()
         self.update_wafers()
+        if self.dirname:
+            self.scheduler.set_workers(
+                get_workers(self.settings_window.get_values()))
+            self.scheduler.start()
 
     def update_wafers(self):
         """Update the appearance of checkboxes based on the existing
@@ -349,6 +368,10 @@ class ButtonFrame(QWidget):
         group_opt.addWidget(self.check_boxes["Id. scale mapping (auto)"], 1, 1)
         group_opt.addWidget(self.check_boxes["Slot number"], 3, 0)
         group_opt.addWidget(self.check_boxes["Stats"], 3, 1)
+        group_opt.addWidget(self.check_boxes["Fast rendering"], 4, 0)
+        group_opt.addWidget(self.check_boxes["Export slot CSV"], 4, 1)
+        group_opt.addWidget(self.check_boxes["Export masks"], 5, 0)
+        group_opt.addWidget(self.check_boxes["Export grids CSV"], 5, 1)
 
         group_opt.setContentsMargins(10, 20, 10, 10)
 
@@ -376,34 +399,41 @@ class ButtonFrame(QWidget):
 
         # Retrieve input values, handling any potential errors
         values = self.settings_window.get_values()
-        wafer_slot = self.check_boxes["Slot number"].isChecked()
-        subdir = self.get_selected_wafer()
-        stats = self.check_boxes["Stats"].isChecked()
-
-
-        # Initialize common class for data processing
-        self.common_class = Common(self.dirname)
-
-        # Initialize the XRF class for photoluminescence analysis
-        self.wdxrf_class = XRF(self.dirname,values)
-
-        selected_tool = None  # Variable to track the selected tool
+        options = {text: checkbox.isChecked() for text, checkbox in
+                   self.check_boxes.items()}
 
         if not self.dirname or not any(
                 self.radio_buttons[attr].isChecked() for attr in
                 self.radio_buttons):
             return
+        # One run at a time
+        if self.processing_thread is not None:
+            return
 
-
-        total_steps = 0
-
-        if self.radio_buttons["MoS₂"].isChecked() or self.radio_buttons["WS₂"].isChecked():
-            total_steps = 5
-        if self.radio_buttons["Clean"].isChecked() :
-            total_steps = 1
+        selected_tool = None  # Variable to track the selected tool
+        if self.radio_buttons["MoS₂"].isChecked():
+            selected_tool = "MoS₂"
+        # elif self.radio_buttons["WS₂"].isChecked():
+        #     selected_tool = "WS2"
+        elif self.radio_buttons["Clean"].isChecked():
+            selected_tool = "Clean"
+
+        # Processing tasks (shared with the batch command line). Data
+        # processing is incremental: unchanged slots are skipped (use
+        # "Clean" to process everything again). The processing modules
+        # are imported on the first run
+        # pylint: disable=import-outside-toplevel
+        from wdxrf.Processing.pipeline import Pipeline
+        self.scheduler.set_workers(get_workers(values))
+        pipeline = Pipeline(self.dirname, values, options, selected_tool,
+                            self.scheduler)
+        self.common_class = pipeline.common_class
+        self.wdxrf_class = pipeline.wdxrf_class
+        total_steps = len(pipeline.tasks())
+        progress = ProgressEstimate(total_steps)
 
         progress_dialog = QProgressDialog("Data processing in progress...",
-                                          "Cancel", 0, total_steps, self)
+                                          "Cancel", 0, progress.maximum, self)
 
         font = QFont()
         font.setPointSize(20)  # Set the font size to 14
@@ -414,53 +444,70 @@ class ButtonFrame(QWidget):
         progress_dialog.setWindowModality(Qt.ApplicationModal)
         progress_dialog.setAutoClose(
             False)  # Ensure the dialog is not closed automatically
-        progress_dialog.setCancelButton(None)  # Hide the cancel button
+        progress_dialog.setAutoReset(False)
         progress_dialog.resize(400, 150)  # Set a larger size for the dialog
 
-        progress_dialog.show()
-
-        QApplication.processEvents()
+        # The pipeline runs in a background thread: the window stays
+        # responsive and shows the progress of each slot
+        self.processing_thread = PipelineThread(pipeline, self)
 
-        self.inc = 0  # Progress tracker
+        def on_start(task_name):
+            """Show the task in progress"""
+            progress.start_task(task_name)
+            progress_dialog.setLabelText(progress.text())
 
-        def ex_and_timer(task_name, task_function, *args, **kwargs):
-            """Execute function with timer"""
-            start_time = time.time()
-            progress_dialog.setLabelText(task_name)
-            QApplication.processEvents()
-            task_function(*args, **kwargs)
-            elapsed_time = time.time() - start_time
-            self.inc += 1
-            progress_dialog.setValue(self.inc)
+        def on_finish(task_name, elapsed_time):
+            """Update the progress"""
+            progress.finish_task()
+            progress_dialog.setValue(progress.value)
             print(f"{task_name} finished in {elapsed_time:.2f} s.")
 
-        if self.radio_buttons["MoS₂"].isChecked():
-            if self.check_boxes["Data processing"].isChecked():
-                ex_and_timer("Cleaning of folders", self.common_class.reboot,
-                             carac='WDXRF')
-                ex_and_timer("Calculate the thickness", self.wdxrf_class.database_settings)
-                ex_and_timer("Calculate mean and sigma", self.common_class.stats)
-                ex_and_timer("Generate the boxplots file", self.common_class.plot_boxplot_settings)
-
-            if self.check_boxes["Autoscale mapping"].isChecked():
-                ex_and_timer("Plot mapping w/ autoscale", self.wdxrf_class.plot, wafer_slot, False,
-                              stats=stats)
-                self.common_class.create_image_grid(zscale="Auto")
-
-            if self.check_boxes["Id. scale mapping"].isChecked():
-                ex_and_timer("Plot mapping w/ identical scale", self.wdxrf_class.plot, wafer_slot, 'Manual',
-                              stats=stats)
-                self.common_class.create_image_grid(zscale="Identical")
-            if self.check_boxes["Id. scale mapping (auto)"].isChecked():
-                ex_and_timer("Plot mapping w/ identical scale", self.wdxrf_class.plot, wafer_slot, 'Autoscale',
-                              stats=stats)
-                self.common_class.create_image_grid(zscale="Identical")
+        def on_slot(_, done, total):
+            """Show the slots done and the remaining time of the task"""
+            progress.slot_done(done, total)
+            progress_dialog.setValue(progress.value)
+            progress_dialog.setLabelText(progress.text())
+
+        def on_cancel():
+            """Stop after the running slots"""
+            self.processing_thread.cancel()
+            progress.cancelling = True
+            progress_dialog.setCancelButton(None)
+            progress_dialog.setLabelText(progress.text())
+            progress_dialog.show()
+
+        def on_done():
+            """Close the progress dialog and report the result"""
+            # Closing the dialog emits canceled
+            progress_dialog.canceled.disconnect(on_cancel)
+            progress_dialog.close()
+            self.processing_thread.deleteLater()
+            self.processing_thread = None
+            if pipeline.error is not None:
+                QMessageBox.critical(self, "Processing",
+                                     f"Processing failed:\n{pipeline.error}")
+            # Report the slots which failed (the other slots are processed)
+            elif pipeline.failures:
+                QMessageBox.warning(
+                    self, "Processing",
+                    "Processing failed for:\n" + "\n".join(
+                        str(failure) for failure in pipeline.failures))
+            elif pipeline.cancelled:
+                QMessageBox.information(self, "Processing",
+                                        "Processing cancelled.")
+
+        self.processing_thread.task_started.connect(on_start)
+        self.processing_thread.task_finished.connect(on_finish)
+        self.processing_thread.slot_done.connect(on_slot)
+        self.processing_thread.finished.connect(on_done)
+        progress_dialog.canceled.connect(on_cancel)
 
-        # elif self.radio_buttons["WS₂"].isChecked():
-        #     selected_tool = "WS2"
-        elif self.radio_buttons["Clean"].isChecked():
-            ex_and_timer("Cleaning of folders", self.common_class.reboot,
-                             carac='WDXRF')
-
-        # Close the progress dialog once processing is finished
-        progress_dialog.close()
+        progress_dialog.show()
+        self.processing_thread.start()
+
+    def stop_processing(self):
+        """Cancel the processing in progress, if any, and wait for the
+        running slots."""
+        if self.processing_thread is not None:
+            self.processing_thread.cancel()
+            self.processing_thread.wait()
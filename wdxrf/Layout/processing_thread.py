@@ -0,0 +1,109 @@
+"""
+Run the processing pipeline in a background thread, so that the window
+stays responsive, and report its progress with Qt signals.
+"""
+import time
+import threading
+from PyQt5.QtCore import QThread, pyqtSignal
+
+
+def format_duration(seconds):
+    """Return a duration as 'm:ss' (or 'h:mm:ss')."""
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+class PipelineThread(QThread):
+    """
+    Thread running a Pipeline. The callbacks of the pipeline are emitted
+    as signals, received by the GUI thread.
+    """
+
+    task_started = pyqtSignal(str)
+    task_finished = pyqtSignal(str, float)
+    # Key of the slot, slots done, slots of the task
+    slot_done = pyqtSignal(str, int, int)
+
+    def __init__(self, pipeline, parent=None):
+        super().__init__(parent)
+        self.pipeline = pipeline
+        self.cancel_event = threading.Event()
+
+    def run(self):
+        """Run the pipeline (errors are kept in pipeline.error)."""
+        try:
+            self.pipeline.run(
+                self.task_started.emit, self.task_finished.emit,
+                lambda key, done, total: self.slot_done.emit(
+                    str(key), done, total),
+                self.cancel_event)
+        except Exception as error:  # pylint: disable=broad-except
+            self.pipeline.error = error
+
+    def cancel(self):
+        """Ask the pipeline to stop after the running slots."""
+        self.cancel_event.set()
+
+
+class ProgressEstimate:
+    """
+    Progress of a run: tasks done, slots done in the current task, and
+    remaining time of the current task estimated from the time per slot.
+    """
+
+    # Steps of the progress bar per task
+    STEPS = 100
+
+    def __init__(self, total_tasks):
+        self.total_tasks = total_tasks
+        self.tasks_done = 0
+        self.task_name = ""
+        self.task_start = time.monotonic()
+        self.slots = None
+        self.cancelling = False
+
+    def start_task(self, task_name):
+        """Start a task."""
+        self.task_name = task_name
+        self.task_start = time.monotonic()
+        self.slots = None
+
+    def finish_task(self):
+        """Finish the current task."""
+        self.tasks_done += 1
+        self.slots = None
+
+    def slot_done(self, done, total):
+        """Record the slots done in the current task."""
+        self.slots = (done, total)
+
+    @property
+    def maximum(self):
+        """Maximum of the progress bar."""
+        return self.total_tasks * self.STEPS
+
+    @property
+    def value(self):
+        """Value of the progress bar."""
+        value = self.tasks_done * self.STEPS
+        if self.slots:
+            done, total = self.slots
+            value += self.STEPS * done // max(total, 1)
+        return min(value, self.maximum)
+
+    def text(self):
+        """Text of the progress dialog: task, slots and remaining time."""
+        if self.cancelling:
+            return "Cancelling: waiting for the running slots..."
+        lines = [f"{self.task_name} ({self.tasks_done + 1}/"
+                 f"{self.total_tasks})"]
+        if self.slots:
+            done, total = self.slots
+            elapsed = time.monotonic() - self.task_start
+            remaining = elapsed / done * (total - done) if done else 0
+            lines.append(f"Slot {done}/{total} - about "
+                         f"{format_duration(remaining)} left")
+        return "\n".join(lines)
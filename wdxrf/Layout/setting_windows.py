@@ -5,6 +5,8 @@ from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QH
     QGroupBox, QGridLayout, QLabel, QLineEdit, QPushButton)
 from PyQt5.QtGui import QFont
 from wdxrf.Layout.layouts_style import*
+from wdxrf.Processing.settings import SETTINGS_FOLDER, SETTINGS_FILE, \
+    SETTINGS_ENTRIES, parse_settings
 
 class SettingsWindow(QMainWindow):
     def __init__(self):
@@ -16,9 +18,9 @@ class SettingsWindow(QMainWindow):
         # Get the user's folder path (C:\Users\XXXXX)
         self.user_folder = os.path.expanduser("~")
 
-        # Define the new folder "PL" and the file to store settings
-        self.new_folder = os.path.join(self.user_folder, "WDXRF")
-        self.data_file = os.path.join(self.new_folder, "settings_data.json")
+        # Define the new folder "WDXRF" and the file to store settings
+        self.new_folder = SETTINGS_FOLDER
+        self.data_file = SETTINGS_FILE
         self.data = []  # Structure to store the table data
 
         # Ensure the folder exists
@@ -42,19 +44,7 @@ class SettingsWindow(QMainWindow):
         mapping_frame = QGroupBox("Plot/Mapping settings")
         mapping_layout = QGridLayout(mapping_frame)
 
-        entries = [
-            ("Wafer size (cm):", "20", 1, 0),
-            ("Edge Exclusion (cm):", "2.5", 2, 0),
-            ("Step (cm):", "0.5", 3, 0),
-            ("Columns on GUI:", "3", 4, 0),
-            ("Min density (ug.cm-2):", "0", 1, 2),
-            ("Max density (ug.cm-2):", "", 1, 4),
-            ("Min S/Mo:", "0", 2, 2),
-            ("Max S/Mo:", "3", 2, 4),
-            ("Min thickness (ML):", "0", 3, 2),
-            ("Max thickness (ML):", "", 3, 4),
-
-        ]
+        entries = SETTINGS_ENTRIES
 
         # Set font for QLineEdits
         # Set font for QLineEdits and QLabel
@@ -132,14 +122,8 @@ class SettingsWindow(QMainWindow):
 
     def get_values(self):
         """Return the values from the input fields and radio buttons as a dictionary."""
-        values = {}
-        for label_text, entry in self.line_edits.items():
-            try:
-                values[label_text] = float(entry.text())  # Convert to float
-            except ValueError:
-                values[label_text] = None  # Handle conversion error
-
-        return values
+        return parse_settings({label_text: entry.text() for
+                               label_text, entry in self.line_edits.items()})
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
@@ -1,20 +1,23 @@
 """
  A module to manage and display frames in the UI, providing functionality
  for plots and saving combined screenshots.
+ Matplotlib, pandas and the processing modules are imported when the
+ first plot is drawn, not when the window is shown.
  """
+# pylint: disable=import-outside-toplevel
 import os
-import numpy as np
+import time
+from PyQt5.QtCore import QTimer
 from PyQt5.QtWidgets import (QFrame, QWidget, QVBoxLayout,QPushButton,
                              QGridLayout, QGroupBox, QScrollArea)
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-import matplotlib.pyplot as plt
 from wdxrf.Plot.utils import create_savebutton, clear_frame
-from wdxrf.Plot.plot_functions import PlotFunctions
 from wdxrf.Plot.plot_style import*
 
 COULEUR_FOND = '#C6F4C6'
 
+# Time (s) spent drawing mappings before the events of the GUI are handled
+DRAW_BUDGET = 0.03
+
 class PlotFrame(QWidget):
     """
     A class to manage and display frames in the UI, providing functionality
@@ -23,21 +26,44 @@ class PlotFrame(QWidget):
     def __init__(self, layout, button_frame):
         super().__init__()
         self.layout = layout
-        self.plot_functions = PlotFunctions(layout, button_frame)
+        # Created on first use (see plot_functions)
+        self._plot_functions = None
         self.button_frame = button_frame
         self.init_ui()
 
         self.parameters = None
-        self.canvas = None
         self.canvas_boxplot = None
         self.dirname = None
-        self.fig = None
-        self.axs = None
         self.fig_boxplot = None
         self.axs_boxplot = None
         self.selected_options = None
         self.num_wafer_unsorted = None
         self.num_wafer = None
+        # Canvases of the mappings (title and one per wafer)
+        self.title_canvas = None
+        self.maps_widget = None
+        self.wafer_canvases = {}
+        # Wafers of which the mapping remains to be drawn, with the
+        # settings and what it must show (see update_maps)
+        self.pending_wafers = []
+        self.pending_values = None
+        self.pending_state = None
+        self.draw_timer = QTimer()
+        self.draw_timer.setInterval(0)
+        self.draw_timer.timeout.connect(self.draw_pending)
+        # What the canvases of the mappings and the boxplots depend on
+        self.map_layout = None
+        self.boxplot_layout = None
+
+    @property
+    def plot_functions(self):
+        """Plot functions, created (and their modules imported) on first
+        use."""
+        if self._plot_functions is None:
+            from wdxrf.Plot.plot_functions import PlotFunctions
+            self._plot_functions = PlotFunctions(self.layout,
+                                                 self.button_frame)
+        return self._plot_functions
 
 
     def init_ui(self):
@@ -133,95 +159,188 @@ class PlotFrame(QWidget):
         values = self.button_frame.get_values()
         self.column_number = int(values.get('Columns on GUI:', None))
 
-        def configure_axis(ax, xlabel, ylabel):
-            """Configure axis labels and title."""
-            ax.tick_params(axis='both', labelsize=8)
-            ax.set_xlabel(xlabel, fontsize=14)
-            ax.set_ylabel(ylabel, fontsize=14)
-
-        # Check if canvas_boxplot exists and needs to be deleted
-        if hasattr(self, 'canvas') and self.canvas is not None:
-            self.canvas.deleteLater()
-            self.canvas = None
-
-        # Check if canvas_boxplot exists and needs to be deleted
-        if hasattr(self,
-                   'canvas_boxplot') and self.canvas_boxplot is not None:
-            self.canvas_boxplot.deleteLater()
-            self.canvas_boxplot = None
-
-        clear_frame(self.frame_left_layout)
         # Handle invalid directory or empty selection
         self.dirname = self.button_frame.folder_var_changed()
         if not self.dirname or not selected_option:
+            self.clear_plots()
             return
 
+        # Another lot or wafer geometry: the canvases are created again
+        map_layout = self.get_map_layout(self.dirname, values)
+        if map_layout != self.map_layout:
+            self.clear_plots()
+            self.map_layout = map_layout
+
         self.selected_options = selected_option
 
         self.num_wafer_unsorted = self.update_wafer_count(self.selected_options)
         self.num_wafer = len(self.num_wafer_unsorted)
 
         if not self.num_wafer:
+            self.clear_plots()
             return
 
-        ## Define the fixed size for each sub-figure
-        fig_width, fig_height = 3, 3  # Set fixed size in inches for each
-        # sub-figure
+        self.update_maps(values)
+
+        # The boxplots depend on the wafers, not on the parameter
+        boxplot_layout = (self.dirname, tuple(self.num_wafer_unsorted),
+                          self.get_boxplot_mtimes(self.dirname))
+        if boxplot_layout != self.boxplot_layout:
+            self.boxplot_layout = boxplot_layout
+            self.update_boxplots()
+
+    def clear_plots(self):
+        """Remove the canvases of the mappings and of the boxplots."""
+        self.map_layout = None
+        self.boxplot_layout = None
+        if self._plot_functions is not None:
+            self._plot_functions.map_images.clear()
+        self.wafer_canvases = {}
+        self.pending_wafers = []
+        self.draw_timer.stop()
+        self.title_canvas = None
+        self.maps_widget = None
 
-        # Determine subplot grid dimensions
-        num_rows, num_cols = self.get_subplot_dimensions(self.num_wafer)
-
-        # Create figure and subplots
-        self.fig, self.axs = plt.subplots(num_rows, num_cols, figsize=(
-            num_cols * fig_width, num_rows * fig_height))
-        self.fig.suptitle(self.get_plot_title(), fontsize=20)
-
-        if isinstance(self.axs, np.ndarray):
-            self.axs = self.axs.flatten()
-        else:
-            self.axs = [self.axs]  # Enveloppe unique axe dans une liste
+        # Check if canvas_boxplot exists and needs to be deleted
+        if self.canvas_boxplot is not None:
+            self.canvas_boxplot.deleteLater()
+            self.canvas_boxplot = None
 
-        # Plot each wafer's data
-        for i, ax in enumerate(self.axs[:self.num_wafer]):
-            self.plot_functions.plot_wdxrf(self.dirname, ax,
-                                           self.num_wafer_unsorted[i],
-                                           self.parameters)
-            configure_axis(ax, 'X (cm)', 'Y (cm)')
-            ax.text(0.5, 1.05, f"Wafer {self.num_wafer_unsorted[i]}",
-                    fontsize=14, ha='center', transform=ax.transAxes)
+        clear_frame(self.frame_left_layout)
 
-        # Remove any extra subplots
-        for ax in self.axs[self.num_wafer:]:
-            ax.remove()
+    def update_maps(self, values):
+        """
+        Update the canvases of the mappings for the selected wafers: only
+        the canvases of the wafers added to the selection are created and
+        those of the removed ones deleted; the others are moved to their
+        place in the grid and, if the parameter or the color limits
+        changed, updated in place (blitting).
+        The mappings are drawn by draw_pending, a few at a time between
+        the events of the GUI.
+        """
+        from wdxrf.Plot.wafer_canvas import WaferCanvas, TitleCanvas, \
+            WAFER_FIGSIZE
+        fig_width, fig_height = WAFER_FIGSIZE
+        num_rows, num_cols = self.get_subplot_dimensions(self.num_wafer)
 
-        dpi = self.fig.get_dpi()
+        if self.maps_widget is None:
+            self.title_canvas = TitleCanvas(num_cols * fig_width)
+            self.maps_widget = QWidget()
+            self.frame_left_layout.addWidget(self.title_canvas)
+            self.frame_left_layout.addWidget(self.maps_widget)
+        self.title_canvas.set_title(self.get_plot_title(),
+                                    num_cols * fig_width)
+
+        for wafer in set(self.wafer_canvases) - set(self.num_wafer_unsorted):
+            canvas = self.wafer_canvases.pop(wafer)
+            self.plot_functions.map_images.pop(canvas.ax, None)
+            canvas.deleteLater()
+
+        # What the mappings show, besides the wafer
+        state = (self.parameters,
+                 self.plot_functions.get_limits(self.dirname,
+                                                self.parameters, values),
+                 self.get_boxplot_mtimes(self.dirname))
+
+        for i, wafer in enumerate(self.num_wafer_unsorted):
+            canvas = self.wafer_canvases.get(wafer)
+            if canvas is None:
+                canvas = WaferCanvas()
+                canvas.setParent(self.maps_widget)
+                self.wafer_canvases[wafer] = canvas
+            row, col = divmod(i, num_cols)
+            canvas.move(col * canvas.width(), row * canvas.height())
+            canvas.show()
+
+        self.maps_widget.setFixedSize(num_cols * canvas.width(),
+                                      num_rows * canvas.height())
+
+        self.pending_wafers = [wafer for wafer in self.num_wafer_unsorted
+                               if self.wafer_canvases[wafer].state != state]
+        self.pending_values = values
+        self.pending_state = state
+        if self.pending_wafers:
+            self.draw_timer.start()
+
+    def draw_pending(self):
+        """
+        Draw the pending mappings until DRAW_BUDGET is spent; the timer
+        calls it again for the next ones after the events of the GUI.
+        """
+        start_time = time.perf_counter()
+        while self.pending_wafers:
+            wafer = self.pending_wafers.pop(0)
+            canvas = self.wafer_canvases.get(wafer)
+            if canvas is None:
+                continue
+            self.draw_wafer(canvas, wafer, self.pending_values)
+            canvas.state = self.pending_state
+            if time.perf_counter() - start_time > DRAW_BUDGET:
+                return
+        self.draw_timer.stop()
+
+    def draw_wafer(self, canvas, wafer, values):
+        """
+        Draw the mapping of a wafer on its canvas: in place if the canvas
+        already shows a mapping, else on new axes.
+        """
+        if self.plot_functions.update_wdxrf(self.dirname, canvas.ax, wafer,
+                                            self.parameters, values):
+            canvas.refresh()
+            return
 
-        # Adjust canvas size based on the figure size and add it to the layout
-        self.canvas = FigureCanvas(self.fig)
-        canvas_width = int(
-            num_cols * fig_width * dpi * self.canvas.device_pixel_ratio)
-        canvas_height = int(
-            num_rows * fig_height * dpi * self.canvas.device_pixel_ratio)
-        self.canvas.setFixedSize(canvas_width, canvas_height)
-        self.frame_left.layout().addWidget(self.canvas)
-        self.canvas.draw()
+        self.plot_functions.map_images.pop(canvas.ax, None)
+        canvas.clear()
+        self.plot_functions.plot_wdxrf(self.dirname, canvas.ax, wafer,
+                                       self.parameters, values)
+        self.configure_axis(canvas.ax, 'X (cm)', 'Y (cm)')
+        canvas.ax.text(0.5, 1.05, f"Wafer {wafer}", fontsize=14,
+                       ha='center', transform=canvas.ax.transAxes)
+        image = self.plot_functions.map_images.get(canvas.ax)
+        if image is not None:
+            canvas.animate(image)
+        canvas.refresh()
+
+    @staticmethod
+    def configure_axis(ax, xlabel, ylabel):
+        """Configure axis labels and title."""
+        ax.tick_params(axis='both', labelsize=8)
+        ax.set_xlabel(xlabel, fontsize=14)
+        ax.set_ylabel(ylabel, fontsize=14)
+
+    def update_boxplots(self):
+        """Create the figure of the boxplots of the selected wafers."""
+        import numpy as np
+        import matplotlib.pyplot as plt
+        from matplotlib.backends.backend_qt5agg import \
+            FigureCanvasQTAgg as FigureCanvas
+        if self.canvas_boxplot is not None:
+            self.canvas_boxplot.deleteLater()
+            self.canvas_boxplot = None
+        if self.fig_boxplot is not None:
+            plt.close(self.fig_boxplot)
+            self.fig_boxplot = None
 
         # Define the fixed size for each sub-figure
         fig_width, fig_height = 4, 2.5
         num_cols = 1
-        num_rows, filepaths, labels = self.get_boxplot_dimensions()
+        num_rows, summaries, parameters, labels = \
+            self.get_boxplot_dimensions()
         # No boxplot ==> Return
         if num_rows == 0:
             return
-        print(num_rows, filepaths)
+        print(num_rows, parameters)
 
-        # Create figure and subplots
+        # Create figure and subplots (tight layout, which the
+        # figure.autolayout of the processing modules also set when they
+        # were imported first)
         self.fig_boxplot, self.axs_boxplot = plt.subplots(num_rows, num_cols,
                                                           figsize=(
                                                               num_cols *
                                                               fig_width,
                                                               num_rows *
-                                                              fig_height))
+                                                              fig_height),
+                                                          layout='tight')
 
         if isinstance(self.axs_boxplot, np.ndarray):
             self.axs_boxplot = self.axs_boxplot.flatten()
@@ -229,11 +348,11 @@ class PlotFrame(QWidget):
             self.axs_boxplot = [
                 self.axs_boxplot]  # Enveloppe unique axe dans une liste
 
-        self.plot_functions.create_boxplots(filepaths, labels,
+        self.plot_functions.create_boxplots(summaries, parameters, labels,
                                             self.axs_boxplot,
                                             self.num_wafer_unsorted)
 
-        dpi = self.fig.get_dpi()
+        dpi = self.fig_boxplot.get_dpi()
 
         # Adjust canvas size based on the figure size and add it to the layout
         self.canvas_boxplot = FigureCanvas(self.fig_boxplot)
@@ -253,38 +372,62 @@ class PlotFrame(QWidget):
         print(f"self.fig_boxplot "
               f"created with {len(self.fig_boxplot.axes)} axes.")
 
+    def get_map_layout(self, dirname, values):
+        """
+        Return what the canvases of the mappings depend on, besides the
+        wafers and the parameter: folder and wafer geometry.
+        """
+        return (dirname, values.get('Wafer size (cm):', None),
+                values.get('Edge Exclusion (cm):', None))
+
+    @staticmethod
+    def get_boxplot_mtimes(dirname):
+        """
+        Return the modification times of the boxplot files of a lot: they
+        change when the lot is processed again.
+        """
+        list_data_dir = os.path.join(dirname, "Liste_data")
+        if not os.path.isdir(list_data_dir):
+            return ()
+        return tuple(
+            (entry.name, entry.stat().st_mtime_ns)
+            for entry in sorted(os.scandir(list_data_dir),
+                                key=lambda entry: entry.name)
+            if entry.name.startswith("Boxplot_"))
 
     def get_boxplot_dimensions(self):
         """
-        Determine appropriate dimensions for subplots
-        based on the number of available wafer data files.
+        Return the number of boxplots, the quantile summaries of the lot
+        (see box_stats) and the parameters and axis labels of the
+        boxplots. The summaries of a lot processed by a former version are
+        computed from its Boxplot_*.csv files.
         """
-        # Define CSV files and corresponding axis labels
-        csv_files = [
-            ("Boxplot_density.csv", r"Density ($\mu g.cm^{-2}$)"),
-            ("Boxplot_Thickness.csv", "Number of layers"),
-            ("Boxplot_S_Mo.csv", "S/Mo atomic ratio"),
+        import pandas as pd
+        from wdxrf.Processing.box_stats import load_box_summaries, \
+            table_summaries
+        # Parameters, CSV files and corresponding axis labels
+        boxplots = [
+            ("Density", "Boxplot_Density.csv", r"Density ($\mu g.cm^{-2}$)"),
+            ("Number of layers", "Boxplot_Thickness.csv", "Number of layers"),
+            ("S_Mo", "Boxplot_S_Mo.csv", "S/Mo atomic ratio"),
         ]
-
-        # Initialize variables for valid files and labels
-        row_number = 0
-        filepaths = []
-        labels = []
-
-        # Check for the existence of each file
-        for param, ylabel in csv_files:
-            file_path = os.path.join(self.dirname, "Liste_data", param)
-
-            if os.path.exists(file_path):
-                print(f"The file '{param}' exists.")
-                row_number += 1
-                filepaths.append(file_path)
-                labels.append(ylabel)
-            else:
-                print(f"Warning: The file '{param}' was not found.")
-                return 0, [], []
-
-        return row_number, filepaths, labels
+        parameters = [parameter for parameter, _, _ in boxplots]
+        labels = [ylabel for _, _, ylabel in boxplots]
+
+        summaries = load_box_summaries(self.dirname)
+        if summaries is None:
+            frames = []
+            for parameter, filename, _ in boxplots:
+                file_path = os.path.join(self.dirname, "Liste_data",
+                                         filename)
+                if not os.path.exists(file_path):
+                    print(f"Warning: The file '{filename}' was not found.")
+                    return 0, None, [], []
+                frames.append(table_summaries(
+                    pd.read_csv(file_path, index_col=0), parameter))
+            summaries = pd.concat(frames, ignore_index=True)
+
+        return len(boxplots), summaries, parameters, labels
 
     def get_subplot_dimensions(self, num_wafer):
         """
@@ -4,6 +4,9 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from PyQt5.QtWidgets import QWidget
+from wdxrf.Processing.grid_store import load_grid, grid_files
+from wdxrf.Processing.box_stats import bxp_stats
+from wdxrf.Plot.viewer_cache import ViewerCache, file_key
 
 class PlotFunctions(QWidget):
     """Class for handling plot functionalities."""
@@ -16,33 +19,107 @@ class PlotFunctions(QWidget):
         self.step = None
         self.wafer_size = None
         self.edge_exclusion = None
+        # Image of the mapping drawn on each axes (see update_wdxrf)
+        self.map_images = {}
+        # Grids, masks and lot limits read from the files
+        self.cache = ViewerCache()
 
-    def plot_wdxrf(self, dirname, ax, numbers_str, parameters):
+    def plot_wdxrf(self, dirname, ax, numbers_str, parameters, values=None):
         """Add WDXRF mapping to the canvas."""
-        global filename
-        min_value = None
-        max_value = None
-        subdir = os.path.join(dirname, f"{numbers_str}")
-
-        # Select the correct file based on the parameter
-        file_mapping = {
-            "Density": "Density_grid_df.csv",
-            "Number of layers": "Number of layers_grid_df.csv",
-            "S_Mo": "S_Mo_grid_df.csv",
-        }
-        filename = file_mapping.get(parameters, None)
-        if not filename:
+        # Check the parameter
+        if parameters not in ("Density", "Number of layers", "S_Mo"):
             print(f"Invalid parameter: {parameters}")
             return
 
-        filepath = os.path.join(subdir, filename)
-        values = self.button_frame.get_values()
+        limits = self.get_limits(dirname, parameters, values)
+        if limits is None:
+            return
+        min_value, max_value = limits
+        radius = self.wafer_size / 2
+
+        # Plot the WDXRF mapping
+        mapping = self.load_mapping(dirname, numbers_str, parameters)
+        if mapping is not None:
+            grid_z, extent = mapping
+
+            # Plot data
+            plot = ax.imshow(grid_z, extent=extent, cmap='Spectral_r',
+                             vmin=min_value, vmax=max_value)
+            cbar = ax.figure.colorbar(plot, ax=ax, shrink=0.7)
+            cbar.ax.tick_params(labelsize=16)
+
+            ax.set_xlabel('X (cm)', fontsize=20)
+            ax.set_ylabel('Y (cm)', fontsize=20)
+            ax.tick_params(labelsize=14)
+
+            # Add wafer boundary
+            circle = plt.Circle((0, 0), radius - self.edge_exclusion,
+                                color='black', fill=False, linewidth=0.5)
+            ax.add_patch(circle)
+            ax.set_xlim(-radius, radius)
+            ax.set_ylim(-radius, radius)
+            # Keep the image to update it for another parameter
+            self.map_images[ax] = plot
+        else:
+            ax.text(0, 0, "No data available :(", fontsize=10, color='red',
+                    ha='center', va='center',
+                    bbox=dict(facecolor='white', alpha=0.5))
+            ax.set_xlabel('X (cm)', fontsize=20)
+            ax.set_ylabel('Y (cm)', fontsize=20)
+            ax.tick_params(labelsize=14)
+            ax.set_xlim(-radius, radius)
+            ax.set_ylim(-radius, radius)
+
+    def update_wdxrf(self, dirname, ax, numbers_str, parameters,
+                     values=None):
+        """
+        Update in place the WDXRF mapping drawn by plot_wdxrf on the axes:
+        only the data and the color limits of the image change (the
+        colorbar follows).
+
+        :return: False if the axes has no mapping or the new one cannot be
+        drawn (invalid parameter, no data): the axes must be drawn again.
+        """
+        plot = self.map_images.get(ax)
+        if plot is None or parameters not in ("Density", "Number of layers",
+                                              "S_Mo"):
+            return False
+
+        limits = self.get_limits(dirname, parameters, values)
+        mapping = self.load_mapping(dirname, numbers_str, parameters)
+        if limits is None or mapping is None:
+            return False
+        min_value, max_value = limits
+        grid_z, extent = mapping
+
+        plot.set_data(grid_z)
+        plot.set_extent(extent)
+        # Limits of the data when not set (autoscale)
+        plot.set_clim(grid_z.min() if min_value is None else min_value,
+                      grid_z.max() if max_value is None else max_value)
+        radius = self.wafer_size / 2
+        ax.set_xlim(-radius, radius)
+        ax.set_ylim(-radius, radius)
+        return True
+
+    def get_limits(self, dirname, parameters, values=None):
+        """
+        Return the color limits (min, max) of the mappings of a parameter,
+        (None, None) for autoscale, or None if they cannot be determined.
+
+        :param values: Settings values (default: read from the Settings
+        window).
+        """
+        min_value = None
+        max_value = None
+
+        if values is None:
+            values = self.button_frame.get_values()
         scale_value = self.button_frame.get_scale_values()
 
 
         self.wafer_size = values.get('Wafer size (cm):', None)
         self.edge_exclusion = values.get('Edge Exclusion (cm):', None)
-        radius = self.wafer_size / 2
         # Extract scale type
         
         scale_checkbox = scale_value.get('Scale Type', None)
@@ -64,110 +141,93 @@ class PlotFunctions(QWidget):
             print(f"Min: {min_value}, Max: {max_value}")
 
         elif scale_checkbox == 'Identical scale auto':
-            if parameters == "Density":
-                file_path = os.path.join(dirname, 'Liste_data', "Boxplot_Density.csv")
-                if not os.path.exists(file_path):
-                    print(f"Error: The file {file_path} does not exist.")
-                    return
-                data_frame = pd.read_csv(file_path)
-                max_value = data_frame.iloc[:, 1:].max().max()
-                min_value = data_frame.iloc[:, 1:].min().min()
-
-            elif parameters == "Number of layers":
-                file_path = os.path.join(dirname, 'Liste_data', "Boxplot_Thickness.csv")
-                if not os.path.exists(file_path):
-                    print(f"Error: The file {file_path} does not exist.")
-                    return
-                data_frame = pd.read_csv(file_path)
-                max_value = data_frame.iloc[:, 1:].max().max()
-                min_value = data_frame.iloc[:, 1:].min().min()
-
-            elif parameters == "S_Mo":
-                file_path = os.path.join(dirname, 'Liste_data', "Boxplot_S_Mo.csv")
+            boxplot_files = {"Density": "Boxplot_Density.csv",
+                             "Number of layers": "Boxplot_Thickness.csv",
+                             "S_Mo": "Boxplot_S_Mo.csv"}
+            if parameters in boxplot_files:
+                file_path = os.path.join(dirname, 'Liste_data',
+                                         boxplot_files[parameters])
                 if not os.path.exists(file_path):
                     print(f"Error: The file {file_path} does not exist.")
-                    return
-                data_frame = pd.read_csv(file_path)
-                max_value = data_frame.iloc[:, 1:].max().max()
-                min_value = data_frame.iloc[:, 1:].min().min()
+                    return None
+                min_value, max_value = self.cache.get(
+                    ('limits',) + file_key(file_path),
+                    lambda: self.read_lot_limits(file_path))
 
             print(f"Min: {min_value}, Max: {max_value}")
-        # Plot the WDXRF mapping
-        if os.path.exists(filepath):
-            data_frame = pd.read_csv(filepath, index_col=0, header=0)
-            print(len(data_frame))
-            if len(data_frame) < 2:
-                ax.text(0, 0, "No data available :(", fontsize=10, color='red',
-                        ha='center', va='center',
-                        bbox=dict(facecolor='white', alpha=0.5))
-                ax.set_xlabel('X (cm)', fontsize=20)
-                ax.set_ylabel('Y (cm)', fontsize=20)
-                ax.tick_params(labelsize=14)
-                ax.set_xlim(-radius, radius)
-                ax.set_ylim(-radius, radius)
-            else:
-                x_min = float(data_frame.columns[0])
-                x_max = float(data_frame.columns[-1])
-                y_min = float(data_frame.index[0])
-                y_max = float(data_frame.index[-1])
-
-                x_coords = data_frame.columns.astype(float)
-                y_coords = data_frame.index.astype(float)
-                X, Y = np.meshgrid(x_coords, y_coords)
-
-                # Mask data outside the wafer boundary
-                condition = X ** 2 + Y ** 2 >= (radius - self.edge_exclusion) ** 2
-                data_frame = data_frame.mask(condition)
-
-                # Plot data
-                plt.figure(figsize=(10, 6))
-                plot = ax.imshow(data_frame, extent=[x_min, x_max, y_max, y_min],
-                           cmap='Spectral_r',
-                          vmin=min_value if scale_checkbox in ["Identical scale",
-                                                               "Identical scale auto"] else None, vmax=max_value if scale_checkbox in [
-                                  "Identical scale",
-                                  "Identical scale auto"] else None
-                                )
-                cbar = plt.colorbar(plot, ax=ax, shrink=0.7)
-                cbar.ax.tick_params(labelsize=16)
-
-                ax.set_xlabel('X (cm)', fontsize=20)
-                ax.set_ylabel('Y (cm)', fontsize=20)
-                ax.tick_params(labelsize=14)
-
-                # Add wafer boundary
-                circle = plt.Circle((0, 0), radius - self.edge_exclusion,
-                                    color='black', fill=False, linewidth=0.5)
-                ax.add_patch(circle)
-                ax.set_xlim(-radius, radius)
-                ax.set_ylim(-radius, radius)
-        else:
-            ax.text(0, 0, "No data available :(", fontsize=10, color='red',
-                    ha='center', va='center',
-                    bbox=dict(facecolor='white', alpha=0.5))
-            ax.set_xlabel('X (cm)', fontsize=20)
-            ax.set_ylabel('Y (cm)', fontsize=20)
-            ax.tick_params(labelsize=14)
-            ax.set_xlim(-radius, radius)
-            ax.set_ylim(-radius, radius)
 
-    def create_boxplots(self, filepaths, labels, axs, selected_option_numbers):
-        """Create boxplots for selected data."""
-        for i, file_path in enumerate(filepaths):
-            print(os.path.basename(file_path))
-            data_frame = pd.read_csv(file_path)
-            filtered_columns = [col for col in selected_option_numbers
-                                if col in data_frame.columns]
-
-            if not filtered_columns:
+        if scale_checkbox not in ("Identical scale", "Identical scale auto"):
+            return None, None
+        return min_value, max_value
+
+    @staticmethod
+    def read_lot_limits(file_path):
+        """Return the min and max of the values of all the slots of a
+        boxplot file."""
+        data_frame = pd.read_csv(file_path)
+        max_value = data_frame.iloc[:, 1:].max().max()
+        min_value = data_frame.iloc[:, 1:].min().min()
+        return min_value, max_value
+
+    def load_mapping(self, dirname, numbers_str, parameters):
+        """
+        Return the grid of a wafer, masked outside the wafer boundary, and
+        its extent, or None if there is no data. The mappings are cached
+        until their files change.
+        """
+        subdir = os.path.join(dirname, f"{numbers_str}")
+        files = grid_files(subdir, parameters)
+        if not files:
+            return None
+        return self.cache.get(
+            ('mapping', self.wafer_size, self.edge_exclusion)
+            + file_key(*files),
+            lambda: self.read_mapping(subdir, parameters))
+
+    def read_mapping(self, subdir, parameters):
+        """Read the grid of a wafer (see load_mapping)."""
+        grid = load_grid(subdir, parameters, mmap=False)
+        if grid is None:
+            return None
+        grid_z, x_coords, y_coords = grid
+        print(len(grid_z))
+        if len(grid_z) < 2:
+            return None
+        x_min = float(x_coords[0])
+        x_max = float(x_coords[-1])
+        y_min = float(y_coords[0])
+        y_max = float(y_coords[-1])
+
+        # Mask data outside the wafer boundary (and NaN values)
+        condition = self.cache.get(
+            ('mask', x_coords.tobytes(), y_coords.tobytes(), self.wafer_size,
+             self.edge_exclusion),
+            lambda: self.wafer_mask(x_coords, y_coords))
+        grid_z = np.ma.masked_where(condition | np.isnan(grid_z), grid_z)
+        return grid_z, [x_min, x_max, y_max, y_min]
+
+    def wafer_mask(self, x_coords, y_coords):
+        """Return the mask of the grid points outside the wafer boundary."""
+        radius = self.wafer_size / 2
+        X, Y = np.meshgrid(x_coords, y_coords)
+        return X ** 2 + Y ** 2 >= (radius - self.edge_exclusion) ** 2
+
+    def create_boxplots(self, summaries, parameters, labels, axs,
+                        selected_option_numbers):
+        """
+        Create boxplots for selected data, from the quantile summaries of
+        the lot (see box_stats): the points are not read.
+        """
+        for i, parameter in enumerate(parameters):
+            stats = bxp_stats(summaries, parameter, selected_option_numbers)
+
+            if not stats:
                 print(f"Warning: None of the selected "
-                      f"columns are present in '{file_path}'.")
+                      f"wafers have a summary of '{parameter}'.")
                 continue
 
-            axs[i].boxplot([data_frame[col].dropna()
-                            for col in filtered_columns], showfliers=False)
+            axs[i].bxp(stats, showfliers=False)
             axs[i].set_xlabel('Wafer', fontsize=12)
             axs[i].set_ylabel(labels[i], fontsize=12)
-            axs[i].set_xticklabels(filtered_columns)
 
         plt.tight_layout()
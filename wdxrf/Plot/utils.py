@@ -1,8 +1,8 @@
 """Function to create the savebutton or to clean sur frame_layout (left)"""
+import sys
 from PyQt5.QtCore import Qt
 from PyQt5.QtWidgets import QPushButton, QFileDialog
 from PyQt5.QtGui import QPixmap, QPainter
-import matplotlib.pyplot as plt
 from wdxrf.Plot.plot_style import*
 
 def create_savebutton(layout, frame_left, frame_right):
@@ -55,9 +55,12 @@ def clear_frame(frame_left_layout):
             widget = item.widget()
             widget.deleteLater()
 
-    # Close any open Matplotlib figures
-    for fig in plt.get_fignums():
-        plt.close(fig)
+    # Close any open Matplotlib figures (none if pyplot is not imported
+    # yet)
+    plt = sys.modules.get('matplotlib.pyplot')
+    if plt is not None:
+        for fig in plt.get_fignums():
+            plt.close(fig)
 
 
 def clear_layout(layout):
@@ -0,0 +1,49 @@
+"""
+Cache of the data read by the viewer (mappings, masks and lot limits), so
+that switching between the parameters does not read the files again.
+"""
+import os
+from collections import OrderedDict
+
+# Number of entries kept (grids of about 25 slots x 3 parameters, masks
+# and limits)
+MAX_ENTRIES = 256
+
+
+def file_key(*paths):
+    """
+    Return the key of files: path and modification time of each, so that
+    a file rewritten by a processing run is read again.
+    """
+    return tuple((path, os.stat(path).st_mtime_ns) for path in paths)
+
+
+class ViewerCache:
+    """
+    Least recently used cache of values computed from files.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def get(self, key, load):
+        """
+        Return the value of the key, calling load() if it is not cached.
+
+        :param key: Hashable key (include file_key of the files read by
+        load).
+        :param load: Function returning the value (None is cached too).
+        """
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        value = load()
+        self.entries[key] = value
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        """Forget all the entries."""
+        self.entries.clear()
@@ -0,0 +1,150 @@
+"""
+Canvases of the viewer of the mappings.
+Each wafer has its own canvas, kept while the wafer is selected, so a
+change of the selection only adds or removes the canvases of the wafers
+concerned. The mapping (image, edge-exclusion circle, frame of the axes)
+and its colorbar are animated artists: they are drawn over a background
+kept from the last full draw, so a change of parameter only redraws them
+(blitting), not the axes, ticks and labels. The axes have a fixed layout,
+the same for all the wafers and parameters.
+"""
+import numpy as np
+from PyQt5.QtWidgets import QWidget
+from matplotlib.axes import Axes
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+
+# Size of the figure of a wafer and height of the title (inches)
+WAFER_FIGSIZE = (3, 3)
+TITLE_HEIGHT = 0.6
+
+# Positions (left, bottom, width, height; fraction of the figure) of the
+# axes of the mapping and of its colorbar, with room for colorbar labels
+# of 4 characters
+MAP_POSITION = (0.28, 0.29, 0.48, 0.48)
+COLORBAR_POSITION = (0.79, 0.245, 0.03, 0.57)
+
+
+def set_figure_size(canvas, width, height):
+    """Set the size (inches) of the figure and of its canvas widget."""
+    canvas.figure.set_size_inches(width, height)
+    dpi = canvas.figure.get_dpi()
+    canvas.setFixedSize(int(width * dpi * canvas.device_pixel_ratio),
+                        int(height * dpi * canvas.device_pixel_ratio))
+
+
+class WaferCanvas(FigureCanvas):
+    """
+    Canvas of the mapping of one wafer, redrawn by blitting.
+    """
+
+    def __init__(self, figsize=WAFER_FIGSIZE):
+        super().__init__(Figure(figsize=figsize, layout='none'))
+        set_figure_size(self, *figsize)
+        self.ax = self.figure.subplots()
+        self.ax.set_position(MAP_POSITION)
+        self.animated = []
+        self.background = None
+        # What the canvas shows (see PlotFrame.update_maps)
+        self.state = None
+        self.mpl_connect('draw_event', self.on_draw)
+
+    def resizeEvent(self, event):
+        """
+        Draw again only if the size of the figure changes: the canvas has
+        a fixed size, its first show does not need another draw.
+        """
+        size = np.array([event.size().width(), event.size().height()]) \
+            * self.device_pixel_ratio / self.figure.dpi
+        if np.allclose(size, self.figure.get_size_inches()):
+            QWidget.resizeEvent(self, event)
+            return
+        super().resizeEvent(event)
+
+    def clear(self):
+        """Remove the axes and everything drawn on them."""
+        self.figure.clear()
+        self.ax = self.figure.subplots()
+        self.ax.set_position(MAP_POSITION)
+        self.animated = []
+        self.background = None
+        self.state = None
+
+    def animate(self, image):
+        """
+        Redraw the mapping by blitting: the image, the patches and the
+        frame of its axes, and its colorbar (placed at COLORBAR_POSITION).
+        """
+        image.axes.set_position(MAP_POSITION)
+        self.animated = [image, *image.axes.patches,
+                         *image.axes.spines.values()]
+        if image.colorbar is not None:
+            image.colorbar.ax.set_position(COLORBAR_POSITION)
+            self.animated.append(image.colorbar.ax)
+        for artist in self.animated:
+            artist.set_animated(True)
+
+    def on_draw(self, _event):
+        """Keep the background of a full draw and draw the animated
+        artists over it."""
+        self.background = self.copy_from_bbox(self.figure.bbox)
+        self.draw_animated()
+
+    def draw_animated(self):
+        """Draw the animated artists with the renderer of the canvas."""
+        for artist in self.animated:
+            self.figure.draw_artist(artist)
+
+    def fits(self):
+        """Return whether the tick labels of the animated axes (colorbar)
+        fit in the width of the figure."""
+        renderer = self.get_renderer()
+        figure_box = self.figure.bbox
+        for axes in self.animated:
+            if not isinstance(axes, Axes):
+                continue
+            for label in axes.get_xticklabels() + axes.get_yticklabels():
+                box = label.get_window_extent(renderer)
+                if label.get_text() and (box.x0 < figure_box.x0
+                                         or box.x1 > figure_box.x1):
+                    return False
+        return True
+
+    def refresh(self):
+        """
+        Draw the animated artists over the background, or the whole
+        figure if there is no background yet. If the tick labels of the
+        colorbar do not fit, the figure gets a tight layout instead of the
+        fixed one.
+        """
+        if not self.fits():
+            self.figure.tight_layout()
+            self.background = None
+        if self.background is None:
+            self.draw()
+            return
+        self.restore_region(self.background)
+        self.draw_animated()
+        self.blit(self.figure.bbox)
+
+
+class TitleCanvas(FigureCanvas):
+    """
+    Canvas of the title of the mappings, above the canvases of the wafers.
+    """
+
+    def __init__(self, width, fontsize=20):
+        super().__init__(Figure(figsize=(width, TITLE_HEIGHT),
+                                layout='none'))
+        set_figure_size(self, width, TITLE_HEIGHT)
+        self.text = self.figure.text(0.5, 0.5, "", fontsize=fontsize,
+                                     ha='center', va='center')
+
+    def set_title(self, title, width):
+        """Change the title and the width (inches) of the canvas."""
+        if title == self.text.get_text() \
+                and width == self.figure.get_figwidth():
+            return
+        self.text.set_text(title)
+        set_figure_size(self, width, TITLE_HEIGHT)
+        self.draw_idle()
@@ -0,0 +1,30 @@
+"""
+Atomic
+This module writes the files of a lot (lot data, grids, manifest...) and
+of the interpolation cache through a temporary file in the same folder,
+then replaces the target at once: a reader never sees a partial file, and
+an interrupted write leaves neither a partial target nor a temporary file.
+"""
+import os
+import tempfile
+
+
+def atomic_save(filepath, save_function, mode='wb'):
+    """
+    Write a file through a temporary file and an atomic replace. The
+    temporary file is removed if the write fails.
+
+    :param save_function: Function writing the content to the open file
+    object given as argument.
+    :param mode: Mode of the file ('wb' or 'w').
+    """
+    folder = os.path.dirname(filepath)
+    handle, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    try:
+        with os.fdopen(handle, mode) as file:
+            save_function(file)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
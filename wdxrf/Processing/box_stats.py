@@ -0,0 +1,113 @@
+"""
+Box statistics
+This module computes the quantile summaries of the boxplots (quartiles,
+median, whiskers and number of points of each parameter of each slot) in
+one grouped pass over the lot data. They are saved with the statistics of
+the lot (Liste_data/Boxplot_stats.csv), so that the boxplots are drawn
+with Axes.bxp, without the points of the slots.
+The summaries are those of matplotlib's boxplot (linear quantiles,
+whiskers at the furthest points within 1.5 IQR of the quartiles).
+"""
+import os
+import numpy as np
+import pandas as pd
+
+BOX_STATS_FILENAME = "Boxplot_stats.csv"
+BOX_COLUMNS = ['Slot', 'Parameters', 'count', 'whislo', 'q1', 'med', 'q3',
+               'whishi']
+# Reach of the whiskers (times the interquartile range)
+WHIS = 1.5
+
+
+def box_stats_path(dirname):
+    """Return the path of the quantile summaries of a lot."""
+    return os.path.join(dirname, "Liste_data", BOX_STATS_FILENAME)
+
+
+def box_summaries(data_frame, parameters, slots=None):
+    """
+    Compute the quantile summaries of the parameters of each slot.
+
+    :param data_frame: Points of the lot, with a 'Slot' column (see
+    lot_data.load_lot_data). Missing values are ignored.
+    :param parameters: Columns summarized.
+    :param slots: Slots of the result, in order (default: the slots of
+    the data). A slot without points has NaN summaries.
+    :return: DataFrame with one row per slot and parameter (BOX_COLUMNS).
+    """
+    if slots is None:
+        slots = pd.unique(data_frame['Slot'])
+    slots = [str(slot) for slot in slots]
+    slot_codes = pd.Categorical(data_frame['Slot'].astype(str),
+                                categories=slots)
+    values = data_frame[parameters]
+    grouped = values.groupby(slot_codes, observed=False)
+    quartiles = grouped.quantile([0.25, 0.5, 0.75])
+    q1, med, q3 = (quartiles.xs(q, level=1).to_numpy()
+                   for q in (0.25, 0.5, 0.75))
+
+    # Whiskers: furthest points within WHIS IQR of the quartiles (the
+    # quartiles if there is none), bounds of the slot of each point
+    iqr = q3 - q1
+    codes = slot_codes.codes
+    low = (q1 - WHIS * iqr)[codes]
+    high = (q3 + WHIS * iqr)[codes]
+    whislo = np.fmin(q1, values.where(values >= low).groupby(
+        slot_codes, observed=False).min().to_numpy())
+    whishi = np.fmax(q3, values.where(values <= high).groupby(
+        slot_codes, observed=False).max().to_numpy())
+
+    return pd.DataFrame({
+        'Slot': np.repeat(slots, len(parameters)),
+        'Parameters': np.tile(parameters, len(slots)),
+        'count': grouped.count().to_numpy().ravel(),
+        'whislo': whislo.ravel(),
+        'q1': q1.ravel(),
+        'med': med.ravel(),
+        'q3': q3.ravel(),
+        'whishi': whishi.ravel(),
+    }, columns=BOX_COLUMNS)
+
+
+def table_summaries(table, parameter):
+    """
+    Compute the quantile summaries of a boxplot table (one column per
+    slot, see function_common.boxplot_tables).
+    """
+    points = table.melt(var_name='Slot', value_name=parameter)
+    return box_summaries(points, [parameter], list(table.columns))
+
+
+def load_box_summaries(dirname):
+    """Return the quantile summaries of a lot, or None if not found."""
+    filepath = box_stats_path(dirname)
+    if not os.path.exists(filepath):
+        return None
+    return pd.read_csv(filepath, dtype={'Slot': str})
+
+
+def slot_key(slot):
+    """Return the key of a slot in the summaries: its number if its name
+    is one (the slot '01' is the slot 1), else its name."""
+    slot = str(slot)
+    return str(int(slot)) if slot.isdigit() else slot
+
+
+def bxp_stats(summaries, parameter, slots=None):
+    """
+    Return the summaries of a parameter as the statistics of Axes.bxp,
+    labelled by slot.
+
+    :param slots: Slots drawn, in order (default: all the slots of the
+    summaries), by name or number (see slot_key). The slots without
+    points are skipped.
+    """
+    rows = summaries[summaries['Parameters'] == parameter]
+    if slots is not None:
+        rows = rows.set_index(rows['Slot'].map(slot_key)).reindex(
+            [slot_key(slot) for slot in slots])
+        rows = rows[rows['count'] > 0]
+    return [{'label': row.Slot, 'whislo': row.whislo, 'q1': row.q1,
+             'med': row.med, 'q3': row.q3, 'whishi': row.whishi,
+             'fliers': []}
+            for row in rows.itertuples()]
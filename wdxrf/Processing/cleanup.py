@@ -0,0 +1,103 @@
+"""
+Cleanup
+This module deletes the files and folders created by XRF2D in a lot. The
+targets are listed from the manifest of the lot: the outputs recorded by
+the processing stages, the output folders (Graphe, Liste_data...) of the
+lot and of its slots, and the other files XRF2D creates in the slots,
+found by one listing of each slot folder (also those written by former
+versions). The output folders are not walked, whatever their size; a lot
+without manifest is scanned (see scanner).
+The targets can be listed without deleting anything (dry run), and
+deleted by a pool of threads, which helps on network shares.
+"""
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from wdxrf.Processing.manifest import Manifest
+from wdxrf.Processing.scanner import get_index, is_derived_file, \
+    OUTPUT_FOLDERS
+
+
+def _is_inside(path, folders):
+    """Return True if the path is in one of the folders."""
+    return any(path.startswith(folder + os.sep) for folder in folders)
+
+
+def manifest_targets(dirname):
+    """
+    Return the output folders and the files created by XRF2D in a lot,
+    from its manifest, or None if the lot has no manifest.
+
+    :return: Tuple (folders, files) of the existing paths. The files in
+    the folders are not listed.
+    """
+    manifest = Manifest(dirname)
+    if not manifest.stages:
+        return None
+    root = manifest.dirname
+    slot_dirs = sorted(manifest.slot_signatures())
+
+    folders = [os.path.join(parent, folder)
+               for parent in [root] + slot_dirs
+               for folder in OUTPUT_FOLDERS
+               if os.path.isdir(os.path.join(parent, folder))]
+
+    files = []
+    for entries in manifest.stages.values():
+        for entry in entries.values():
+            files.extend(os.path.normpath(os.path.join(root, output))
+                         for output in entry.get("outputs", []))
+    # Files created in the slots, also by former versions (not in the
+    # manifest): grids, masks, data_DP.csv...
+    for slot_dir in slot_dirs:
+        try:
+            with os.scandir(slot_dir) as entries:
+                files.extend(entry.path for entry in entries
+                             if entry.is_file()
+                             and is_derived_file(entry.name))
+        except FileNotFoundError:
+            continue
+    files = [path for path in dict.fromkeys(files)
+             if not _is_inside(path, folders) and os.path.isfile(path)]
+    return folders, files
+
+
+def cleanup_targets(dirname):
+    """
+    Return the output folders and the files created by XRF2D in a lot:
+    from its manifest, or from a scan of the lot if it has none.
+
+    :return: Tuple (folders, files).
+    """
+    targets = manifest_targets(dirname)
+    if targets is not None:
+        return targets
+    index = get_index(dirname)
+    return list(index.output_dirs), list(index.derived_files)
+
+
+def delete_path(path):
+    """Delete a file or a folder (nothing if it no longer exists)."""
+    try:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    except FileNotFoundError:
+        return
+    print(f"Delete: {path}")
+
+
+def delete_paths(paths, workers=None):
+    """
+    Delete files and folders.
+
+    :param workers: Number of threads deleting the paths (default: one,
+    in the calling thread).
+    """
+    if workers and workers > 1 and len(paths) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(delete_path, paths))
+    else:
+        for path in paths:
+            delete_path(path)
@@ -0,0 +1,91 @@
+"""
+Conversion
+This module converts raw WDXRF measurements into the processed database
+(X/Y position, density, S/Mo atomic ratio and number of layers).
+All computations operate on whole columns at once.
+"""
+import numpy as np
+import pandas as pd
+
+# Molar mass of Mo and S; and Mo/unit
+MOLAR_MO = 95.95
+MOLAR_S = 32.07
+MO_UNIT = 11.6372403697997
+AVOGADRO = 6.022e23
+
+# Columns of the raw file: radius (mm), angle (deg), density (ug.cm-2),
+# Mo atomic percentage and a last column only used to drop incomplete rows
+RAW_COLUMNS = [3, 4, 5, 7, 9]
+DATA_COLUMNS = ['X', 'Y', 'Density', 'S_Mo', 'Number of layers']
+
+
+def read_raw_csv(filepath):
+    """
+    Read the relevant columns of a raw WDXRF CSV file.
+
+    :param filepath: Path to the raw CSV file.
+    :return: DataFrame without incomplete rows.
+    """
+    data_frame = pd.read_csv(filepath, header=None, skiprows=3,
+                             usecols=RAW_COLUMNS)
+    # Remove rows with missing data
+    return data_frame.dropna()
+
+
+def convert_measurements(radius, angle, density, mo_percent):
+    """
+    Convert raw measurement columns into Cartesian positions, S/Mo ratio
+    and thickness.
+
+    :param radius: Radial position of each point (mm).
+    :param angle: Angular position of each point (deg).
+    :param density: Surface density of each point (ug.cm-2).
+    :param mo_percent: Mo atomic percentage of each point.
+    :return: Tuple of arrays (X, Y, density, S/Mo, number of layers).
+    """
+    radius = np.asarray(radius, dtype=float)
+    density = np.asarray(density, dtype=float)
+    mo_percent = np.asarray(mo_percent, dtype=float)
+
+    # Convert polar coordinates (radius, angle) to Cartesian coordinates
+    angle_rad = np.radians(np.asarray(angle, dtype=float) - 90)
+    x = radius * np.sin(angle_rad) / 10
+    y = radius * np.cos(angle_rad) / 10
+
+    # Calculate S/Mo atomic ratio
+    atomic_sulf_perc = 100 - mo_percent
+    s_mo_ratio = atomic_sulf_perc / mo_percent
+
+    # Calculate thickness using atomic properties
+    um_molar_cm2_mo = density / (MOLAR_MO + atomic_sulf_perc * MOLAR_S
+                                 / mo_percent)
+    molar_cm2_mo = um_molar_cm2_mo * 1e-20
+    mo_unit_calculated = molar_cm2_mo * AVOGADRO
+    thickness = mo_unit_calculated / MO_UNIT
+
+    return x, y, density, s_mo_ratio, thickness
+
+
+def convert_raw_data(data_frame):
+    """
+    Convert a raw DataFrame (as returned by read_raw_csv) into the
+    processed database.
+
+    :param data_frame: Raw DataFrame with the RAW_COLUMNS columns.
+    :return: DataFrame with DATA_COLUMNS, rounded to 2 decimals.
+    """
+    columns = data_frame.to_numpy(dtype=float)
+    converted = convert_measurements(columns[:, 0], columns[:, 1],
+                                     columns[:, 2], columns[:, 3])
+    data = pd.DataFrame(np.column_stack(converted), columns=DATA_COLUMNS)
+    return data.round(2)
+
+
+def process_raw_file(filepath):
+    """
+    Read a raw WDXRF CSV file and return the processed database.
+
+    :param filepath: Path to the raw CSV file.
+    :return: DataFrame with DATA_COLUMNS.
+    """
+    return convert_raw_data(read_raw_csv(filepath))
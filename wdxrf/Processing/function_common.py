@@ -5,17 +5,137 @@ This module contains functions and classes which are common to all
 characterizations.
 """
 import os
-import math
-import shutil
-import matplotlib.pyplot as plt
 import pandas as pd
 from matplotlib import rcParams
-from PIL import Image
+from matplotlib.figure import Figure
 import numpy as np
+from wdxrf.Processing.lot_data import load_slot_index, load_lot_data
+from wdxrf.Processing.scanner import get_index
+from wdxrf.Processing.manifest import Manifest
+from wdxrf.Processing.scheduler import use_scheduler, report_failures
+from wdxrf.Processing.montage import build_montage
+from wdxrf.Processing.profiling import measure
+from wdxrf.Processing.cleanup import cleanup_targets, delete_paths
+from wdxrf.Processing.box_stats import box_summaries, box_stats_path, \
+    load_box_summaries, bxp_stats, BOX_COLUMNS
+
+# Value columns of the processed data
+PARAMETERS = ['Density', 'S_Mo', 'Number of layers']
+# Columns of Liste_data/Stats.csv
+STATS_COLUMNS = ['Slot', 'Parameters', 'mean', '3sigma', 'min', 'max',
+                 'uniformity']
+
+# File name and axis label of the boxplot of each parameter
+BOXPLOT_FILES = {
+    'Density': ('Density', r'Density ($\mu g.cm^{-2}$)'),
+    'S_Mo': ('S_Mo', r'S/Mo atomic ratio'),
+    'Number of layers': ('Thickness', r'Number of layers'),
+}
 
 rcParams.update({'figure.autolayout': True})
 
 
+def lot_stats(data_frame, slots=None, parameters=PARAMETERS):
+    """
+    Calculate the mean, 3sigma, min, max and uniformity (%) of each
+    parameter of each slot, in one grouped pass over the data of the lot.
+
+    :param data_frame: Data of the lot, with a 'Slot' column (see
+    lot_data.load_lot_data).
+    :param slots: Slots of the result, in order (default: the slots of
+    the data). A slot without points has NaN statistics.
+    :return: DataFrame with one row per slot and parameter (STATS_COLUMNS).
+    """
+    if slots is None:
+        slots = pd.unique(data_frame['Slot'])
+    grouped = data_frame.groupby(
+        pd.Categorical(data_frame['Slot'], categories=slots),
+        observed=False)[parameters]
+    mean = grouped.mean().to_numpy().ravel()
+    sigma = 3 * grouped.std().to_numpy().ravel()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        uniformity = np.where(mean != 0,
+                              np.maximum((1 - sigma / mean) * 100, 0), 0)
+    # Numeric slot names are written as numbers
+    slot_values = [float(slot) if str(slot).isdigit() else slot
+                   for slot in slots]
+    return pd.DataFrame({
+        'Slot': np.repeat(np.array(slot_values, dtype=object),
+                          len(parameters)),
+        'Parameters': np.tile(parameters, len(slots)),
+        'mean': mean,
+        '3sigma': sigma,
+        'min': grouped.min().to_numpy().ravel(),
+        'max': grouped.max().to_numpy().ravel(),
+        'uniformity': uniformity,
+    }, columns=STATS_COLUMNS)
+
+
+def boxplot_tables(dirname, parameters=PARAMETERS):
+    """
+    Build the boxplot tables of the parameters from one read of the lot
+    data: one column per slot (sorted by number), indexed by the 'X / Y'
+    positions of the last slot.
+
+    :return: Tuple (dictionary parameter -> table, names of the slots of
+    the columns of the tables, in order). The columns are the slot
+    numbers, so a slot named '01' is the column 1. Empty if the lot has
+    not been processed.
+    """
+    slot_index = load_slot_index(dirname)
+    data_frame = load_lot_data(dirname, ['X', 'Y'] + parameters)
+    if slot_index is None or data_frame is None:
+        return {}, []
+    bounds = np.concatenate([[0], np.cumsum(slot_index['Count'])])
+    slots = [(slot, start, end) for slot, start, end in zip(
+        slot_index['Slot'], bounds[:-1], bounds[1:]) if end > start]
+    x_y = None
+    if slots:
+        _, start, end = slots[-1]
+        positions = data_frame.iloc[start:end].reset_index(drop=True)
+        x_y = positions['X'].astype(str) + " / " + \
+            positions['Y'].astype(str)
+    # Slots sorted by number, the names which are not numbers last
+    numbers = pd.to_numeric(pd.Series([slot for slot, _, _ in slots],
+                                      dtype=object), errors='coerce')
+    slots = [slots[index] for index in
+             np.argsort(numbers.to_numpy(dtype=float), kind='stable')]
+
+    tables = {}
+    for parameter in parameters:
+        values = data_frame[parameter]
+        table = pd.DataFrame({
+            slot: values.iloc[start:end].reset_index(drop=True)
+            for slot, start, end in slots})
+        table.columns = pd.to_numeric(table.columns, errors='coerce')
+        # Vérifiez les colonnes ayant des valeurs NaN après conversion
+        if table.columns.isnull().any():
+            print("Certaines colonnes ne sont pas convertibles en nombres !")
+        table['X_Y'] = x_y
+        tables[parameter] = table.set_index('X_Y')
+    return tables, [slot for slot, _, _ in slots]
+
+
+def render_boxplot(stats, ylabel, filepath):
+    """
+    Save the boxplot figure of the quantile summaries of the slots (see
+    box_stats.bxp_stats).
+
+    :return: filepath.
+    """
+    # Figure without pyplot: the pipeline may run outside the GUI thread
+    with measure("boxplot", items=len(stats)):
+        fig = Figure(figsize=(12, 8))
+        ax = fig.subplots()
+        ax.tick_params(axis='both', which='major', labelsize=15)
+        ax.bxp(stats, showfliers=False)
+        ax.set_xlabel('Wafer', fontsize=26)
+
+        ax.set_ylabel(ylabel, fontsize=26)
+        fig.savefig(filepath, bbox_inches='tight')
+    return filepath
+
+
 class Common:
     """
     Common Class
@@ -25,9 +145,13 @@ class Common:
     def __init__(self, dirname):
         self.dirname = dirname
 
-    def create_image_grid(self, zscale=None):
+    def create_image_grid(self, zscale=None, scale=1.0, tiles=None,
+                          workers=None):
         """
         Plots an image grid based on selected zscale and material type.
+        The images are pasted one at a time (see montage), downscaled by
+        scale; those kept in tiles (montage.TileStore) are not read from
+        the files.
         """
 
         # Define image names based on zscale
@@ -40,258 +164,152 @@ class Common:
 
         # Get sorted subfolders
         def sort_key(subfolder_name):
-            parts = subfolder_name.split("\\")
+            parts = subfolder_name.split(os.sep)
             for part in parts:
                 if part.isdigit():
                     return int(part)
             return float('inf')
 
-        subfolders = sorted(
-            [f.path for f in os.scandir(self.dirname) if f.is_dir()],
-            key=sort_key
-        )
+        subfolders = sorted(get_index(self.dirname).subfolders, key=sort_key)
 
-        # Calculate grid dimensions
-        num_subfolders = len(subfolders)
-        columns = min(5, num_subfolders)  # Maximum of 5 columns
-        rows = math.ceil(
-            num_subfolders / columns)  # Adjust rows based on total subfolders
-
-        # Load images from subfolders
-        images_list = []
+        # Save merged grid images
+        save_path = os.path.join(self.dirname, "Graphe", "Mapping")
+        os.makedirs(save_path, exist_ok=True)
         for image_name in image_names:
-            sub_images = [
-                Image.open(os.path.join(subfolder, "Mapping", image_name))
+            # Images of the subfolders
+            image_paths = [
+                os.path.join(subfolder, "Mapping", image_name)
                 for subfolder in subfolders
                 if
                 os.path.exists(os.path.join(subfolder, "Mapping", image_name))
             ]
-            images_list.append(sub_images)
-
-        # Determine grid dimensions
-        grid_images = []
-        for sub_images in images_list:
-            if not sub_images:
+            if not image_paths:
                 continue  # Skip empty image lists
-            image_width, image_height = sub_images[
-                0].size  # Assuming all images have the same size
-            spacing = 50  # Space between images
-            grid_width = columns * image_width + (columns - 1) * spacing
-            grid_height = rows * image_height + (rows - 1) * spacing
 
-            # Create blank grid image
-            grid_image = Image.new('RGB', (grid_width, grid_height),
-                                   (255, 255, 255))
-
-            # Paste each image into the grid
-            for idx, image in enumerate(sub_images):
-                x = (idx % columns) * (image_width + spacing)
-                y = (idx // columns) * (image_height + spacing)
-                grid_image.paste(image, (x, y))
-
-            grid_images.append(grid_image)
-
-        # Save merged grid images
-        save_path = os.path.join(self.dirname, "Graphe", "Mapping")
-        os.makedirs(save_path, exist_ok=True)
-        for idx, grid_image in enumerate(grid_images):
-            output_path = os.path.join(save_path, f"All_{image_names[idx]}")
-            grid_image.save(output_path)
+            # The grid has places for all the subfolders
+            with measure("montage", items=len(image_paths)):
+                output_path = build_montage(
+                    image_paths, os.path.join(save_path, f"All_{image_name}"),
+                    scale, tiles, workers, count=len(subfolders))
             print(f"Saved: {output_path}")
 
-    def reboot(self, carac='None'):
+    def reboot(self, carac='None', dry_run=False, workers=None):
         """
-        Delete unnecessary files.
+        Delete unnecessary files: the output folders, and for 'WDXRF' the
+        files created in the slot folders, listed from the manifest of
+        the lot (see cleanup).
+
+        :param dry_run: If True, only print what would be deleted.
+        :param workers: Number of threads deleting the files (default:
+        one).
+        :return: List of the paths deleted (or which would be).
         """
-        for root, dirs, files in os.walk(self.dirname):
-            for folder in ["Graphe", "Mapping", "Spectra", "raw_data",
-                           "Liste_data"]:
-                path = os.path.join(self.dirname, folder)
-                path_2 = os.path.join(root, folder)
-
-                if os.path.exists(path):
-                    shutil.rmtree(path)
-                    print(f"Delete: {path}")
-
-                if os.path.exists(path_2):
-                    shutil.rmtree(path_2)
-                    print(f"Delete: {path_2}")
-
-        filenames_to_remove = {"WDXRF": ["data_DP.csv", ".png",".npy",
-                                         "Parameters_stats.csv",
-                                         "Number of layers_grid_df.csv",
-                                         "Parameters.csv",
-                                         "Density_grid_df.csv",
-                                         "S_Mo_grid_df.csv"],}
-
-        if carac in filenames_to_remove:
-            for subdir, dirs, files in os.walk(self.dirname):
-                for file in files:
-                    filepath = os.path.join(subdir, file)
-                    if any(name in filepath for name in
-                           filenames_to_remove[carac]):
-                        os.remove(filepath)
-    
-    def stats(self):
+        folders, files = cleanup_targets(self.dirname)
+        paths = folders + (files if carac == "WDXRF" else [])
+        if dry_run:
+            for path in paths:
+                print(f"Would delete: {path}")
+        else:
+            delete_paths(paths, workers)
+        return paths
+
+    def stats(self, force=False):
         """
-            stats function
-            Create Parameters files. Calculate the mean value for each
-            .
+        stats function
+        Calculate the mean, 3sigma, min, max and uniformity of each
+        parameter of each slot (see lot_stats) and save them as
+        Liste_data/Stats.csv, with the quantile summaries of the boxplots
+        (see box_stats).
+        Skipped if the data of the lot is unchanged since the previous
+        run, unless force is True.
         """
 
         path_liste = os.path.join(self.dirname, 'Liste_data')
         if not os.path.exists(path_liste):
             os.makedirs(path_liste)
 
-        filename = "data_DP.csv"
-        filename_parameters = 'Parameters.csv'
-        for subdir, _, files in os.walk(self.dirname):
-            for file in files:
-                filepat = subdir + os.sep
-                filepath = subdir + os.sep + file
-                if filepath.endswith(filename):
-                    os.chdir(filepat)
-                    data_frame = pd.read_csv(filepath)
-                    stat = data_frame.describe()
-                    mod_dataframe = stat.drop(
-                        ['count', '25%', '50%', '75%'])
-                    mod_dataframe.iloc[1, :] = mod_dataframe.iloc[1, :] * 3
-                    mod_dataframe = mod_dataframe.rename(
-                        index={'std': '3sigma'})
-                    mod_dataframe = mod_dataframe.transpose()
-
-                    mod_dataframe.to_csv(filename_parameters)
-                    mod_dataframe = mod_dataframe.drop(
-                        ['X', 'Y'])
-
-                    slot_number = \
-                        os.path.split(os.path.dirname(filepath))[
-                            -1]
-                    mod_dataframe['Slot'] = slot_number
-                    mod_dataframe.to_csv(filename_parameters)
-
-        parameters_dataframe = pd.DataFrame(
-            columns=['Unnamed: 0', 'mean', '3sigma', 'min', 'max'])
-        for subdir, dirs, files in os.walk(self.dirname):
-            for file in files:
-                filepat = subdir + os.sep
-                filepath = subdir + os.sep + file
-                if filepath.endswith(filename_parameters):
-                    os.chdir(filepat)
-                    data_frame = pd.read_csv(filepath)
-                    parameters_dataframe = pd.concat(
-                        [parameters_dataframe, data_frame])
-
-        # Reorder columns to have 'Slot' as the first column
-        cols = ['Slot'] + [col for col in
-                           parameters_dataframe.columns if
-                           col != 'Slot']
-        parameters_dataframe = parameters_dataframe[cols]
-
-        parameters_dataframe = parameters_dataframe.rename(
-            columns={'Unnamed: 0': 'Parameters'})
-        parameters_dataframe.to_csv(
-            self.dirname + os.sep + "Liste_data" + os.sep + 'Stats.csv',
-            index=False)
-
-    def plot_boxplot_settings(self):
+        manifest = Manifest(self.dirname)
+        signature = manifest.lot_signature()
+        if not force and manifest.is_current('stats', 'lot', signature):
+            print("Unchanged data, stats skipped.")
+            return
+        stats_path = os.path.join(path_liste, 'Stats.csv')
+        summaries_path = box_stats_path(self.dirname)
+
+        # Only the value columns of the lot data are read
+        slot_index = load_slot_index(self.dirname)
+        if slot_index is None:
+            stats = pd.DataFrame(columns=STATS_COLUMNS)
+            summaries = pd.DataFrame(columns=BOX_COLUMNS)
+        else:
+            data_frame = load_lot_data(self.dirname, PARAMETERS)
+            with measure("stats", items=len(data_frame)):
+                stats = lot_stats(data_frame, slot_index['Slot'])
+                summaries = box_summaries(data_frame, PARAMETERS,
+                                          slot_index['Slot'])
+        stats.to_csv(stats_path, index=False)
+        summaries.to_csv(summaries_path, index=False)
+        manifest.record('stats', 'lot', signature,
+                        [stats_path, summaries_path])
+        manifest.save()
+
+    def plot_boxplot_settings(self, force=False, scheduler=None):
         """
         plot_boxplot function
-        Create boxplot based on parameters.
+        Create boxplot based on parameters: the tables of all the
+        parameters are built from one read of the lot data (see
+        boxplot_tables), and the figures are drawn from the quantile
+        summaries saved by stats, by the scheduler (a temporary one if
+        None).
+        Skipped if the data of the lot is unchanged since the previous
+        run, unless force is True.
         """
 
 
-        path_liste = self.dirname + '\\Liste_data'
+        path_liste = os.path.join(self.dirname, 'Liste_data')
         if not os.path.exists(path_liste):
             os.makedirs(path_liste)
 
 
-        if not os.path.exists(os.path.join(path_liste, 'Stats.csv')):
-            return  
-        ylabel = ''
-        namefile = ''
-        y_label=[r'Density ($\mu g.cm^{-2}$)', r'S/Mo atomic ratio',
-                                 r'Number of layers']
-        filename_database = ['Density', 'S_Mo','Thickness']
-        figure_height = 12
-        figure_width = 8
-        path2 = self.dirname + os.sep + "Graphe" + os.sep + "Boxplot"
+        summaries = load_box_summaries(self.dirname)
+        if summaries is None:
+            return
+
+        manifest = Manifest(self.dirname)
+        signature = manifest.lot_signature()
+        if not force and manifest.is_current('boxplot', 'lot', signature):
+            print("Unchanged data, boxplots skipped.")
+            return
+        outputs = []
+        path2 = os.path.join(self.dirname, "Graphe", "Boxplot")
         if not os.path.exists(path2):
             os.makedirs(path2)
 
-        taille_df = []
-
-        for subdir, dirs, files in os.walk(self.dirname):
-            for file in files:
-                filepath = subdir + os.sep + file
-                filename = "data_DP.csv"
-                if filepath.endswith(filename):
-                    data_frame = pd.read_csv(filepath)
-
-                    taille_df = data_frame.shape
-
-        column_number = taille_df[1] - 2
-        for j in range(column_number):
-            col_data = {}
-            for subdir, dirs, files in os.walk(self.dirname):
-                for file in files:
-                    filepath = subdir + os.sep + file
-                    filename = "data_DP.csv"
-
-                    if filepath.endswith(filename):
-                        data_frame = pd.read_csv(filepath)
-                        if not data_frame.empty:
-                            nom_colonne = os.path.basename(subdir)
-                            x_y = data_frame.iloc[0:, 0].astype(str) + \
-                                  " / " + data_frame.iloc[0:, 1].astype(str)
-                            col_data[nom_colonne] = data_frame.iloc[:, j + 2]
-                            name = y_label[j]
-                            namefile = filename_database[j]
-                            ylabel = name
-
-            # Create a df
-            df_merged = pd.DataFrame(col_data)
-            df_merged = df_merged[~np.isnan(df_merged)]
-
-
-            # Reset index of df
-            df_merged.reset_index(drop=True, inplace=True)
-
-            print(df_merged)
-
-            df_merged.columns = pd.to_numeric(df_merged.columns, errors='coerce')
-
-            # Vérifiez les colonnes ayant des valeurs NaN après conversion
-            if df_merged.columns.isnull().any():
-                print(
-                    "Certaines colonnes ne sont pas convertibles en nombres !")
-
-            # Trier les colonnes dans l'ordre croissant
-            df_merged = df_merged.sort_index(axis=1)
-
-            df_merged['X_Y'] = x_y
-
-            # Sort the index
-            df_merged.set_index('X_Y', inplace=True)
-
+        tables, slots = boxplot_tables(self.dirname)
+        image_paths, figure_stats, ylabels = [], [], []
+        for column, table in tables.items():
+            print(table)
+            namefile, ylabel = BOXPLOT_FILES[column]
             # Save the df
-            nouveau_fichier = "Boxplot_" + namefile + ".csv"
-
-            df_merged.to_csv(
-                self.dirname + os.sep + "Liste_data" + os.sep + nouveau_fichier)
-            fig, ax = plt.subplots(figsize=(figure_height, figure_width))
-            ax.tick_params(axis='both', which='major', labelsize=15)
-            ax.boxplot(df_merged.dropna(), showfliers=False)
-            ax.set_xticklabels(df_merged.columns)
-            ax.set_xlabel('Wafer', fontsize=26)
-
-            ax.set_ylabel(ylabel, fontsize=26)
-            plt.savefig(
-                self.dirname + os.sep + "Graphe" + os.sep + "Boxplot" +
-                os.sep + namefile,
-                bbox_inches='tight')
-            plt.close()
-
+            table_path = os.path.join(path_liste,
+                                      "Boxplot_" + namefile + ".csv")
+            table.to_csv(table_path)
+            outputs.append(table_path)
+            image_paths.append(os.path.join(path2, namefile + ".png"))
+            # Slots in the order of the table, by name (the columns of the
+            # table are their numbers)
+            figure_stats.append(bxp_stats(summaries, column, slots))
+            ylabels.append(ylabel)
+
+        with use_scheduler(scheduler) as scheduler:
+            results, failures = scheduler.map_slots(
+                render_boxplot, image_paths, figure_stats, ylabels,
+                image_paths)
+        outputs.extend(results.values())
+        if not failures:
+            manifest.record('boxplot', 'lot', signature, outputs)
+            manifest.save()
+        report_failures('Generate the boxplots file', failures)
 
 if __name__ == "__main__":
     DIRNAME = r"C:\Users\TM273821\Desktop\Fluorescence\D24S1647.1"
@@ -0,0 +1,70 @@
+"""
+Grid
+This module builds the regular grid used to map a wafer. The grid and its
+edge-exclusion mask only depend on the wafer size, the edge exclusion and
+the step: they are built once per combination and shared by all wafers
+and parameters.
+"""
+import math
+from functools import lru_cache
+import numpy as np
+
+DEFAULT_STEP = 0.5
+# Distance between the wafer edge and the first grid node (cm)
+GRID_MARGIN = 0.5
+
+
+def get_step(values):
+    """
+    Return the grid step from the settings values ('Step (cm):'),
+    falling back to DEFAULT_STEP when it is missing or invalid.
+    """
+    step = values.get('Step (cm):')
+    if not step or step <= 0:
+        return DEFAULT_STEP
+    return float(step)
+
+
+class WaferGrid:
+    """
+    Regular grid covering a wafer.
+
+    Attributes: x, y (axes), grid_x, grid_y (meshgrid) and mask (True for
+    nodes inside the radius minus the edge exclusion). Arrays are
+    read-only since a grid is shared.
+    """
+
+    def __init__(self, wafer_size, edge_exclusion, step):
+        self.wafer_size = wafer_size
+        self.edge_exclusion = edge_exclusion
+        self.step = step
+        self.radius = wafer_size / 2
+
+        # Nodes from -radius + margin to radius - margin (included)
+        start = -self.radius + GRID_MARGIN
+        num_nodes = math.floor(2 * (self.radius - GRID_MARGIN) / step
+                               + 1e-9) + 1
+        self.x = start + step * np.arange(max(num_nodes, 1))
+        self.y = self.x.copy()
+        self.grid_x, self.grid_y = np.meshgrid(self.x, self.y)
+
+        # Mask for points outside the valid wafer radius
+        distance_from_center = np.sqrt(self.grid_x ** 2 + self.grid_y ** 2)
+        self.mask = distance_from_center <= self.radius - edge_exclusion
+
+        for array in (self.x, self.y, self.grid_x, self.grid_y, self.mask):
+            array.setflags(write=False)
+
+    @property
+    def shape(self):
+        """Shape of the grid (rows, columns)."""
+        return self.grid_x.shape
+
+
+@lru_cache(maxsize=16)
+def build_grid(wafer_size, edge_exclusion, step=DEFAULT_STEP):
+    """
+    Return the WaferGrid for a (wafer size, edge exclusion, step)
+    combination, building it on first use.
+    """
+    return WaferGrid(float(wafer_size), float(edge_exclusion), float(step))
@@ -0,0 +1,102 @@
+"""
+Grid store
+This module saves and loads the interpolated grids of a wafer in a binary
+format: one float32 '.npy' file per parameter (NaN outside the mask) and
+one 'Grid_axes.npz' file holding the X and Y axes of the wafer folder.
+Grids are loaded memory-mapped; the former '<parameter>_grid_df.csv'
+files remain available as an optional export.
+"""
+import os
+import numpy as np
+import pandas as pd
+from wdxrf.Processing.atomic import atomic_save
+
+AXES_FILENAME = "Grid_axes.npz"
+
+
+def grid_filename(parameter):
+    """Return the binary grid filename of a parameter."""
+    return f"{parameter}_grid.npy"
+
+
+def csv_grid_filename(parameter):
+    """Return the CSV grid filename of a parameter."""
+    return f"{parameter}_grid_df.csv"
+
+
+def save_grids(folder, grids, x, y):
+    """
+    Save the grids of a wafer.
+
+    :param folder: Wafer folder.
+    :param grids: Dictionary parameter -> 2D array (masked values or NaN
+    are stored as NaN), rows along y and columns along x.
+    :param x: X axis of the grid.
+    :param y: Y axis of the grid.
+    :return: List of the saved files.
+    """
+    axes_path = os.path.join(folder, AXES_FILENAME)
+    atomic_save(axes_path,
+                 lambda file: np.savez(file, x=np.asarray(x, dtype=float),
+                                       y=np.asarray(y, dtype=float)))
+    saved_files = [axes_path]
+    for parameter, grid_z in grids.items():
+        data = np.ma.filled(np.ma.asarray(grid_z, dtype=np.float32),
+                            np.nan)
+        grid_path = os.path.join(folder, grid_filename(parameter))
+        atomic_save(grid_path, lambda file, data=data: np.save(file, data))
+        saved_files.append(grid_path)
+    return saved_files
+
+
+def export_grid_csv(folder, parameter, grid_z, x, y):
+    """Export a grid as '<parameter>_grid_df.csv' (Y index, X columns)
+    and return the path of the file."""
+    data_frame = pd.DataFrame(np.ma.filled(np.ma.asarray(grid_z, dtype=float),
+                                           np.nan),
+                              index=pd.Index(y, name='Y'),
+                              columns=pd.Index(x, name='X'))
+    csv_path = os.path.join(folder, csv_grid_filename(parameter))
+    data_frame.to_csv(csv_path)
+    return csv_path
+
+
+def grid_files(folder, parameter):
+    """
+    Return the files read by load_grid for a parameter: binary grid and
+    axes, or CSV export (empty list if no grid is found).
+    """
+    grid_path = os.path.join(folder, grid_filename(parameter))
+    axes_path = os.path.join(folder, AXES_FILENAME)
+    if os.path.exists(grid_path) and os.path.exists(axes_path):
+        return [grid_path, axes_path]
+    csv_path = os.path.join(folder, csv_grid_filename(parameter))
+    return [csv_path] if os.path.exists(csv_path) else []
+
+
+def load_grid(folder, parameter, mmap=True):
+    """
+    Load the grid of a parameter.
+
+    Falls back on the CSV export when the binary grid does not exist
+    (folders processed with a previous version).
+
+    :param folder: Wafer folder.
+    :param parameter: 'Density', 'S_Mo' or 'Number of layers'.
+    :param mmap: If True, the grid is memory-mapped (read-only).
+    :return: Tuple (grid_z, x, y) or None if no grid is found.
+    """
+    grid_path = os.path.join(folder, grid_filename(parameter))
+    axes_path = os.path.join(folder, AXES_FILENAME)
+    if os.path.exists(grid_path) and os.path.exists(axes_path):
+        grid_z = np.load(grid_path, mmap_mode='r' if mmap else None)
+        with np.load(axes_path) as axes:
+            return grid_z, axes['x'], axes['y']
+
+    csv_path = os.path.join(folder, csv_grid_filename(parameter))
+    if os.path.exists(csv_path):
+        data_frame = pd.read_csv(csv_path, index_col=0, header=0)
+        return (data_frame.to_numpy(dtype=float),
+                data_frame.columns.astype(float).to_numpy(),
+                data_frame.index.astype(float).to_numpy())
+    return None
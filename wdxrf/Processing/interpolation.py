@@ -0,0 +1,194 @@
+"""
+Interpolation
+This module interpolates the measured points of a wafer on a regular grid.
+The triangulation of the (X, Y) points is built once and shared by all
+the parameters of the wafer.
+
+Wafers measured with the same recipe share the same point positions: the
+barycentric weights of the grid are then cached (in memory and on disk)
+and the interpolation reduces to a sparse matrix-vector product.
+"""
+import os
+import hashlib
+from collections import OrderedDict
+import numpy as np
+from scipy.interpolate import LinearNDInterpolator
+from scipy.spatial import Delaunay
+from scipy.sparse import csr_matrix
+from wdxrf.Processing.atomic import atomic_save
+
+CACHE_FOLDER = os.path.join(os.path.expanduser("~"), "WDXRF",
+                            "interpolation_cache")
+CACHE_MAX_SIZE_MB = 100
+CACHE_MEMORY_ENTRIES = 16
+
+
+class InterpolationWeights:
+    """
+    Precomputed linear interpolation of a point cloud on a grid.
+
+    Grid node i takes the value weights[i, :] @ values, or NaN if it is
+    outside the convex hull of the points.
+    """
+
+    def __init__(self, weights, inside):
+        self.weights = weights
+        self.inside = inside
+
+    @classmethod
+    def compute(cls, points, grid_x, grid_y):
+        """Triangulate the points and compute the barycentric weights."""
+        triangulation = Delaunay(points)
+        grid_points = np.column_stack((grid_x.ravel(), grid_y.ravel()))
+        simplex = triangulation.find_simplex(grid_points)
+        inside = simplex >= 0
+
+        # Barycentric coordinates of each grid node inside its simplex
+        transform = triangulation.transform[simplex[inside]]
+        delta = grid_points[inside] - transform[:, 2]
+        barycentric = np.einsum('ijk,ik->ij', transform[:, :2], delta)
+        barycentric = np.column_stack(
+            (barycentric, 1 - barycentric.sum(axis=1)))
+
+        rows = np.repeat(np.flatnonzero(inside), 3)
+        columns = triangulation.simplices[simplex[inside]].ravel()
+        weights = csr_matrix((barycentric.ravel(), (rows, columns)),
+                             shape=(len(grid_points), len(points)))
+        return cls(weights, inside)
+
+    def apply(self, values, grid_shape):
+        """
+        Interpolate values of shape (n_points, n_parameters).
+
+        :return: Array of shape (n_parameters,) + grid_shape.
+        """
+        grid_values = self.weights @ values
+        grid_values[~self.inside] = np.nan
+        return grid_values.T.reshape((values.shape[1],) + tuple(grid_shape))
+
+    def save(self, filepath):
+        """Save the weights in a .npz file (atomic replace)."""
+        atomic_save(filepath, lambda file: np.savez(
+            file, data=self.weights.data, indices=self.weights.indices,
+            indptr=self.weights.indptr, shape=np.array(self.weights.shape),
+            inside=self.inside))
+
+    @classmethod
+    def load(cls, filepath):
+        """Load weights saved with save()."""
+        with np.load(filepath) as data:
+            weights = csr_matrix(
+                (data['data'], data['indices'], data['indptr']),
+                shape=tuple(data['shape']))
+            return cls(weights, data['inside'])
+
+
+class InterpolationCache:
+    """
+    Cache of InterpolationWeights keyed by a hash of the point coordinates
+    and of the grid. Entries are kept in memory and in a folder on disk;
+    the least recently used files are removed when the folder exceeds
+    max_size_mb.
+    """
+
+    def __init__(self, folder=CACHE_FOLDER, max_size_mb=CACHE_MAX_SIZE_MB):
+        self.folder = folder
+        self.max_size = max_size_mb * 1024 * 1024
+        self.memory = OrderedDict()
+
+    @staticmethod
+    def key(points, grid_x, grid_y):
+        """Return the hash identifying a (points, grid) combination."""
+        digest = hashlib.sha1()
+        for array in (points, grid_x, grid_y):
+            array = np.ascontiguousarray(array, dtype=float)
+            digest.update(str(array.shape).encode())
+            digest.update(array.tobytes())
+        return digest.hexdigest()
+
+    def get(self, points, grid_x, grid_y):
+        """Return the weights for the points and grid, computing them
+        if they are not cached yet."""
+        key = self.key(points, grid_x, grid_y)
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            return self.memory[key]
+
+        filepath = os.path.join(self.folder, f"{key}.npz")
+        weights = None
+        if os.path.exists(filepath):
+            try:
+                weights = InterpolationWeights.load(filepath)
+                os.utime(filepath)  # Mark as recently used
+            except (OSError, ValueError, KeyError):
+                weights = None
+        if weights is None:
+            weights = InterpolationWeights.compute(points, grid_x, grid_y)
+            try:
+                os.makedirs(self.folder, exist_ok=True)
+                weights.save(filepath)
+                self.evict()
+            except OSError as error:
+                print(f"Interpolation cache not saved: {error}")
+
+        self.memory[key] = weights
+        if len(self.memory) > CACHE_MEMORY_ENTRIES:
+            self.memory.popitem(last=False)
+        return weights
+
+    def evict(self):
+        """Remove the least recently used files above the size limit."""
+        entries = []
+        for entry in os.scandir(self.folder):
+            if entry.is_file() and entry.name.endswith('.npz'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+                total_size -= size
+            except OSError:
+                pass
+
+
+_DEFAULT_CACHE = None
+
+
+def default_cache():
+    """Return the interpolation cache shared within the process."""
+    global _DEFAULT_CACHE
+    if _DEFAULT_CACHE is None:
+        _DEFAULT_CACHE = InterpolationCache()
+    return _DEFAULT_CACHE
+
+
+def interpolate_parameters(x, y, values, grid_x, grid_y, cache=None):
+    """
+    Linearly interpolate several parameters sharing the same points.
+
+    Equivalent to calling scipy.interpolate.griddata(method='linear') for
+    each parameter, with a single Delaunay triangulation.
+
+    :param x: X coordinates of the measured points.
+    :param y: Y coordinates of the measured points.
+    :param values: Array of shape (n_points, n_parameters).
+    :param grid_x: X coordinates of the grid (from np.meshgrid).
+    :param grid_y: Y coordinates of the grid (from np.meshgrid).
+    :param cache: Optional InterpolationCache reusing the weights of
+    wafers measured at the same positions.
+    :return: Array of shape (n_parameters,) + grid_x.shape, NaN outside
+    the convex hull of the points.
+    """
+    points = np.column_stack((np.asarray(x, dtype=float),
+                              np.asarray(y, dtype=float)))
+    values = np.asarray(values, dtype=float)
+    if cache is not None:
+        weights = cache.get(points, grid_x, grid_y)
+        return weights.apply(values, grid_x.shape)
+
+    interpolator = LinearNDInterpolator(points, values)
+    grid_values = interpolator(grid_x, grid_y)
+    return np.moveaxis(grid_values, -1, 0)
@@ -0,0 +1,144 @@
+"""
+Lot data
+This module stores the processed data of all the slots of a lot in a
+single columnar file (Liste_data/Lot_data.npz): one array per column,
+plus the name, folder and number of points of each slot.
+Columns are stored separately, so a loader only reads the columns it
+needs.
+"""
+import os
+import numpy as np
+import pandas as pd
+from wdxrf.Processing.atomic import atomic_save
+
+LOT_DATA_FILENAME = "Lot_data.npz"
+
+
+def lot_data_path(dirname):
+    """Return the path of the lot data file of a lot directory."""
+    return os.path.join(dirname, "Liste_data", LOT_DATA_FILENAME)
+
+
+def slot_sort_key(slot):
+    """Sort slots numerically when possible, then by name."""
+    return (0, int(slot), '') if str(slot).isdigit() else (1, 0, str(slot))
+
+
+def write_lot_data(dirname, slot_frames):
+    """
+    Write the lot data file.
+
+    :param dirname: Lot directory.
+    :param slot_frames: Dictionary slot folder -> processed DataFrame. The
+    slot name is the basename of the folder.
+    """
+    folders = sorted(slot_frames,
+                     key=lambda folder: slot_sort_key(
+                         os.path.basename(folder)))
+    frames = [slot_frames[folder] for folder in folders]
+    columns = list(frames[0].columns) if frames else []
+
+    arrays = {
+        '__slot_names__': np.array([os.path.basename(folder)
+                                    for folder in folders], dtype=str),
+        '__slot_folders__': np.array([os.path.relpath(folder, dirname)
+                                      for folder in folders], dtype=str),
+        '__slot_counts__': np.array([len(frame) for frame in frames],
+                                    dtype=np.int64),
+        '__columns__': np.array(columns, dtype=str),
+    }
+    for column in columns:
+        arrays[column] = np.concatenate(
+            [frame[column].to_numpy(dtype=float) for frame in frames])
+
+    filepath = lot_data_path(dirname)
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    atomic_save(filepath, lambda file: np.savez(file, **arrays))
+
+
+def load_slot_index(dirname):
+    """
+    Return the slots of a lot as a DataFrame with the 'Slot', 'Folder'
+    (absolute path) and 'Count' columns, or None if the lot has not been
+    processed or has no slot.
+    """
+    filepath = lot_data_path(dirname)
+    if not os.path.exists(filepath):
+        return None
+    with np.load(filepath) as data:
+        if not len(data['__slot_names__']):
+            return None
+        return pd.DataFrame({
+            'Slot': data['__slot_names__'],
+            'Folder': [os.path.join(dirname, folder)
+                       for folder in data['__slot_folders__']],
+            'Count': data['__slot_counts__'],
+        })
+
+
+def load_lot_data(dirname, columns=None, slots=None):
+    """
+    Load the processed data of a lot.
+
+    :param dirname: Lot directory.
+    :param columns: Columns to read (all columns if None).
+    :param slots: Optional list of slot names to keep.
+    :return: DataFrame with a 'Slot' column followed by the requested
+    columns, or None if the lot has not been processed or has no slot.
+    """
+    filepath = lot_data_path(dirname)
+    if not os.path.exists(filepath):
+        return None
+    with np.load(filepath) as data:
+        if not len(data['__slot_names__']):
+            return None
+        if columns is None:
+            columns = list(data['__columns__'])
+        slot_names = data['__slot_names__']
+        slot_counts = data['__slot_counts__']
+        data_frame = pd.DataFrame({'Slot': np.repeat(slot_names,
+                                                     slot_counts)})
+        for column in columns:
+            data_frame[column] = data[column]
+
+    if slots is not None:
+        data_frame = data_frame[data_frame['Slot'].isin(
+            [str(slot) for slot in slots])].reset_index(drop=True)
+    return data_frame
+
+
+def load_lots(dirnames, columns=None):
+    """
+    Load and concatenate the processed data of several lots.
+
+    :return: DataFrame with 'Lot' (lot directory name) and 'Slot' columns
+    followed by the requested columns.
+    """
+    frames = []
+    for dirname in dirnames:
+        data_frame = load_lot_data(dirname, columns)
+        if data_frame is None:
+            print(f"No processed data in {dirname}")
+            continue
+        data_frame.insert(0, 'Lot', os.path.basename(
+            os.path.normpath(dirname)))
+        frames.append(data_frame)
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+def iter_slot_frames(dirname, columns=None):
+    """
+    Yield (slot, folder, DataFrame) for each slot of a processed lot.
+    """
+    slot_index = load_slot_index(dirname)
+    if slot_index is None:
+        return
+    data_frame = load_lot_data(dirname, columns)
+    data_frame = data_frame.drop(columns='Slot')
+    start = 0
+    for slot, folder, count in slot_index.itertuples(index=False):
+        yield slot, folder, data_frame.iloc[start:start + count].reset_index(
+            drop=True)
+        start += count
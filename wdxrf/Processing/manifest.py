@@ -0,0 +1,125 @@
+"""
+Manifest
+This module records, for each processing stage, the signature of the
+inputs and settings used to produce its outputs, and the signature of the
+outputs (Liste_data/Manifest.json). A stage can then skip the slots whose
+inputs, settings and outputs are unchanged since the previous run.
+"""
+import os
+import json
+import hashlib
+from wdxrf.Processing.atomic import atomic_save
+
+MANIFEST_FILENAME = "Manifest.json"
+MANIFEST_VERSION = 2
+
+
+def file_signature(filepath):
+    """Return the signature (modification time and size) of a file."""
+    stat = os.stat(filepath)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def output_signature(filepath):
+    """Return the signature of an output file, or None if it is missing."""
+    try:
+        return file_signature(filepath)
+    except OSError:
+        return None
+
+
+def settings_signature(*items):
+    """Return a hash of JSON-serializable items (settings, options...)."""
+    text = json.dumps(items, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+class Manifest:
+    """
+    Signatures and outputs of the processing stages of a lot.
+
+    Entries are stored per stage and per key: a path relative to the lot
+    directory (see relative()) for raw files and slots, or 'lot' for
+    lot-level stages. Outputs are stored relative to the lot directory,
+    with their signature when recorded.
+    """
+
+    def __init__(self, dirname):
+        self.dirname = os.path.abspath(dirname)
+        self.path = os.path.join(dirname, "Liste_data", MANIFEST_FILENAME)
+        self.stages = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as file:
+                    data = json.load(file)
+                if data.get("version") == MANIFEST_VERSION:
+                    self.stages = data.get("stages", {})
+            except (OSError, ValueError):
+                self.stages = {}
+
+    def relative(self, path):
+        """Return a path relative to the lot directory."""
+        return os.path.relpath(os.path.abspath(path), self.dirname)
+
+    def get(self, stage, key):
+        """Return the entry of a stage for a key, or None."""
+        return self.stages.get(stage, {}).get(key)
+
+    def is_current(self, stage, key, signature):
+        """
+        Return True if the entry was recorded with the same signature and
+        all its outputs still exist, unchanged (not rewritten by another
+        stage or run).
+        """
+        entry = self.get(stage, key)
+        if entry is None or entry.get("signature") != signature:
+            return False
+        for output, recorded in entry.get("outputs", {}).items():
+            current = output_signature(os.path.join(self.dirname, output))
+            if current is None or current != recorded:
+                return False
+        return True
+
+    def record(self, stage, key, signature, outputs=()):
+        """Record the signature and the outputs (once written) of a stage
+        for a key."""
+        self.stages.setdefault(stage, {})[key] = {
+            "signature": signature,
+            "outputs": {self.relative(output): output_signature(output)
+                        for output in outputs},
+        }
+
+    def prune(self, stage, keys):
+        """Remove the entries of a stage whose key is not in keys."""
+        keys = set(keys)
+        entries = self.stages.get(stage, {})
+        for key in [key for key in entries if key not in keys]:
+            del entries[key]
+
+    def forget(self, stage):
+        """Remove all the entries of a stage."""
+        self.stages.pop(stage, None)
+
+    def signatures(self, stage):
+        """Return a dictionary key -> signature for a stage."""
+        return {key: entry["signature"]
+                for key, entry in self.stages.get(stage, {}).items()}
+
+    def slot_signatures(self):
+        """Return a dictionary slot folder (absolute) -> signature of its
+        raw data, from the 'database' stage."""
+        return {os.path.normpath(os.path.join(self.dirname,
+                                              os.path.dirname(key))):
+                signature
+                for key, signature in self.signatures("database").items()}
+
+    def lot_signature(self):
+        """Return a signature of the raw data of all the slots."""
+        return settings_signature(self.signatures("database"))
+
+    def save(self):
+        """Save the manifest (atomic replace)."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        atomic_save(self.path, lambda file: json.dump(
+            {"version": MANIFEST_VERSION, "stages": self.stages}, file,
+            indent=1), mode='w')
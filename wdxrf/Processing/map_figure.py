@@ -0,0 +1,192 @@
+"""
+Map figure
+This module creates the matplotlib figure of a wafer mapping (axes,
+ticks, edge-exclusion circle and statistics text). It is shared by the
+matplotlib renderer of the mappings, which reuses one figure (template) per
+wafer geometry, and by the raster renderer, which pre-renders the same
+decorations once.
+"""
+import os
+import threading
+import numpy as np
+import pandas as pd
+import matplotlib.patches as mpatches
+import matplotlib.ticker as mticker
+import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+# Font size and (x, y, ha, va) position in axes coordinates of the
+# statistics text: mean, 3sigma and uniformity
+STATS_FONTSIZE = 16
+STATS_POSITIONS = [(0.01, 0.01, 'left', 'bottom'),
+                   (0.96, 0.01, 'right', 'bottom'),
+                   (0.96, 0.96, 'right', 'top')]
+
+
+# Number of templates kept by each thread
+MAX_TEMPLATES = 8
+
+_local = threading.local()
+
+
+def create_map_figure(grid_z, radius, edge_exclusion, cmap='Spectral_r',
+                      pyplot=True):
+    """
+    Create the figure of a mapping.
+
+    :param grid_z: Grid of the parameter (rows along y).
+    :param radius: Radius of the wafer (cm).
+    :param edge_exclusion: Edge exclusion (cm).
+    :param pyplot: If False, the figure is not managed by pyplot (no
+    window, not closed by plt.close('all')): it can only be saved.
+    :return: Tuple (figure, axes, image).
+    """
+    if pyplot:
+        fig, ax = plt.subplots(figsize=(8, 8))
+    else:
+        fig = Figure(figsize=(8, 8))
+        FigureCanvasAgg(fig)
+        ax = fig.subplots()
+    img = ax.imshow(grid_z,
+                    extent=(-radius, radius, -radius, radius),
+                    origin='lower', cmap=cmap)
+
+    # # # Customize plot appearance
+    # # ax.set_aspect('equal', adjustable='box')
+    # cbar = plt.colorbar(img, ax=ax, shrink=0.8, aspect=10)
+    # cbar.ax.tick_params(labelsize=28)
+    ax.set_xlabel('X (cm)', fontsize=28)
+    ax.set_ylabel('Y (cm)', fontsize=28)
+    ax.tick_params(axis='both', labelsize=24)
+
+    ax.xaxis.set_major_locator(mticker.MultipleLocator(5))
+    ax.xaxis.set_major_formatter(
+        mticker.FuncFormatter(lambda x, _: f'{int(x)}'))
+
+    ax.yaxis.set_major_locator(mticker.MultipleLocator(5))
+    ax.yaxis.set_major_formatter(
+        mticker.FuncFormatter(lambda y, _: f'{int(y)}'))
+    circle = mpatches.Circle((0, 0), radius - edge_exclusion,
+                        color='black', fill=False, linewidth=1)
+    ax.add_patch(circle)
+    return fig, ax, img
+
+
+def read_slot_stats(wafer_number, column):
+    """
+    Return the mean, 3sigma and uniformity (%) of a parameter of a slot
+    from Liste_data/Stats.csv, or None if not found.
+
+    :param wafer_number: Path to the wafer (slot) folder.
+    :param column: 'Density', 'S_Mo' or 'Number of layers'.
+    """
+    dirname = os.path.dirname(wafer_number)
+    list_data_dir = os.path.join(dirname, "Liste_data")
+    stats_file = os.path.join(list_data_dir, "Stats.csv")
+    wafer_digit = float(os.path.basename(wafer_number))
+
+    # Check if the Stats.csv file exists
+    if not os.path.exists(stats_file):
+        print(f"Error: {stats_file} does not exist.")
+        return None
+
+    # Load the CSV into a DataFrame
+    stats_data = pd.read_csv(stats_file)
+    # Filter the DataFrame to find the row corresponding to
+    # wafer_number and column
+    filtered_data = stats_data[
+        (stats_data['Slot'] == wafer_digit) & (
+                stats_data['Parameters'] == column)]
+
+    if filtered_data.empty:
+        print(
+            f"No data found for wafer {wafer_digit} and column "
+            f"{column}.")
+        return None
+
+    # Extract the mean and 3sigma values
+    mean_val = filtered_data['mean'].values[0]
+    sigma_val = filtered_data['3sigma'].values[0]
+    if 'uniformity' in filtered_data:
+        uniformity = filtered_data['uniformity'].values[0]
+    else:
+        # Stats.csv written by a former version
+        uniformity = (1-sigma_val / mean_val) * 100 if mean_val != 0 else 0
+        uniformity = max(uniformity, 0)
+    return mean_val, sigma_val, uniformity
+
+
+def stats_labels(mean_val, sigma_val, uniformity, mathtext=True):
+    """Return the statistics texts, in the order of STATS_POSITIONS."""
+    sigma = r'$\sigma$' if mathtext else 'σ'
+    return [f'Mean: {mean_val:.2f}', f'3{sigma}: {sigma_val:.2f}',
+            f'U: {uniformity:.1f}%']
+
+
+def add_stats_text(ax, labels):
+    """Add the statistics texts to the axes of a mapping."""
+    return [ax.text(x, y, label, transform=ax.transAxes,
+                    fontsize=STATS_FONTSIZE, ha=ha, va=va, color='black')
+            for label, (x, y, ha, va) in zip(labels, STATS_POSITIONS)]
+
+
+class MapFigureTemplate:
+    """
+    Figure of the mappings of one wafer geometry, created once and reused:
+    for each image, only the data and color limits of the image and the
+    statistics texts are changed before saving.
+    """
+
+    def __init__(self, radius, edge_exclusion, shape, cmap='Spectral_r'):
+        """
+        :param radius: Radius of the wafer (cm).
+        :param edge_exclusion: Edge exclusion (cm).
+        :param shape: Shape (rows, columns) of the grids.
+        """
+        self.fig, self.ax, self.img = create_map_figure(
+            np.zeros(shape), radius, edge_exclusion, cmap, pyplot=False)
+        self.texts = add_stats_text(self.ax, [''] * len(STATS_POSITIONS))
+        self.saved = False
+
+    def update(self, grid_z, labels=()):
+        """
+        Set the grid and the statistics texts (hidden if no labels) of the
+        next images.
+        """
+        self.img.set_data(grid_z)
+        for index, text in enumerate(self.texts):
+            text.set_visible(index < len(labels))
+            if index < len(labels):
+                text.set_text(labels[index])
+
+    def save(self, path, vmin, vmax):
+        """Save the image with the given color limits."""
+        self.img.set_clim(vmin, vmax)
+        self.fig.savefig(path, bbox_inches='tight')
+        if not self.saved:
+            # Keep the layout of the first image for the next ones
+            self.fig.set_layout_engine('none')
+            self.saved = True
+
+    def last_image(self):
+        """Return the last saved image as an RGBA array (copy of the
+        buffer rendered by savefig)."""
+        return np.array(self.fig.canvas.buffer_rgba())
+
+
+def get_map_template(radius, edge_exclusion, shape, cmap='Spectral_r'):
+    """
+    Return the MapFigureTemplate of a wafer geometry. The templates are
+    kept per thread (a figure cannot be drawn by two threads at once).
+    """
+    templates = getattr(_local, 'templates', None)
+    if templates is None:
+        templates = _local.templates = {}
+    key = (radius, edge_exclusion, tuple(shape), cmap)
+    if key not in templates:
+        if len(templates) >= MAX_TEMPLATES:
+            templates.clear()
+        templates[key] = MapFigureTemplate(radius, edge_exclusion, shape,
+                                           cmap)
+    return templates[key]
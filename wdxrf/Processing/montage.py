@@ -0,0 +1,169 @@
+"""
+Montage
+This module assembles the mappings of the slots of a lot in one image (grid
+of tiles). The tiles are decoded by a pool of threads and pasted one at a
+time into the image, so only a few decoded tiles are in memory at once.
+Tiles can also be given as arrays (mappings just rendered, see TileStore),
+which skips the decoding of the PNG files, and the montage can be
+downscaled.
+"""
+import os
+import math
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+
+# Maximum number of columns and space between the tiles (pixels, full
+# scale)
+COLUMNS = 5
+SPACING = 50
+
+# Memory budget of the tiles kept between the mapping and the montage
+MAX_TILE_BYTES = 512 * 2 ** 20
+
+
+def scaled_size(size, scale=1.0):
+    """Return the size (width, height) of an image downscaled by scale."""
+    return tuple(max(1, round(length * scale)) for length in size)
+
+
+def tile_size(source):
+    """
+    Return the size (width, height) of a tile: image file (only the header
+    is read) or array (rows, columns[, channels]).
+    """
+    if isinstance(source, np.ndarray):
+        return source.shape[1], source.shape[0]
+    with Image.open(source) as image:
+        return image.size
+
+
+def make_tile(image, size=None):
+    """
+    Return a tile as an RGB image.
+
+    :param image: Image file, PIL image or array (RGB or RGBA, uint8).
+    :param size: Size of the tile (width, height); the image is resized if
+    it differs.
+    """
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(image)
+    elif not isinstance(image, Image.Image):
+        with Image.open(image) as file:
+            return make_tile(file.convert('RGB'), size)
+    image = image.convert('RGB')
+    if size is not None and image.size != tuple(size):
+        image = image.resize(size, Image.LANCZOS, reducing_gap=3.0)
+    return image
+
+
+class Montage:
+    """
+    Image of a grid of tiles of the same size, filled one tile at a time.
+    """
+
+    def __init__(self, count, size, columns=COLUMNS, spacing=SPACING):
+        """
+        :param count: Number of tiles.
+        :param size: Size (width, height) of the tiles.
+        :param columns: Maximum number of columns.
+        :param spacing: Space between the tiles (pixels).
+        """
+        self.columns = max(1, min(columns, count))
+        rows = math.ceil(count / self.columns)
+        self.size = tuple(size)
+        self.spacing = spacing
+        width, height = self.size
+        self.image = Image.new(
+            'RGB', (self.columns * width + (self.columns - 1) * spacing,
+                    rows * height + (rows - 1) * spacing), (255, 255, 255))
+
+    def paste(self, index, tile):
+        """Paste the tile (RGB image) at its place in the grid."""
+        width, height = self.size
+        row, column = divmod(index, self.columns)
+        self.image.paste(tile, (column * (width + self.spacing),
+                                row * (height + self.spacing)))
+
+
+def iter_tiles(sources, size, workers=None):
+    """
+    Yield the tiles of the sources in order, decoded by a pool of threads
+    (at most two tiles per thread are decoded ahead).
+    """
+    workers = workers or min(8, os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for source in sources:
+            pending.append(executor.submit(make_tile, source, size))
+            if len(pending) > 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def build_montage(sources, output_path, scale=1.0, tiles=None,
+                  workers=None, columns=COLUMNS, spacing=SPACING, count=None):
+    """
+    Save the montage of the images.
+
+    :param sources: Image files or arrays, in the order of the grid. The
+    first one gives the size of the tiles.
+    :param output_path: File of the montage.
+    :param scale: Downscaling factor of the tiles and of the spacing.
+    :param tiles: Optional TileStore of the tiles already rendered: they
+    are used instead of the files.
+    :param workers: Number of threads decoding the files.
+    :param count: Number of places of the grid (default: number of
+    sources).
+    :return: output_path, or None if there is no image.
+    """
+    sources = list(sources)
+    if not sources:
+        return None
+    size = scaled_size(tile_size(sources[0]), scale)
+    if tiles is not None:
+        sources = [tiles.pop(source) if isinstance(source, str) else source
+                   for source in sources]
+    montage = Montage(count or len(sources), size, columns,
+                      round(spacing * scale))
+    for index, tile in enumerate(iter_tiles(sources, size, workers)):
+        montage.paste(index, tile)
+    montage.image.save(output_path)
+    return output_path
+
+
+class TileStore:
+    """
+    Tiles of the mappings rendered by a run (image file -> RGB array at the
+    scale of the montage), kept in memory until the montage within a
+    memory budget. The other tiles are decoded from the files.
+    """
+
+    def __init__(self, scale=1.0, max_bytes=MAX_TILE_BYTES):
+        self.scale = scale
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._tiles = {}
+        self._lock = threading.Lock()
+
+    def add(self, path, tile):
+        """Keep the tile of an image file, if the budget allows it."""
+        with self._lock:
+            if self.nbytes + tile.nbytes > self.max_bytes:
+                return False
+            self.nbytes += tile.nbytes
+            self._tiles[os.path.abspath(path)] = tile
+            return True
+
+    def pop(self, path):
+        """Return and forget the tile of an image file, or the path if
+        not kept."""
+        with self._lock:
+            tile = self._tiles.pop(os.path.abspath(path), None)
+            if tile is None:
+                return path
+            self.nbytes -= tile.nbytes
+            return tile
@@ -0,0 +1,253 @@
+"""
+Pipeline
+This module lists the processing tasks of a lot for the selected function
+and options (the checkboxes of the GUI) and runs them with per-task
+timing. It does not depend on the GUI, so it is shared by the
+application and the batch command line.
+The per-slot work of all the tasks runs in one pool of worker processes
+(see scheduler), which can also be shared by several lots processed at
+the same time (run_lots).
+Each run records the time of its tasks, of their slots and of the stages
+inside them (see profiling), and can be profiled with cProfile.
+"""
+import time
+import cProfile
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from wdxrf.Processing.xrf import XRF
+from wdxrf.Processing.function_common import Common
+from wdxrf.Processing.scheduler import Scheduler, ObservedScheduler, \
+    SlotError, Cancelled
+from wdxrf.Processing.montage import TileStore
+from wdxrf.Processing.profiling import Recorder, recording
+from wdxrf.Processing.settings import get_workers, get_montage_scale
+
+TOOLS = ("MoS₂", "Clean")
+
+# Options of the GUI and their default state
+DEFAULT_OPTIONS = {
+    "Data processing": True,
+    "Autoscale mapping": True,
+    "Id. scale mapping": False,
+    "Id. scale mapping (auto)": True,
+    "Slot number": True,
+    "Stats": True,
+    "Fast rendering": False,
+    "Export slot CSV": False,
+    "Export masks": False,
+    "Export grids CSV": False,
+}
+
+
+class Pipeline:
+    """
+    Processing tasks of a lot.
+    """
+
+    def __init__(self, dirname, values, options=None, tool="MoS₂",
+                 scheduler=None, trace_memory=False):
+        """
+        :param scheduler: Pool of workers shared with other pipelines. If
+        None, the pipeline uses its own pool (number of workers of the
+        settings), stopped at the end of each run.
+        :param trace_memory: If True, the records of the runs include the
+        peak memory of the stages (slower).
+        """
+        self.dirname = dirname
+        self.values = values
+        self.options = dict(DEFAULT_OPTIONS)
+        self.options.update(options or {})
+        self.tool = tool
+        self.common_class = Common(dirname)
+        self.wdxrf_class = XRF(dirname, values)
+        self.own_scheduler = scheduler is None
+        self.scheduler = scheduler or Scheduler(get_workers(values))
+        self.timings = []
+        self.trace_memory = trace_memory
+        self.recorder = Recorder(dirname, trace_memory)
+        self.failures = []
+        self.error = None
+        self.cancelled = False
+
+    def tasks(self, scheduler=None):
+        """
+        Return the list of tasks as (task name, function, kwargs).
+
+        :param scheduler: Scheduler of the per-slot work of the tasks
+        (default: self.scheduler).
+        """
+        tasks = []
+        common, wdxrf = self.common_class, self.wdxrf_class
+        wafer_slot = self.options["Slot number"]
+        stats = self.options["Stats"]
+        # Fast raster renderer, or matplotlib figures (reference)
+        renderer = "raster" if self.options["Fast rendering"] \
+            else "matplotlib"
+        scheduler = scheduler or self.scheduler
+        # The images rendered by the mapping are kept for the montages
+        # when they do not cross processes (one worker), or when they are
+        # downscaled for the montage (small tiles sent back by the
+        # workers); otherwise the montages decode the files
+        montage_scale = get_montage_scale(self.values)
+        keep_tiles = self.scheduler.workers == 1 or montage_scale < 1
+        tiles = TileStore(montage_scale) if keep_tiles else None
+
+        if self.tool == "MoS₂":
+            if self.options["Data processing"]:
+                tasks.append(("Calculate the thickness",
+                              wdxrf.database_settings,
+                              {'export_csv': self.options["Export slot CSV"],
+                               'scheduler': scheduler}))
+                tasks.append(("Calculate mean and sigma", common.stats, {}))
+                tasks.append(("Generate the boxplots file",
+                              common.plot_boxplot_settings,
+                              {'scheduler': scheduler}))
+
+            mappings = [
+                ("Autoscale mapping", "Plot mapping w/ autoscale", False,
+                 "Auto"),
+                ("Id. scale mapping", "Plot mapping w/ identical scale",
+                 'Manual', "Identical"),
+                ("Id. scale mapping (auto)",
+                 "Plot mapping w/ identical scale", 'Autoscale',
+                 "Identical"),
+            ]
+            mappings = [mapping for mapping in mappings
+                        if self.options[mapping[0]]]
+            # The scales are plotted together: the wafers are interpolated
+            # and the figures drawn once for all the scales
+            if mappings:
+                task_name = mappings[0][1] if len(mappings) == 1 \
+                    else "Plot mapping w/ all scales"
+                tasks.append((task_name, wdxrf.plot,
+                              {'slot_number': wafer_slot,
+                               'identical': [identical for _, _, identical, _
+                                             in mappings],
+                               'stats': stats,
+                               'export_masks': self.options["Export masks"],
+                               'export_csv': self.options["Export grids CSV"],
+                               'scheduler': scheduler,
+                               'renderer': renderer, 'tiles': tiles}))
+            zscales = []
+            for _, _, _, zscale in mappings:
+                if zscale not in zscales:
+                    zscales.append(zscale)
+            for zscale in zscales:
+                tasks.append(("Create the image grid",
+                              common.create_image_grid,
+                              {'zscale': zscale, 'scale': montage_scale,
+                               'tiles': tiles}))
+
+        elif self.tool == "Clean":
+            tasks.append(("Cleaning of folders", common.reboot,
+                          {'carac': 'WDXRF',
+                           'workers': self.scheduler.workers}))
+        return tasks
+
+    def run(self, on_start=None, on_finish=None, on_slot=None,
+            cancel=None, profiler=None):
+        """
+        Run all the tasks. The slots which failed are reported in
+        self.failures and do not stop the following tasks.
+
+        :param on_start: Optional callback(task_name) called before each
+        task.
+        :param on_finish: Optional callback(task_name, elapsed_time) called
+        after each task.
+        :param on_slot: Optional callback(key, done, total) called after
+        each slot of the tasks processed per slot.
+        :param cancel: Optional threading.Event to cancel the run: the
+        running slots are completed, the others and the next tasks are
+        not run (self.cancelled is then True).
+        :param profiler: Optional cProfile.Profile enabled while the tasks
+        run (the work of the worker processes is not profiled).
+        :return: List of (task name, elapsed time in s). The records of
+        the tasks, slots and stages are in self.recorder.
+        """
+        self.timings = []
+        self.recorder = Recorder(self.dirname, self.trace_memory)
+        self.failures = []
+        self.cancelled = False
+        scheduler = ObservedScheduler(self.scheduler, on_slot, cancel,
+                                      self.recorder)
+        try:
+            for task_name, task_function, kwargs in self.tasks(scheduler):
+                if cancel is not None and cancel.is_set():
+                    self.cancelled = True
+                    break
+                if on_start:
+                    on_start(task_name)
+                start_time = time.time()
+                self.recorder.task = task_name
+                with self.recorder.tracing(), recording(self.recorder), \
+                        self.recorder.measure("task"):
+                    if profiler is not None:
+                        profiler.enable()
+                    try:
+                        task_function(**kwargs)
+                    except SlotError as error:
+                        # The slots not processed because of the
+                        # cancellation are not failures
+                        self.failures.extend(
+                            failure for failure in error.failures
+                            if not isinstance(failure.error, Cancelled))
+                    finally:
+                        if profiler is not None:
+                            profiler.disable()
+                elapsed_time = time.time() - start_time
+                self.timings.append((task_name, elapsed_time))
+                if on_finish:
+                    on_finish(task_name, elapsed_time)
+            else:
+                self.cancelled = cancel is not None and cancel.is_set()
+        finally:
+            if self.own_scheduler:
+                self.scheduler.shutdown()
+        return self.timings
+
+
+def run_lots(dirnames, values, options=None, tool="MoS₂", workers=None,
+             lot_workers=None, on_start=None, on_finish=None,
+             trace_memory=False, profile_path=None):
+    """
+    Run the pipeline of several lots at the same time. The tasks of a lot
+    run in order, and the slots of all the lots share one pool of worker
+    processes.
+
+    :param workers: Number of worker processes (default: settings, or
+    half of the CPU cores).
+    :param lot_workers: Number of lots processed at the same time
+    (default: all).
+    :param on_start: Optional callback(dirname, task_name).
+    :param on_finish: Optional callback(dirname, task_name, elapsed_time).
+    :param trace_memory: If True, record the peak memory of the stages.
+    :param profile_path: Optional file of the cProfile statistics of the
+    lots (pstats format, work of the main process only). The lots are then
+    processed one at a time, by one profiler.
+    :return: List of the pipelines (see timings, recorder, failures and
+    error).
+    """
+    dirnames = list(dirnames)
+    profiler = cProfile.Profile() if profile_path else None
+    if profiler is not None:
+        lot_workers = 1
+    with Scheduler(workers or get_workers(values)) as scheduler:
+        pipelines = [Pipeline(dirname, values, options, tool, scheduler,
+                              trace_memory)
+                     for dirname in dirnames]
+
+        def run_lot(pipeline):
+            try:
+                pipeline.run(
+                    on_start and partial(on_start, pipeline.dirname),
+                    on_finish and partial(on_finish, pipeline.dirname),
+                    profiler=profiler)
+            except Exception as error:  # pylint: disable=broad-except
+                pipeline.error = error
+
+        with ThreadPoolExecutor(
+                max_workers=max(1, lot_workers or len(dirnames))) as lots:
+            list(lots.map(run_lot, pipelines))
+    if profiler is not None:
+        profiler.dump_stats(profile_path)
+    return pipelines
@@ -0,0 +1,200 @@
+"""
+Profiling
+This module records where the processing time of a lot goes: wall time,
+CPU time, peak memory and number of items of each task of a run, of each
+slot of the tasks processed per slot, and of the stages measured inside
+them (parse, compute, griddata, savefig, montage, stats, boxplot...):
+the stage of the record of a whole task is "task", of a slot "slot".
+The stages measured in the worker processes are sent back with the result
+of their slot (see SlotProfiler). The records can be saved as JSON or CSV;
+a run can also be profiled with cProfile (see Pipeline.run).
+The CPU time is the one of the process of the stage. Measuring a stage
+costs two clock readings; the peak memory is measured (tracemalloc) only
+if requested, as it slows down the processing.
+"""
+import os
+import csv
+import json
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+FIELDS = ("lot", "task", "stage", "slot", "wall_time", "cpu_time",
+          "peak_memory", "items")
+
+_local = threading.local()
+
+
+def _stack(name):
+    """Return a per-thread stack (list)."""
+    stack = getattr(_local, name, None)
+    if stack is None:
+        stack = []
+        setattr(_local, name, stack)
+    return stack
+
+
+def _enter_peak():
+    """Start measuring the peak memory of a stage (nested stages keep the
+    peak of the enclosing ones)."""
+    peaks = _stack("peaks")
+    if peaks:
+        peaks[-1] = max(peaks[-1], tracemalloc.get_traced_memory()[1])
+    tracemalloc.reset_peak()
+    peaks.append(0)
+
+
+def _exit_peak():
+    """Return the peak memory (bytes) of the stage measured last."""
+    peaks = _stack("peaks")
+    peak = max(peaks.pop(), tracemalloc.get_traced_memory()[1])
+    if peaks:
+        peaks[-1] = max(peaks[-1], peak)
+    return peak
+
+
+class Recorder:
+    """
+    Records of the stages of a run (dictionaries with the FIELDS keys).
+    """
+
+    def __init__(self, lot=None, memory=False):
+        """
+        :param lot: Lot directory of the records.
+        :param memory: If True, measure the peak memory allocated by
+        Python (tracemalloc) during each stage (approximate when several
+        lots are processed by the threads of a process).
+        """
+        self.lot = lot
+        self.memory = memory
+        # Task of the pipeline being run (see Pipeline.run)
+        self.task = None
+        self.records = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, stage, slot=None, items=None):
+        """
+        Measure a stage. The record is yielded, so that the number of
+        items can be set once known.
+        """
+        record = {"lot": self.lot, "task": self.task, "stage": stage,
+                  "slot": slot, "wall_time": None, "cpu_time": None,
+                  "peak_memory": None, "items": items}
+        tracing = self.memory and tracemalloc.is_tracing()
+        if tracing:
+            _enter_peak()
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall_time"] = time.perf_counter() - start_wall
+            record["cpu_time"] = time.process_time() - start_cpu
+            if tracing:
+                record["peak_memory"] = _exit_peak()
+            self.add([record])
+
+    def add(self, records, **fields):
+        """Add records, with the given fields (slot...) if not set."""
+        with self._lock:
+            for record in records:
+                for field, value in fields.items():
+                    if record.get(field) is None:
+                        record[field] = value
+                self.records.append(record)
+
+    @contextmanager
+    def tracing(self):
+        """Trace the memory allocations while the run lasts, if the
+        recorder measures the memory."""
+        started = self.memory and not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        try:
+            yield
+        finally:
+            if started:
+                tracemalloc.stop()
+
+
+@contextmanager
+def recording(recorder):
+    """Make the recorder the one of the stages measured by the thread."""
+    recorders = _stack("recorders")
+    recorders.append(recorder)
+    try:
+        yield recorder
+    finally:
+        recorders.pop()
+
+
+@contextmanager
+def measure(stage, items=None):
+    """
+    Measure a stage with the recorder of the thread (see recording). The
+    record is yielded (a dictionary not kept if there is no recorder).
+    """
+    recorders = _stack("recorders")
+    if not recorders:
+        yield {"items": items}
+        return
+    with recorders[-1].measure(stage, items=items) as record:
+        yield record
+
+
+class SlotProfiler:
+    """
+    Per-slot function measured in its process (worker or not): returns
+    the result of the function and the records of the slot.
+    """
+
+    def __init__(self, function, memory=False):
+        self.function = function
+        self.memory = memory
+
+    def __call__(self, *args):
+        recorder = Recorder(memory=self.memory)
+        with recorder.tracing(), recording(recorder), \
+                recorder.measure("slot"):
+            result = self.function(*args)
+        return result, recorder.records
+
+
+def summarize(records):
+    """
+    Return the totals of the records per task and stage: number of
+    records, wall and CPU time, items and largest peak memory.
+    """
+    summary = {}
+    for record in records:
+        key = (record["task"], record["stage"])
+        total = summary.setdefault(key, {
+            "task": record["task"], "stage": record["stage"], "count": 0,
+            "wall_time": 0.0, "cpu_time": 0.0, "items": None,
+            "peak_memory": None})
+        total["count"] += 1
+        total["wall_time"] += record["wall_time"]
+        total["cpu_time"] += record["cpu_time"]
+        if record["items"] is not None:
+            total["items"] = (total["items"] or 0) + record["items"]
+        if record["peak_memory"] is not None:
+            total["peak_memory"] = max(total["peak_memory"] or 0,
+                                       record["peak_memory"])
+    return list(summary.values())
+
+
+def save_records(records, filepath):
+    """
+    Save the records as CSV (one row per record) or, for any other
+    extension, as JSON (records and their summary).
+    """
+    if os.path.splitext(filepath)[1].lower() == ".csv":
+        with open(filepath, "w", newline="") as file:
+            writer = csv.DictWriter(file, FIELDS)
+            writer.writeheader()
+            writer.writerows(records)
+    else:
+        with open(filepath, "w") as file:
+            json.dump({"records": records, "summary": summarize(records)},
+                      file, indent=1)
@@ -0,0 +1,147 @@
+"""
+Raster
+This module renders the mapping images without building a matplotlib
+figure for each image. The decorations of the figure (axes, ticks,
+labels, edge-exclusion circle) are rendered once by matplotlib as a
+transparent overlay; each image is then the grid colored with the
+colormap LUT (NumPy), upsampled to the pixels of the axes, with the
+overlay and the statistics text composited with PIL.
+The matplotlib renderer (see map_figure) remains the reference: the
+raster images match it except for the antialiasing of some edges and the
+statistics text (drawn with the same font by PIL).
+"""
+import io
+from functools import lru_cache
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib import font_manager
+from PIL import Image, ImageDraw, ImageFont
+from wdxrf.Processing.map_figure import create_map_figure, STATS_FONTSIZE, \
+    STATS_POSITIONS
+
+RENDERERS = ("matplotlib", "raster")
+
+# PIL anchors (on the baseline) of the matplotlib text alignments
+_ANCHORS = {'left': 'ls', 'right': 'rs'}
+
+
+def colormap_lut(cmap='Spectral_r'):
+    """Return the colormap as an (N, 4) uint8 RGBA table."""
+    colormap = plt.get_cmap(cmap)
+    return (colormap(np.arange(colormap.N)) * 255).astype(np.uint8)
+
+
+def apply_colormap(values, vmin, vmax, lut):
+    """
+    Color a grid with a LUT, as matplotlib does for a Normalize(vmin,
+    vmax): out-of-range values take the end colors, masked or NaN values
+    are transparent.
+
+    :return: Array (rows, columns, 4) of uint8.
+    """
+    data = np.ma.masked_invalid(values)
+    size = len(lut)
+    if vmax > vmin:
+        scaled = (data.filled(vmin).astype(float) - vmin) / (vmax - vmin)
+    else:
+        scaled = np.zeros(data.shape)
+    index = scaled * size
+    index[index == size] = size - 1
+    index = np.clip(index, -1, size).astype(int)
+    rgba = lut[np.clip(index, 0, size - 1)]
+    rgba[np.ma.getmaskarray(data)] = 0
+    return rgba
+
+
+class MapRaster:
+    """
+    Pre-rendered frame of the mappings of one wafer geometry.
+    """
+
+    def __init__(self, radius, edge_exclusion, shape, cmap='Spectral_r'):
+        """
+        :param radius: Radius of the wafer (cm).
+        :param edge_exclusion: Edge exclusion (cm).
+        :param shape: Shape (rows, columns) of the grids.
+        """
+        self.lut = colormap_lut(cmap)
+        fig, ax, img = create_map_figure(np.zeros(shape), radius,
+                                         edge_exclusion, cmap, pyplot=False)
+        img.set_visible(False)
+
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', bbox_inches='tight',
+                    transparent=True)
+        self.overlay = Image.open(buffer)
+        self.overlay.load()
+        self.size = self.overlay.size
+
+        # Positions (pixels of the image) of the axes and of the texts,
+        # with the layout of the saved image
+        fig.set_layout_engine('none')
+        renderer = fig.canvas.get_renderer()
+        bbox = fig.get_tightbbox(renderer).padded(
+            plt.rcParams['savefig.pad_inches'])
+        origin = np.array([bbox.x0, bbox.y0]) * fig.dpi
+        height = self.size[1]
+
+        def to_image(point):
+            # Agg renders from the bottom-left corner of the image
+            return point[0] - origin[0], height - (point[1] - origin[1])
+
+        left, bottom = to_image(ax.bbox.p0)
+        right, top = to_image(ax.bbox.p1)
+        self.font = ImageFont.truetype(
+            font_manager.findfont(font_manager.FontProperties()),
+            STATS_FONTSIZE * fig.dpi / 72)
+        # Matplotlib aligns the extent of 'lp' on the anchor: baseline of
+        # the texts
+        _, ascent, _, descent = self.font.getbbox('lp', anchor='ls')
+        self.text_anchors = []
+        for x, y, _, va in STATS_POSITIONS:
+            anchor_x, anchor_y = to_image(ax.transAxes.transform((x, y)))
+            self.text_anchors.append(
+                (anchor_x, anchor_y - descent if va == 'bottom'
+                 else anchor_y - ascent))
+
+        # Grid cell of each pixel of the axes (nearest neighbour, origin
+        # at the bottom)
+        self.box = (int(np.ceil(left - 0.5)), int(np.ceil(top - 0.5)),
+                    int(np.ceil(right - 0.5)), int(np.ceil(bottom - 0.5)))
+        columns = np.arange(self.box[0], self.box[2]) + 0.5
+        rows = np.arange(self.box[1], self.box[3]) + 0.5
+        self.columns = np.clip(((columns - left) / (right - left)
+                                * shape[1]).astype(int), 0, shape[1] - 1)
+        self.rows = np.clip(((bottom - rows) / (bottom - top)
+                             * shape[0]).astype(int), 0, shape[0] - 1)
+
+    def render(self, grid_z, vmin, vmax, labels=()):
+        """
+        Render a mapping.
+
+        :param grid_z: Grid of the parameter (masked or NaN values are
+        not drawn).
+        :param vmin: Lower limit of the color scale.
+        :param vmax: Upper limit of the color scale.
+        :param labels: Statistics texts (see map_figure.stats_labels).
+        :return: RGBA PIL image.
+        """
+        image = Image.new('RGBA', self.size, (255, 255, 255, 255))
+        cells = apply_colormap(grid_z, vmin, vmax, self.lut)
+        pixels = cells[self.rows[:, None], self.columns[None, :]]
+        tile = Image.fromarray(pixels, 'RGBA')
+        image.paste(tile, self.box[:2], tile)
+        image.alpha_composite(self.overlay)
+
+        draw = ImageDraw.Draw(image)
+        for label, anchor, (_, _, ha, _) in zip(labels, self.text_anchors,
+                                                STATS_POSITIONS):
+            draw.text(anchor, label, font=self.font, fill=(0, 0, 0, 255),
+                      anchor=_ANCHORS[ha])
+        return image
+
+
+@lru_cache(maxsize=8)
+def get_raster(radius, edge_exclusion, shape, cmap='Spectral_r'):
+    """Return the MapRaster of a wafer geometry (cached per process)."""
+    return MapRaster(radius, edge_exclusion, shape, cmap)
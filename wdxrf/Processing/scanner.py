@@ -0,0 +1,112 @@
+"""
+Scanner
+This module walks a lot directory once and classifies its content: raw
+CSV files, files derived by XRF2D, slot folders and output folders
+(Mapping, Graphe, Liste_data...).
+The index is cached per directory and reused by all processing stages
+until the modification time of one of the scanned folders changes.
+"""
+import os
+
+# Folders created by XRF2D (at the root of the lot or in slot folders)
+OUTPUT_FOLDERS = ("Graphe", "Mapping", "Spectra", "raw_data", "Liste_data")
+
+# Files created by XRF2D in the slot folders
+DERIVED_FILENAMES = ("data_DP.csv", "Parameters.csv", "Parameters_stats.csv",
+                     "Grid_axes.npz")
+DERIVED_SUFFIXES = ("_grid_df.csv", ".npy", ".png")
+
+
+def is_derived_file(filename):
+    """Return True if the file name is one of the files created by
+    XRF2D."""
+    return filename in DERIVED_FILENAMES or filename.endswith(
+        DERIVED_SUFFIXES)
+
+
+class DirectoryIndex:
+    """
+    Content of a lot directory, built by a single os.walk.
+
+    Attributes:
+    - raw_files: raw CSV files (outside output folders)
+    - derived_files: files created by XRF2D (outside output folders)
+    - slot_dirs: folders containing at least one raw CSV file
+    - subfolders: folders directly under the lot directory (output
+    folders excluded)
+    - output_dirs: output folders (Mapping, Graphe, Liste_data...)
+    - mapping_dirs: 'Mapping' folders
+    """
+
+    def __init__(self, dirname):
+        self.dirname = dirname
+        self.raw_files = []
+        self.derived_files = []
+        self.slot_dirs = []
+        self.subfolders = []
+        self.output_dirs = []
+        self.mapping_dirs = []
+        self.dir_mtimes = {}
+        self.scan()
+
+    def scan(self):
+        """Walk the directory tree once and classify its content."""
+        for subdir, dirs, files in os.walk(self.dirname):
+            self.dir_mtimes[subdir] = os.stat(subdir).st_mtime_ns
+
+            # Output folders are listed but not walked
+            for folder in [d for d in dirs if d in OUTPUT_FOLDERS]:
+                path = os.path.join(subdir, folder)
+                self.output_dirs.append(path)
+                if folder == "Mapping":
+                    self.mapping_dirs.append(path)
+                dirs.remove(folder)
+            dirs.sort()
+
+            if subdir == self.dirname:
+                self.subfolders = [os.path.join(subdir, d) for d in dirs]
+
+            has_raw_file = False
+            for file in sorted(files):
+                filepath = os.path.join(subdir, file)
+                if is_derived_file(file):
+                    self.derived_files.append(filepath)
+                elif file.endswith(".csv"):
+                    self.raw_files.append(filepath)
+                    has_raw_file = True
+            if has_raw_file:
+                self.slot_dirs.append(subdir)
+
+    def is_valid(self):
+        """Return True if no scanned folder changed since the scan."""
+        for path, mtime in self.dir_mtimes.items():
+            try:
+                if os.stat(path).st_mtime_ns != mtime:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def files_named(self, filename):
+        """Return the derived files with the given name."""
+        return [path for path in self.derived_files
+                if os.path.basename(path) == filename]
+
+
+_INDEX_CACHE = {}
+
+
+def get_index(dirname, refresh=False):
+    """
+    Return the DirectoryIndex of a lot directory, scanning it only if it
+    is not cached or if it changed since the last scan.
+
+    :param dirname: Lot directory.
+    :param refresh: If True, always scan the directory again.
+    """
+    key = os.path.abspath(dirname)
+    index = _INDEX_CACHE.get(key)
+    if refresh or index is None or not index.is_valid():
+        index = DirectoryIndex(dirname)
+        _INDEX_CACHE[key] = index
+    return index
@@ -0,0 +1,288 @@
+"""
+Scheduler
+This module runs the per-slot work of the processing stages (conversion of
+the raw files, statistics, mapping) in a pool of worker processes and
+collects the result or the error of each slot, so that one failing slot
+does not stop the others. The pool can be shared by several lots
+processed at the same time, and kept by the application between runs:
+its workers import the processing modules once, when they start.
+A run can follow the progress of the slots and be cancelled (see
+ObservedScheduler). A worker which dies (crash, out of memory) fails its
+slots and the pool is replaced, so the next slots and runs still work.
+"""
+import os
+import threading
+import traceback
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from wdxrf.Processing.profiling import SlotProfiler
+
+
+def default_workers():
+    """Return the default number of worker processes (half of the cores)."""
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+def warm_up():
+    """
+    Initializer of the worker processes: import pandas, scipy and
+    matplotlib (non-interactive backend) before the first task.
+    """
+    # pylint: disable=import-outside-toplevel, unused-import
+    import matplotlib
+    matplotlib.use("Agg")
+    import wdxrf.Processing.xrf
+    import wdxrf.Processing.function_common
+
+
+# Interval (s) at which a cancellation is checked while slots are running
+CANCEL_POLL_INTERVAL = 0.2
+
+
+class Cancelled(Exception):
+    """
+    Error of the slots not processed because the run was cancelled.
+    """
+
+    def __init__(self):
+        super().__init__("Cancelled")
+
+
+class SlotFailure:
+    """
+    Error raised by the processing of one slot.
+    """
+
+    def __init__(self, key, error):
+        self.key = key
+        self.error = error
+        # The traceback of a worker process is attached as the cause
+        self.details = "".join(traceback.format_exception(
+            type(error), error, error.__traceback__))
+
+    def __str__(self):
+        return f"{self.key}: {self.error!r}"
+
+
+class SlotError(Exception):
+    """
+    Raised by a stage after processing all the slots, if some of them
+    failed. The results of the other slots are saved.
+    """
+
+    def __init__(self, stage, failures):
+        self.stage = stage
+        self.failures = failures
+        super().__init__(f"{stage}: {len(failures)} slot(s) failed: "
+                         + ", ".join(str(failure) for failure in failures))
+
+
+class Scheduler:
+    """
+    Pool of worker processes for the per-slot work.
+
+    The pool is started on first use (or by start()) and its workers are
+    kept until shutdown(), so a scheduler can be reused by several stages,
+    runs and lots. With one worker, the work is done in the calling
+    process (no pool), which eases debugging.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = self._worker_count(workers)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _worker_count(workers):
+        """Return the number of workers (default if None or 0)."""
+        return max(1, int(workers)) if workers else default_workers()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    @property
+    def executor(self):
+        """Process pool, started on first use."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, initializer=warm_up)
+            return self._executor
+
+    def start(self):
+        """
+        Start the worker processes without waiting, so that they are
+        ready (modules imported) when the first slots are submitted.
+        """
+        if self.workers > 1:
+            executor = self.executor
+            for _ in range(self.workers):
+                executor.submit(int)
+
+    def set_workers(self, workers):
+        """Change the number of workers (the pool is restarted on next
+        use if the number changes)."""
+        workers = self._worker_count(workers)
+        if workers != self.workers:
+            self.shutdown()
+            self.workers = workers
+
+    def map_slots(self, function, keys, *iterables, on_slot=None,
+                  cancel=None):
+        """
+        Call function(*args) for each slot.
+
+        :param function: Picklable function (defined at module level).
+        :param keys: Key of each slot (folder, raw file...).
+        :param iterables: Arguments of the function, one item per slot.
+        :param on_slot: Optional callback(key, done, total) called in the
+        calling thread after each slot (processed or failed).
+        :param cancel: Optional threading.Event. Once set, the slots not
+        started yet are not processed (failure Cancelled); the running
+        slots are completed.
+        :return: Tuple (results, failures): dictionary key -> result of
+        the slots processed without error (in the order of keys), and list
+        of SlotFailure.
+        """
+        keys = list(keys)
+        arguments = list(zip(*iterables)) if iterables else [()] * len(keys)
+        results, failures = {}, []
+
+        if self.workers == 1:
+            for done, (key, args) in enumerate(zip(keys, arguments), 1):
+                if cancel is not None and cancel.is_set():
+                    failures.append(SlotFailure(key, Cancelled()))
+                    continue
+                try:
+                    results[key] = function(*args)
+                except Exception as error:  # pylint: disable=broad-except
+                    failures.append(SlotFailure(key, error))
+                if on_slot:
+                    on_slot(key, done, len(keys))
+            return results, failures
+
+        # The slots are submitted as the workers become free (one slot
+        # ahead): the executor starts the slots submitted, which can then
+        # not be cancelled
+        queue = deque(zip(keys, arguments))
+        futures = {}
+        done = 0
+        while queue or futures:
+            if cancel is not None and cancel.is_set():
+                failures.extend(SlotFailure(key, Cancelled())
+                                for key, _ in queue)
+                queue.clear()
+            while queue and len(futures) <= self.workers:
+                key, args = queue.popleft()
+                executor = self.executor
+                try:
+                    futures[executor.submit(function, *args)] = (key,
+                                                                 executor)
+                except BrokenProcessPool:
+                    # Pool broken by another stage or lot: the slot is
+                    # submitted again to a new pool
+                    self._discard(executor)
+                    queue.appendleft((key, args))
+            if not futures:
+                break
+            finished, _ = wait(
+                futures, CANCEL_POLL_INTERVAL if cancel is not None else None,
+                FIRST_COMPLETED)
+            for future in finished:
+                key, executor = futures.pop(future)
+                error = future.exception()
+                if error is None:
+                    results[key] = future.result()
+                else:
+                    if isinstance(error, BrokenProcessPool):
+                        # A worker died: the running slots fail, the next
+                        # ones go to a new pool
+                        self._discard(executor)
+                    failures.append(SlotFailure(key, error))
+                done += 1
+                if on_slot:
+                    on_slot(key, done, len(keys))
+
+        failures.sort(key=lambda failure: keys.index(failure.key))
+        results = {key: results[key] for key in keys if key in results}
+        return results, failures
+
+    def _discard(self, executor):
+        """Stop a broken pool, replaced on next use (if it is still the
+        pool of the scheduler)."""
+        with self._lock:
+            if executor is None or self._executor is not executor:
+                return
+            self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self, wait=True, cancel=False):
+        """
+        Stop the worker processes (a new pool is started if needed).
+
+        :param wait: If True, wait for the running tasks.
+        :param cancel: If True, cancel the tasks not started yet.
+        """
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait, cancel_futures=cancel)
+                self._executor = None
+
+
+class ObservedScheduler:
+    """
+    Scheduler used by one run: the slots are processed by a (shared)
+    scheduler, with the same progress callback and cancellation event for
+    all the stages of the run (see Scheduler.map_slots). If the run is
+    profiled, each slot is measured in its process and its records added
+    to the recorder of the run (see profiling).
+    """
+
+    def __init__(self, scheduler, on_slot=None, cancel=None, recorder=None):
+        self.scheduler = scheduler
+        self.on_slot = on_slot
+        self.cancel = cancel
+        self.recorder = recorder
+
+    def map_slots(self, function, keys, *iterables):
+        """Same as Scheduler.map_slots, with the callback and the event of
+        the run."""
+        if self.recorder is None:
+            return self.scheduler.map_slots(function, keys, *iterables,
+                                            on_slot=self.on_slot,
+                                            cancel=self.cancel)
+        recorder = self.recorder
+        results, failures = self.scheduler.map_slots(
+            SlotProfiler(function, recorder.memory), keys, *iterables,
+            on_slot=self.on_slot, cancel=self.cancel)
+        for key, (result, records) in results.items():
+            recorder.add(records, lot=recorder.lot, task=recorder.task,
+                         slot=key)
+            results[key] = result
+        return results, failures
+
+
+@contextmanager
+def use_scheduler(scheduler=None):
+    """Yield the given scheduler, or a temporary one stopped on exit."""
+    if scheduler is not None:
+        yield scheduler
+    else:
+        with Scheduler() as scheduler:
+            yield scheduler
+
+
+def report_failures(stage, failures):
+    """Print the failures of a stage and raise SlotError if any."""
+    for failure in failures:
+        if isinstance(failure.error, Cancelled):
+            print(f"Cancelled ({stage}): {failure.key}")
+        else:
+            print(f"Error ({stage}): {failure.key}\n{failure.details}")
+    if failures:
+        raise SlotError(stage, failures)
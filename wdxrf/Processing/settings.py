@@ -0,0 +1,92 @@
+"""
+Settings
+This module contains the default processing settings (same labels as the
+Settings window) and helpers to read them without the GUI.
+"""
+import os
+import json
+
+# Folder and file where the Settings window stores its values
+SETTINGS_FOLDER = os.path.join(os.path.expanduser("~"), "WDXRF")
+SETTINGS_FILE = os.path.join(SETTINGS_FOLDER, "settings_data.json")
+
+# (label, default value, row, column) of each entry of the Settings window
+SETTINGS_ENTRIES = [
+    ("Wafer size (cm):", "20", 1, 0),
+    ("Edge Exclusion (cm):", "2.5", 2, 0),
+    ("Step (cm):", "0.5", 3, 0),
+    ("Columns on GUI:", "3", 4, 0),
+    ("Min density (ug.cm-2):", "0", 1, 2),
+    ("Max density (ug.cm-2):", "", 1, 4),
+    ("Min S/Mo:", "0", 2, 2),
+    ("Max S/Mo:", "3", 2, 4),
+    ("Min thickness (ML):", "0", 3, 2),
+    ("Max thickness (ML):", "", 3, 4),
+    ("Workers:", "", 4, 2),
+    ("Montage scale:", "1", 4, 4),
+]
+
+# Number of worker processes (empty: half of the CPU cores)
+WORKERS_LABEL = "Workers:"
+# Downscaling factor of the montages of the mappings (Graphe/Mapping)
+MONTAGE_SCALE_LABEL = "Montage scale:"
+# Settings read by the mapping of a slot: grid and density threshold
+GRID_LABELS = ("Wafer size (cm):", "Edge Exclusion (cm):", "Step (cm):",
+               "Min density (ug.cm-2):")
+# Color limits of the mappings with the scale of the settings
+LIMIT_LABELS = ("Min density (ug.cm-2):", "Max density (ug.cm-2):",
+                "Min S/Mo:", "Max S/Mo:", "Min thickness (ML):",
+                "Max thickness (ML):")
+
+
+def parse_settings(settings):
+    """
+    Convert settings given as text (Settings window, JSON file) to the
+    values used by the processing: float, or None if the text is not a
+    number.
+    """
+    values = {}
+    for label_text, text in settings.items():
+        try:
+            values[label_text] = float(text)  # Convert to float
+        except (TypeError, ValueError):
+            values[label_text] = None  # Handle conversion error
+    return values
+
+
+def load_settings(filepath=None):
+    """
+    Return the processing values from a JSON settings file (same format
+    as the file saved by the Settings window). Missing labels take their
+    default value.
+
+    :param filepath: JSON file; defaults to the file of the Settings
+    window if it exists.
+    """
+    settings = {label: default for label, default, _, _ in SETTINGS_ENTRIES}
+    if filepath is None and os.path.exists(SETTINGS_FILE):
+        filepath = SETTINGS_FILE
+    if filepath is not None:
+        with open(filepath, "r") as file:
+            settings.update(json.load(file))
+    return parse_settings(settings)
+
+
+def get_workers(values):
+    """Return the number of worker processes of the settings, or None
+    for the default."""
+    workers = values.get(WORKERS_LABEL)
+    return int(workers) if workers and workers >= 1 else None
+
+
+def get_montage_scale(values):
+    """Return the downscaling factor of the montages (1 if not set, at
+    most 1)."""
+    scale = values.get(MONTAGE_SCALE_LABEL)
+    return min(scale, 1.0) if scale and scale > 0 else 1.0
+
+
+def select_settings(values, labels):
+    """Return the values of the given labels (None if missing), e.g. for
+    the signature of a stage which only reads them."""
+    return {label: values.get(label) for label in labels}
@@ -2,50 +2,148 @@
 XRF
 This module contains functions and classes for XRF analysis.
 """
-import sys
 import os
 from functools import partial
-from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
-from PyQt5.QtWidgets import QApplication
-import matplotlib.ticker as mticker
-from scipy.interpolate import griddata
-import matplotlib.pyplot as plt
-from wdxrf.Layout.setting_windows import SettingsWindow
-
-# Molar mass of Mo and S; and Mo/unit
-MOLAR_MO = 95.95
-MOLAR_S = 32.07
-MO_UNIT = 11.6372403697997
-
-def plot_wdf_mp(filepath, input, slot_number, identical=None, stats=None):
+from wdxrf.Processing.conversion import read_raw_csv, convert_raw_data
+from wdxrf.Processing.interpolation import interpolate_parameters, \
+    default_cache
+from wdxrf.Processing.grid import build_grid, get_step
+from wdxrf.Processing.grid_store import save_grids, export_grid_csv
+from wdxrf.Processing.lot_data import write_lot_data, iter_slot_frames
+from wdxrf.Processing.scanner import get_index
+from wdxrf.Processing.manifest import Manifest, file_signature, \
+    settings_signature
+from wdxrf.Processing.scheduler import use_scheduler, report_failures
+from wdxrf.Processing.settings import GRID_LABELS, LIMIT_LABELS, \
+    select_settings
+from wdxrf.Processing.map_figure import get_map_template, \
+    read_slot_stats, stats_labels
+from wdxrf.Processing.raster import get_raster
+from wdxrf.Processing.montage import make_tile, scaled_size
+from wdxrf.Processing.profiling import measure
+
+def convert_slot(filepath, export_csv=False):
     """
-    Processes a single WDF data file and generates mapping plots.
+    Convert the raw file of a slot.
 
-    :param filepath: Path to the WDF file.
-    :param settings: List of dictionaries containing 'Peak', 'Ylabel',
-    and 'Filename'. Optionally includes thresholds ('Min', 'Max').
+    :param filepath: Raw CSV file.
+    :param export_csv: If True, also save the processed data as
+    data_DP.csv in the slot folder.
+    :return: Tuple (processed data, list of the files created).
+    """
+    with measure("parse") as record:
+        raw_data = read_raw_csv(filepath)
+        record["items"] = len(raw_data)
+    with measure("compute", items=len(raw_data)):
+        data = convert_raw_data(raw_data)
+    outputs = []
+    if export_csv:
+        outputs.append(os.path.join(os.path.dirname(filepath), "data_DP.csv"))
+        data.to_csv(outputs[0], index=False, mode='w+')
+    return data, outputs
+
+def scale_limits(column, identical, input, dirname):
+    """
+    Return the limits (min, max) of the color scale of a parameter.
+
+    :param column: 'Density', 'S_Mo' or 'Number of layers'.
+    :param identical: False or 'Manual' for the limits of the settings,
+    'Autoscale' for the limits of all the slots (boxplot files).
+    :param input: Settings.
+    :param dirname: Lot directory.
+    """
+    min_value = None
+    max_value = None
+    if identical == False or identical == 'Manual':
+        if column == "Density":
+            max_value = input.get("Max density (ug.cm-2):", 0)
+            min_value = input.get("Min density (ug.cm-2):", 0)
+
+        elif column == "Number of layers":
+            max_value = input.get("Max thickness (ML):", 0)
+            min_value = input.get("Min thickness (ML):", 0)
+
+        elif column == "S_Mo":
+            max_value = input.get('Max S/Mo:', 0)
+            min_value = input.get('Min S/Mo:', 0)
+        print(f"Min: {min_value}, Max: {max_value}")
+
+    elif identical == 'Autoscale':
+        if column == "Density":
+            boxplot_frame = pd.read_csv(
+                os.path.join(dirname, 'Liste_data', "Boxplot_Density.csv"))
+
+            max_value = boxplot_frame.iloc[:, 1:].max().max()
+            min_value = boxplot_frame.iloc[:, 1:].min().min()
+
+        elif column == "Number of layers":
+            boxplot_frame = pd.read_csv(os.path.join(dirname, 'Liste_data',
+                                                    "Boxplot_Thickness.csv"))
+            max_value = boxplot_frame.iloc[:, 1:].max().max()
+            min_value = boxplot_frame.iloc[:, 1:].min().min()
+
+        elif column == "S_Mo":
+            boxplot_frame = pd.read_csv(os.path.join(dirname, 'Liste_data',
+                                                    "Boxplot_S_Mo.csv"))
+            max_value = boxplot_frame.iloc[:, 1:].max().max()
+            min_value = boxplot_frame.iloc[:, 1:].min().min()
+    return min_value, max_value
+
+
+def plot_wdf_mp(wafer_number, data_frame, input, slot_number, identical=None,
+                stats=None, export_masks=False, export_csv=False):
+    """
+    Processes the data of a single wafer and generates mapping plots.
+
+    :param wafer_number: Path to the wafer (slot) folder.
+    :param data_frame: Processed data of the wafer (see lot_data).
     :param input: Dictionary with 'Wafer Size' and 'Edge Exclusion' settings.
     :param slot_number: Optional slot number for labeling plots.
     :param identical: If True, uses a consistent scale for all plots.
     :param stats: If true, add mean and sigma for all plots.
+    :param export_masks: If True, save the mask of each parameter as
+    '<parameter>_Mask.npy' in the wafer folder.
+    :param export_csv: If True, also export the grids as
+    '<parameter>_grid_df.csv'.
+    :return: List of the files created for the wafer.
     """
-    # Print the file being processed
-    print('Processing:', filepath)
-    dirname = os.path.dirname(os.path.dirname(filepath))
+    scale_outputs, outputs = plot_wdf_scales(
+        wafer_number, data_frame, [identical], input, slot_number, stats,
+        export_masks, export_csv)
+    return scale_outputs[0] + outputs
 
-    # Determine wafer number and initial step size
-    wafer_number = os.path.dirname(filepath)
-    step = 0.5
 
-    # Load data from CSV into a Pandas DataFrame
-    data_frame = pd.read_csv(filepath)
+def plot_wdf_scales(wafer_number, data_frame, scales, input, slot_number,
+                    stats=None, export_masks=False, export_csv=False,
+                    renderer='matplotlib', tile_scale=None):
+    """
+    Processes the data of a single wafer and generates the mapping plots
+    of several color scales. The data is interpolated once and the
+    figures reuse the template of the wafer geometry (see map_figure):
+    only the data, statistics, color limits and filename change between
+    the images.
+
+    :param scales: List of scale modes (identical argument of
+    plot_wdf_mp: False, 'Manual' or 'Autoscale').
+    :param renderer: 'matplotlib' (reference) or 'raster' (fast renderer,
+    see raster).
+    :param tile_scale: If not None, the images are also returned as
+    montage tiles downscaled by this factor (see montage).
+    :return: List of the images created for each scale, list of the
+    other files created for the wafer (grids, masks...), and if
+    tile_scale is not None, the dictionary image file -> tile (RGB
+    array).
+    """
+    # Print the wafer being processed
+    print('Processing:', wafer_number)
+    dirname = os.path.dirname(wafer_number)
+
+    # Determine grid step size
+    step = get_step(input)
 
     # Initialize variables for color scale limits
-    vmin = None
-    vmax = None
-    thr_column = None
     threshold = None
 
     # Extract peaks, labels, and filenames from settings
@@ -54,123 +152,49 @@ def plot_wdf_mp(filepath, input, slot_number, identical=None, stats=None):
     grids = ['Density','S_Mo', 'Number of layers']
     filenames = ['Density','S_Mo', 'Number of layers']
 
-    # Modify filenames if identical scaling is enabled
-    if identical:
-        filenames = [f"{file}_ID_scale" for file in filenames]
-
     # Extract wafer properties from input
     wafer_size = int(input.get('Wafer size (cm):', 0))
     edge_exclusion = int(input.get('Edge Exclusion (cm):', 0))
     radius = wafer_size / 2
 
-    # Generate a regular grid for interpolation
-    x = np.arange(-radius + 0.5, radius - 0.5 + step, step)
-    y = np.arange(-radius + 0.5, radius - 0.5 + step, step)
-    grid_x, grid_y = np.meshgrid(x, y)
-
-    # Create a mask for points outside the valid wafer radius
-    distance_from_center = np.sqrt(grid_x ** 2 + grid_y ** 2)
-    mask = distance_from_center <= radius - edge_exclusion
+    # Regular grid and edge-exclusion mask (shared by all wafers)
+    grid = build_grid(wafer_size, edge_exclusion, step)
+    grid_x, grid_y = grid.grid_x, grid.grid_y
+    mask = grid.mask
     threshold = input.get("Min density (ug.cm-2):", 0)
 
+    # Interpolate all parameters at once, reusing the weights of wafers
+    # measured with the same recipe
+    with measure("griddata", items=len(data_frame)):
+        grid_values = interpolate_parameters(
+            data_frame['X'], data_frame['Y'], data_frame[param].to_numpy(),
+            grid_x, grid_y, cache=default_cache())
+
+    wafer_grids = {}
+    outputs = []
+    scale_outputs = [[] for _ in scales]
+    tiles = {}
     i = 0  # Index to track settings and filenames
     # Process each peak and generate corresponding plots
     for column in param:
-
-        if identical == False or identical == 'Manual':
-            if column == "Density":
-                max_value = input.get("Max density (ug.cm-2):", 0)
-                min_value = input.get("Min density (ug.cm-2):", 0)
-
-            elif column == "Number of layers":
-                max_value = input.get("Max thickness (ML):", 0)
-                min_value = input.get("Min thickness (ML):", 0)
-
-            elif column == "S_Mo":
-                max_value = input.get('Max S/Mo:', 0)
-                min_value = input.get('Min S/Mo:', 0)
-            print(f"Min: {min_value}, Max: {max_value}")
-
-        elif identical == 'Autoscale':
-            if column == "Density":
-                boxplot_frame = pd.read_csv(
-                    os.path.join(dirname, 'Liste_data', "Boxplot_Density.csv"))
-                 
-                max_value = boxplot_frame.iloc[:, 1:].max().max()
-                min_value = boxplot_frame.iloc[:, 1:].min().min()
-
-            elif column == "Number of layers":
-                boxplot_frame = pd.read_csv(os.path.join(dirname, 'Liste_data',
-                                                        "Boxplot_Thickness.csv"))
-                max_value = boxplot_frame.iloc[:, 1:].max().max()
-                min_value = boxplot_frame.iloc[:, 1:].min().min()
-
-            elif column == "S_Mo":
-                boxplot_frame = pd.read_csv(os.path.join(dirname, 'Liste_data',
-                                                        "Boxplot_S_Mo.csv"))
-                max_value = boxplot_frame.iloc[:, 1:].max().max()
-                min_value = boxplot_frame.iloc[:, 1:].min().min()
-            
-
-        grid_z = griddata(
-            (data_frame['X'], data_frame['Y']),
-            data_frame[column],
-            (grid_x, grid_y),
-            method='linear'
-        )
-
-        
+        grid_z = grid_values[i]
 
         # Mask invalid points and those below the threshold
-        grid_z_masked = np.ma.masked_where(~mask, grid_z)
-        grid_z_masked = np.ma.masked_where(grid_z_masked < threshold, grid_z_masked)
+        grid_z = np.ma.masked_where(~mask, grid_z)
+        grid_z = np.ma.masked_where(grid_z < threshold, grid_z)
 
-        print(min_value, max_value)
-
-        # Save the mask as a file
         os.makedirs(os.path.join(wafer_number, "Mapping"), exist_ok=True)
-        np.save(os.path.join(wafer_number, 'Mask.npy'), grid_z_masked.mask)
-        # Determine color scale if identical scaling is enabled
-        
-
-        grid_z = griddata((data_frame['X'], data_frame['Y']),
-                        data_frame[column],
-                        (grid_x, grid_y), method='linear')
-
-        # Apply the saved mask to the interpolated data
-
-        mask_int = np.load(os.path.join(wafer_number, 'Mask.npy'))
-        grid_z = np.ma.masked_where(mask_int, grid_z)
-
-        # Save the interpolated grid as a CSV file
-        data = pd.DataFrame({
-            'X': grid_x.flatten(),
-            'Y': grid_y.flatten(),
-            'Z': grid_z.flatten()
-        })
-        grid_z_pivot = data.pivot(index='Y', columns='X', values='Z')
-        grid_z_pivot.to_csv(os.path.join(wafer_number,
-                                        f'{grids[i]}_grid_df.csv'))
-
-        # Create and save the plot for the current peak
-        fig, ax = plt.subplots(figsize=(8, 8))
-        if identical:
-            img = ax.imshow(grid_z_pivot,
-                            extent=(-radius, radius, -radius, radius),
-                            origin='lower', cmap='Spectral_r',
-                            vmin=min_value, vmax=max_value)
-        else:
-            img = ax.imshow(grid_z_pivot,
-                            extent=(-radius, radius, -radius, radius),
-                            origin='lower', cmap='Spectral_r')
-
-        # # # Customize plot appearance
-        # # ax.set_aspect('equal', adjustable='box')
-        # cbar = plt.colorbar(img, ax=ax, shrink=0.8, aspect=10)
-        # cbar.ax.tick_params(labelsize=28)
-        ax.set_xlabel('X (cm)', fontsize=28)
-        ax.set_ylabel('Y (cm)', fontsize=28)
-        ax.tick_params(axis='both', labelsize=24)
+        # Optionally export the mask of the parameter
+        if export_masks:
+            mask_path = os.path.join(wafer_number, f'{grids[i]}_Mask.npy')
+            np.save(mask_path, np.ma.getmaskarray(grid_z))
+            outputs.append(mask_path)
+
+        # Keep the interpolated grid (saved once for the wafer)
+        wafer_grids[grids[i]] = grid_z
+        if export_csv:
+            outputs.append(export_grid_csv(wafer_number, grids[i], grid_z,
+                                           grid.x, grid.y))
 
         # # Add optional slot-based labeling
         if slot_number:
@@ -178,64 +202,67 @@ def plot_wdf_mp(filepath, input, slot_number, identical=None, stats=None):
         
         # plt.title(ylabels[i], fontsize=24)
 
-        ax.xaxis.set_major_locator(mticker.MultipleLocator(5))
-        ax.xaxis.set_major_formatter(
-            mticker.FuncFormatter(lambda x, _: f'{int(x)}'))
-
-        ax.yaxis.set_major_locator(mticker.MultipleLocator(5))
-        ax.yaxis.set_major_formatter(
-            mticker.FuncFormatter(lambda y, _: f'{int(y)}'))
-        circle = plt.Circle((0, 0), radius - edge_exclusion,
-                            color='black', fill=False, linewidth=1)
-        ax.add_patch(circle)
-
-        if stats:
-            parent_dir = os.path.dirname(os.path.dirname(filepath))
-            list_data_dir = os.path.join(parent_dir, "Liste_data")
-            stats_file = os.path.join(list_data_dir, "Stats.csv")
-            wafer_digit = float(os.path.basename(wafer_number))
-
-            # Check if the Stats.csv file exists
-            if os.path.exists(stats_file):
-                # Load the CSV into a DataFrame
-                stats_data = pd.read_csv(stats_file)
-                # Filter the DataFrame to find the row corresponding to
-                # wafer_number and column
-                filtered_data = stats_data[
-                    (stats_data['Slot'] == wafer_digit) & (
-                            stats_data['Parameters'] == column)]
-
-                if not filtered_data.empty:
-                    # Extract the mean and 3sigma values
-                    mean_val = filtered_data['mean'].values[0]
-                    sigma_val = filtered_data['3sigma'].values[0]
-                    uniformity = (1-sigma_val / mean_val) * 100 if mean_val != 0 else 0
-                    uniformity = max(uniformity, 0)
-
-                    # Add text for mean and 3sigma
-                    ax.text(0.01, 0.01, f'Mean: {mean_val:.2f}',
-                            transform=ax.transAxes, fontsize=16,
-                            ha='left', va='bottom', color='black')
-                    ax.text(0.96, 0.01, f'3$\sigma$: {sigma_val:.2f}',
-                            transform=ax.transAxes, fontsize=16,
-                            ha='right', va='bottom', color='black')
-                    ax.text(0.96, 0.96, f'U: {uniformity:.1f}%', transform=ax.transAxes,
-                    fontsize=16, ha='right', va='top', color='black')
+        slot_stats = read_slot_stats(wafer_number, column) if stats else None
+
+        # Create the plot for the current peak (color limits set per scale)
+        if renderer == 'raster':
+            raster = get_raster(radius, edge_exclusion, grid_z.shape)
+            labels = stats_labels(*slot_stats, mathtext=False) \
+                if slot_stats else ()
+        else:
+            # Figure of the wafer geometry, reused by the next plots
+            template = get_map_template(radius, edge_exclusion,
+                                        grid_z.shape)
+            # Text for mean and 3sigma
+            template.update(grid_z, stats_labels(*slot_stats)
+                            if slot_stats else ())
+
+        # Save the plot for each scale, changing only the color limits
+        for scale_index, identical in enumerate(scales):
+            min_value, max_value = scale_limits(column, identical, input,
+                                                dirname)
+            print(min_value, max_value)
+            # Limits of the data when not set (autoscale)
+            if not identical or min_value is None:
+                min_value = np.ma.masked_invalid(grid_z).min()
+            if not identical or max_value is None:
+                max_value = np.ma.masked_invalid(grid_z).max()
+            filename = f"{filenames[i]}_ID_scale" if identical \
+                else filenames[i]
+
+            image_path = os.path.join(wafer_number, "Mapping",
+                                      f"{filename}.png")
+            with measure("savefig", items=1):
+                if renderer == 'raster':
+                    image = raster.render(grid_z, min_value, max_value,
+                                          labels)
+                    image.save(image_path)
                 else:
-                    print(
-                        f"No data found for wafer {wafer_digit} and column "
-                        f"{column}.")
-            else:
-                print(f"Error: {stats_file} does not exist.")
-
-        plt.savefig(
-            os.path.join(wafer_number, "Mapping", f"{filenames[i]}.png"),
-            bbox_inches='tight')
-        plt.close(fig)
-        print(f"Saved plot for {column} as {filenames[i]}.png")
+                    template.save(image_path, min_value, max_value)
+                    image = template.last_image() if tile_scale else None
+            if tile_scale:
+                # Tile of the montage, without decoding the file again
+                tile = make_tile(image)
+                tiles[image_path] = np.asarray(make_tile(
+                    tile, scaled_size(tile.size, tile_scale)))
+            scale_outputs[scale_index].append(image_path)
+            print(f"Saved plot for {column} as {filename}.png")
 
         i += 1
 
+    # Save the binary grids of the wafer
+    outputs.extend(save_grids(wafer_number, wafer_grids, grid.x, grid.y))
+    return (scale_outputs, outputs, tiles) if tile_scale \
+        else (scale_outputs, outputs)
+
+
+def mapping_stage(identical):
+    """
+    Return the manifest stage of the images of a scale mode. The
+    identical scales ('Manual' and 'Autoscale') write the same files.
+    """
+    return "mapping:ID_scale" if identical else "mapping:auto"
+
 
 class XRF:
     """
@@ -253,96 +280,161 @@ class XRF:
         self.wafer_size = values.get('Wafer size (cm):')
         self.radius = self.wafer_size / 2
         self.edge_exclusion = values.get('Edge Exclusion (cm):')
-        self.step = 0.5
+        self.step = get_step(values)
         self.values=values
 
 
-    def database_settings(self):
+    def database_settings(self, export_csv=False, force=False,
+                          scheduler=None):
         """
         Process CSV files to create a database and calculate thickness.
+        The data of all slots is saved in the lot data file
+        (Liste_data/Lot_data.npz). If export_csv is True, each slot is
+        also exported as data_DP.csv.
+        Raw files unchanged since the previous run are not processed
+        again, unless force is True. The raw files are converted in
+        parallel by the scheduler (a temporary one if None); the slots
+        which failed are reported once the others are saved.
         """
-        # Iterate through the directory structure
-        for subdir, _, files in os.walk(self.dirname):
-            for file in files:
-                filepath = os.path.join(subdir, file)
-                if filepath.endswith(".csv"):
-                    # Initialize empty lists for storing processed data
-                    X, Y, density, s_mo_ratio, thickness = ([] for _ in
-                                                            range(5))
-
-                    # Read relevant columns from the CSV file
-                    data_frame = pd.read_csv(filepath, header=None, skiprows=3,
-                                             usecols=[3, 4, 5, 7, 9])
-                    # Remove rows with missing data
-                    data_frame = data_frame.dropna()
-
-                    # Process each row in the DataFrame
-                    for i in range(len(data_frame)):
-                        angle_rad = np.radians(data_frame.iloc[i, 1] - 90)
-                        cos_angle, sin_angle = np.cos(angle_rad), np.sin(
-                            angle_rad)
-
-                        # Convert polar coordinates (radius, angle) to
-                        # Cartesian coordinates (X, Y)
-                        X.append(data_frame.iloc[i, 0] * sin_angle / 10)
-                        Y.append(data_frame.iloc[i, 0] * cos_angle / 10)
-                        density.append(data_frame.iloc[i, 2])
-
-                        # Calculate S/Mo atomic ratio
-                        atomic_sulf_perc = 100 - data_frame.iloc[i, 3]
-                        s_mo_ratio.append(
-                            atomic_sulf_perc / data_frame.iloc[i, 3])
-
-                        # Calculate thickness using atomic properties
-                        um_molar_cm2_mo = density[i]/((MOLAR_MO)+atomic_sulf_perc*(MOLAR_S)/data_frame.iloc[i, 3])
-                        molar_cm2_mo = um_molar_cm2_mo * 1e-20
-                        mo_unit_calculated = molar_cm2_mo * 6.022e23
-                        e_mo_s2 = mo_unit_calculated / MO_UNIT
-                        thickness.append(e_mo_s2)
-
-                    # Save processed data to a new CSV file
-                    data = pd.DataFrame(
-                        list(zip(X, Y, density, s_mo_ratio, thickness)),
-                        columns=['X', 'Y', 'Density', 'S_Mo',
-                                 'Number of layers'])
-                    data = data.round(2)
-                    data.to_csv(os.path.join(subdir, "data_DP.csv"),
-                                index=False, mode='w+')
-
-        # Ensure a "Mapping" folder exists in all subdirectories
-        for subdir, _, files in os.walk(self.dirname):
-            if subdir != self.dirname and os.path.basename(subdir) != 'Mapping':
+        index = get_index(self.dirname)
+        manifest = Manifest(self.dirname)
+        previous_frames = {} if force else {
+            os.path.abspath(folder): data_frame
+            for _, folder, data_frame in iter_slot_frames(self.dirname)}
+
+        slot_frames = {}
+        raw_keys = []
+        signatures = {}
+        # Iterate through the raw files
+        for filepath in index.raw_files:
+            subdir = os.path.dirname(filepath)
+            key = manifest.relative(filepath)
+            raw_keys.append(key)
+            signature = [file_signature(filepath), export_csv]
+            previous = previous_frames.get(os.path.abspath(subdir))
+            if previous is not None and manifest.is_current(
+                    'database', key, signature):
+                slot_frames[subdir] = previous
+                continue
+            signatures[filepath] = signature
+
+        # Convert the new or modified raw files
+        with use_scheduler(scheduler) as scheduler:
+            results, failures = scheduler.map_slots(
+                partial(convert_slot, export_csv=export_csv),
+                signatures, signatures)
+        for filepath, (data, outputs) in results.items():
+            slot_frames[os.path.dirname(filepath)] = data
+            manifest.record('database', manifest.relative(filepath),
+                            signatures[filepath], outputs)
+
+        # Save the data of all slots in one columnar file
+        write_lot_data(self.dirname, slot_frames)
+        manifest.prune('database', raw_keys)
+        manifest.save()
+
+        # Ensure a "Mapping" folder exists in all slot folders
+        for subdir in index.slot_dirs:
+            if subdir != self.dirname:
                 os.makedirs(os.path.join(subdir, 'Mapping'), exist_ok=True)
+        report_failures('Calculate the thickness', failures)
 
-    def plot(self, slot_number=None, identical=None, stats=None):
+    def plot(self, slot_number=None, identical=None, stats=None,
+             export_masks=False, export_csv=False, force=False,
+             scheduler=None, renderer='matplotlib', tiles=None):
         """
         Plot data using multiprocessing with automatic scaling.
+        If export_masks is True, the mask of each parameter is also saved
+        in the wafer folder; if export_csv is True, the grids are also
+        exported as CSV files.
+        identical is a scale mode (False, 'Manual' or 'Autoscale') or a
+        list of scale modes, plotted from the same figures. renderer is
+        'matplotlib' (reference) or 'raster' (fast renderer).
+        Slots whose data, settings and mappings are unchanged since the
+        previous run are skipped, unless force is True: the images of each
+        scale and the grids of the wafer are tracked separately, so that
+        only the missing or outdated ones are written. The slots are
+        processed by the scheduler (a temporary one if None); the slots
+        which failed are reported once the others are saved.
+        If tiles (montage.TileStore) is given, the images rendered are
+        also kept in it for the montages.
         """
-        filepaths = []
-
-        # Gather all "data_DP.csv" files
-        for subdir, _, files in os.walk(self.dirname):
-            for file in files:
-                if file.endswith("data_DP.csv"):
-                    filepaths.append(os.path.join(subdir, file))
-
-        print(f"Found file paths: {filepaths}")
+        scales = list(identical) if isinstance(identical, (list, tuple)) \
+            else [identical]
+        # Scales writing the same images: only the last one is plotted
+        stage_scales = {}
+        for scale in scales:
+            stage_scales[mapping_stage(scale)] = scale
+        manifest = Manifest(self.dirname)
+        slot_signatures = manifest.slot_signatures()
+        # Identical scale (auto) depends on the data of all the slots
+        lot_signature = manifest.lot_signature()
+        # Settings read by the mappings: the grid and the threshold, and
+        # the color limits for the 'Manual' scale only (the other scales
+        # take the limits of the data)
+        grid_settings = select_settings(self.values, GRID_LABELS)
+        limit_settings = select_settings(self.values, LIMIT_LABELS)
+
+        # Gather the data of all slots from the lot data file, with the
+        # scales to plot for each slot
+        folders, data_frames, slot_scales, slot_grids = [], [], [], []
+        for _, folder, data_frame in iter_slot_frames(self.dirname):
+            key = manifest.relative(folder)
+            slot_signature = slot_signatures.get(os.path.abspath(folder))
+            pending = {}
+            for stage, scale in stage_scales.items():
+                signature = settings_signature(
+                    slot_signature, grid_settings,
+                    limit_settings if scale == 'Manual' else None,
+                    slot_number, scale, stats, renderer,
+                    lot_signature if scale == 'Autoscale' else None)
+                if force or not manifest.is_current(stage, key, signature):
+                    pending[stage] = (scale, signature)
+            grids_signature = settings_signature(
+                slot_signature, grid_settings, export_masks, export_csv)
+            grids_current = not force and manifest.is_current(
+                'grids', key, grids_signature)
+            if not pending and grids_current:
+                print(f"Unchanged, skipped: {folder}")
+                continue
+            folders.append(folder)
+            data_frames.append(data_frame)
+            slot_scales.append(pending)
+            slot_grids.append(grids_signature)
+
+        print(f"Found slots: {folders}")
 
         process_partial = partial(
-            plot_wdf_mp,
+            plot_wdf_scales,
             input=self.values,
             slot_number=slot_number,
-            identical=identical,
             stats=stats,
+            export_masks=export_masks,
+            export_csv=export_csv,
+            renderer=renderer,
+            tile_scale=tiles.scale if tiles is not None else None,
         )
 
-        # Determine the number of worker processes to use
-        num_cpu_cores = os.cpu_count()
-        max_workers = max(1, num_cpu_cores // 2)
-
-        # Use ProcessPoolExecutor for parallel processing
-        with ProcessPoolExecutor(max_workers=max_workers) as executor:
-            executor.map(process_partial, filepaths)
+        # Process the slots in parallel and record the successful ones
+        with use_scheduler(scheduler) as scheduler:
+            results, failures = scheduler.map_slots(
+                process_partial, folders, folders, data_frames,
+                [[scale for scale, _ in pending.values()]
+                 for pending in slot_scales])
+        for folder, pending, grids_signature in zip(folders, slot_scales,
+                                                    slot_grids):
+            if folder in results:
+                key = manifest.relative(folder)
+                scale_outputs, outputs = results[folder][:2]
+                if tiles is not None:
+                    for image_path, tile in results[folder][2].items():
+                        tiles.add(image_path, tile)
+                for (stage, (_, signature)), image_paths in zip(
+                        pending.items(), scale_outputs):
+                    manifest.record(stage, key, signature, image_paths)
+                manifest.record('grids', key, grids_signature, outputs)
+        manifest.save()
+        report_failures('Plot mapping', failures)
 
     def early_return(self):
         """
@@ -353,6 +445,10 @@ class XRF:
 
 
 if __name__ == "__main__":
+    import sys
+    from PyQt5.QtWidgets import QApplication
+    from wdxrf.Layout.setting_windows import SettingsWindow
+
     # Set directory and initialize the XRF class
     DIRNAME = r'C:\Users\TM273821\Desktop\Fluorescence\D24S1647.1'
 
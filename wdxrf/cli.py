@@ -0,0 +1,147 @@
+"""
+Command line for batch processing of lots without the GUI.
+PyQt5 is not imported: the processing runs on servers without display.
+"""
+
+import os
+import sys
+import json
+import argparse
+
+# Options of the GUI and their command line flags
+OPTION_FLAGS = {
+    "Data processing": "data-processing",
+    "Autoscale mapping": "autoscale-mapping",
+    "Id. scale mapping": "id-scale-mapping",
+    "Id. scale mapping (auto)": "id-scale-mapping-auto",
+    "Slot number": "slot-number",
+    "Stats": "stats",
+    "Fast rendering": "fast-rendering",
+    "Export slot CSV": "export-slot-csv",
+    "Export masks": "export-masks",
+    "Export grids CSV": "export-grids-csv",
+}
+
+
+def build_parser(default_options):
+    """Create the argument parser of the command line."""
+    parser = argparse.ArgumentParser(
+        prog="XRF2D-batch",
+        description="Process WDXRF lot directories without the GUI.")
+    parser.add_argument("dirnames", nargs="+", metavar="DIRECTORY",
+                        help="Lot directory (parent folder of the slots).")
+    parser.add_argument("--settings", metavar="JSON",
+                        help="Settings file (format of the Settings window). "
+                             "Defaults to the file saved by the GUI.")
+    parser.add_argument("--clean", action="store_true",
+                        help="Delete the files created by XRF2D instead of "
+                             "processing.")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="With --clean, only list the files and folders "
+                             "which would be deleted.")
+    parser.add_argument("--timings", metavar="JSON",
+                        help="Write the time of each stage to a JSON file.")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="Write the wall time, CPU time and items of "
+                             "each task, slot and stage to a JSON or CSV "
+                             "file (from the extension).")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Also record the peak memory of the stages "
+                             "(slower).")
+    parser.add_argument("--pstats", metavar="FILE",
+                        help="Profile the lots with cProfile (one lot at a "
+                             "time) and write the statistics to FILE.")
+    parser.add_argument("--workers", type=int, metavar="N",
+                        help="Number of worker processes shared by all the "
+                             "lots (default: settings, or half of the CPU "
+                             "cores).")
+    parser.add_argument("--lot-workers", type=int, metavar="N",
+                        help="Number of lots processed at the same time "
+                             "(default: all).")
+    for option, flag in OPTION_FLAGS.items():
+        parser.add_argument(f"--{flag}", dest=flag.replace("-", "_"),
+                            action=argparse.BooleanOptionalAction,
+                            default=default_options[option],
+                            help=f"'{option}' option of the GUI "
+                                 f"(default: %(default)s).")
+    return parser
+
+
+def main(argv=None):
+    """Run the pipeline on each lot directory and report the timings."""
+    # Headless matplotlib backend (set before matplotlib is imported)
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    from wdxrf.Processing.settings import load_settings
+    from wdxrf.Processing.pipeline import run_lots, DEFAULT_OPTIONS
+    from wdxrf.Processing.profiling import summarize, save_records
+
+    args = build_parser(DEFAULT_OPTIONS).parse_args(argv)
+    values = load_settings(args.settings)
+    options = {option: getattr(args, flag.replace("-", "_"))
+               for option, flag in OPTION_FLAGS.items()}
+    tool = "Clean" if args.clean else "MoS₂"
+
+    dirnames = []
+    failures = 0
+    for dirname in args.dirnames:
+        if os.path.isdir(dirname):
+            # Absolute path: the processing does not depend on the
+            # working directory
+            dirnames.append(os.path.abspath(dirname))
+        else:
+            print(f"Directory does not exist: {dirname}", file=sys.stderr)
+            failures += 1
+
+    if args.clean and args.dry_run:
+        from wdxrf.Processing.function_common import Common
+        for dirname in dirnames:
+            Common(dirname).reboot('WDXRF', dry_run=True)
+        return 1 if failures else 0
+
+    pipelines = run_lots(
+        dirnames, values, options, tool, workers=args.workers,
+        lot_workers=args.lot_workers,
+        on_finish=lambda dirname, task_name, elapsed_time: print(
+            f"{dirname}: {task_name} finished in {elapsed_time:.2f} s."),
+        trace_memory=args.trace_memory, profile_path=args.pstats)
+
+    # Per-stage timing summary and errors
+    report = {}
+    records = []
+    for pipeline in pipelines:
+        print(f"\n{pipeline.dirname}")
+        for task_name, elapsed_time in pipeline.timings:
+            print(f"  {task_name:<35} {elapsed_time:>8.2f} s")
+        print(f"  {'Total':<35} "
+              f"{sum(elapsed for _, elapsed in pipeline.timings):>8.2f} s")
+        # Stages measured inside the tasks
+        for total in summarize(pipeline.recorder.records):
+            if total["stage"] in ("task", "slot"):
+                continue
+            items = "" if total["items"] is None \
+                else f" {total['items']} items"
+            print(f"    {total['stage']:<33} {total['wall_time']:>8.2f} s "
+                  f"(CPU {total['cpu_time']:.2f} s){items}")
+        records.extend(pipeline.recorder.records)
+        for failure in pipeline.failures:
+            print(f"  Failed slot {failure}", file=sys.stderr)
+        if pipeline.error is not None:
+            print(f"  Lot failed: {pipeline.error!r}", file=sys.stderr)
+        if pipeline.failures or pipeline.error is not None:
+            failures += 1
+        report[pipeline.dirname] = pipeline.timings
+
+    if args.timings:
+        with open(args.timings, "w") as file:
+            json.dump({dirname: [{"task": task_name, "seconds": elapsed}
+                                 for task_name, elapsed in timings]
+                       for dirname, timings in report.items()},
+                      file, indent=1)
+    if args.profile:
+        save_records(records, args.profile)
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
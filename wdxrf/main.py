@@ -1,17 +1,30 @@
 """
 GUI for data visualization
+The window is shown with only Qt loaded: the scientific modules
+(matplotlib, pandas, scipy...) are imported on first use, or preloaded in
+a background thread once the window is shown (disabled by --no-preload).
 """
 
 # pylint: disable=import-error
 
+import importlib
 import multiprocessing
 import sys
+import threading
 from PyQt5.QtWidgets import QApplication, QWidget, QGridLayout
 from PyQt5.QtCore import QTimer
 from wdxrf.Layout.main_window_att import LayoutFrame
 from wdxrf.Layout.create_button import ButtonFrame
 from wdxrf.Plot.frame_attributes import PlotFrame
 
+# Modules of the plots and of the processing, preloaded after startup
+PRELOAD_MODULES = (
+    "wdxrf.Plot.plot_functions",
+    "wdxrf.Plot.wafer_canvas",
+    "wdxrf.Processing.box_stats",
+    "wdxrf.Processing.pipeline",
+)
+
 
 class MainWindow(QWidget):
     """
@@ -46,13 +59,44 @@ class MainWindow(QWidget):
         self.timer.timeout.connect(self.layout_frame.adjust_scroll_area_size)
         self.timer.start(200)
 
+    def closeEvent(self, event):
+        """Stop the processing and the worker processes when the window is
+        closed"""
+        self.button_frame.stop_processing()
+        self.button_frame.scheduler.shutdown(cancel=True)
+        super().closeEvent(event)
+
+def preload_modules(modules=PRELOAD_MODULES):
+    """
+    Import modules in a background thread, so that the first plot or run
+    does not wait for them (a module still being imported is waited
+    for by the thread using it).
+
+    :return: The thread.
+    """
+    def preload():
+        for module in modules:
+            try:
+                importlib.import_module(module)
+            except ImportError as error:
+                print(f"Preload of {module} failed: {error}")
+
+    thread = threading.Thread(target=preload, name="preload", daemon=True)
+    thread.start()
+    return thread
+
+
 def main():
     """Launch GUI"""
     multiprocessing.freeze_support()
-    app = QApplication(sys.argv)
+    preload = "--no-preload" not in sys.argv
+    app = QApplication([arg for arg in sys.argv if arg != "--no-preload"])
 
     window = MainWindow()
     window.show()
+    if preload:
+        # Once the window is painted
+        QTimer.singleShot(0, preload_modules)
 
     sys.exit(app.exec_())
 